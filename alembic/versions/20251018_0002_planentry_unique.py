@@ -0,0 +1,44 @@
+"""planentry: deduplicate and unique (user_id, plan_date, meal)
+
+Revision ID: 20251018_0002
+Revises: 20250824_0001
+Create Date: 2025-10-18 00:00:00
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20251018_0002"
+down_revision = "20250824_0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    try:
+        op.execute("ALTER TABLE planentry ADD COLUMN updated_at DATETIME")
+    except Exception:
+        pass
+    # Conserva la última entrada insertada de cada hueco (user_id, plan_date, meal)
+    op.execute(
+        "DELETE FROM planentry WHERE rowid NOT IN ("
+        "SELECT MAX(rowid) FROM planentry GROUP BY user_id, plan_date, meal)"
+    )
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_planentry_user_date_meal "
+        "ON planentry(user_id, plan_date, meal)"
+    )
+    # El índice único cubre el rango semanal: el de (user_id, plan_date) sobra
+    try:
+        op.drop_index("ix_planentry_user_date", table_name="planentry")
+    except Exception:
+        pass
+
+def downgrade():
+    try:
+        op.drop_index("ux_planentry_user_date_meal", table_name="planentry")
+    except Exception:
+        pass
+    try:
+        op.create_index("ix_planentry_user_date", "planentry", ["user_id", "plan_date"], unique=False)
+    except Exception:
+        pass
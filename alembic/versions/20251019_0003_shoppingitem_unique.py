@@ -0,0 +1,42 @@
+"""shoppingitem: merge duplicates and unique (user_id, name, COALESCE(unit, ''))
+
+Revision ID: 20251019_0003
+Revises: 20251018_0002
+Create Date: 2025-10-19 00:00:00
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20251019_0003"
+down_revision = "20251018_0002"
+branch_labels = None
+depends_on = None
+
+KEY = "user_id, name, COALESCE(unit, '')"
+
+def upgrade():
+    # Suma las cantidades de los duplicados en el último insertado y borra el resto
+    op.execute(
+        "UPDATE shoppingitem SET qty = ("
+        "SELECT SUM(s2.qty) FROM shoppingitem s2 WHERE s2.user_id = shoppingitem.user_id "
+        "AND s2.name = shoppingitem.name AND COALESCE(s2.unit, '') = COALESCE(shoppingitem.unit, '')) "
+        f"WHERE rowid IN (SELECT MAX(rowid) FROM shoppingitem GROUP BY {KEY} HAVING COUNT(*) > 1)"
+    )
+    op.execute(f"DELETE FROM shoppingitem WHERE rowid NOT IN (SELECT MAX(rowid) FROM shoppingitem GROUP BY {KEY})")
+    op.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_shoppingitem_user_name_unit ON shoppingitem({KEY})")
+    # Prefijo del índice único: ya no aporta nada
+    try:
+        op.drop_index("ix_shoppingitem_user_name", table_name="shoppingitem")
+    except Exception:
+        pass
+
+def downgrade():
+    try:
+        op.drop_index("ux_shoppingitem_user_name_unit", table_name="shoppingitem")
+    except Exception:
+        pass
+    try:
+        op.create_index("ix_shoppingitem_user_name", "shoppingitem", ["user_id", "name"], unique=False)
+    except Exception:
+        pass
@@ -0,0 +1,35 @@
+"""dataversion: per-user plan/catalog version counters for cache keys
+
+Revision ID: 20251020_0004
+Revises: 20251019_0003
+Create Date: 2025-10-20 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20251020_0004"
+down_revision = "20251019_0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # init_db la crea con SQLModel al arrancar: sólo si aún no existe
+    if sa.inspect(op.get_bind()).has_table("dataversion"):
+        return
+    op.create_table(
+        "dataversion",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("scope", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("user_id", "scope"),
+    )
+
+
+def downgrade():
+    try:
+        op.drop_table("dataversion")
+    except Exception:
+        pass
@@ -0,0 +1,31 @@
+"""composite indexes for keyset pagination of list endpoints
+
+Revision ID: 20251021_0005
+Revises: 20251020_0004
+Create Date: 2025-10-21 00:00:00
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20251021_0005"
+down_revision = "20251020_0004"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_shoppingitem_user_created": "shoppingitem(user_id, created_at, id)",
+    "ix_appliance_user_created": "appliance(user_id, created_at, id)",
+    "ix_product_user_category_name": "product(user_id, COALESCE(category, ''), name, id)",
+    "ix_userrecipe_user_created": "userrecipe(user_id, created_at, id)",
+}
+
+
+def upgrade():
+    for name, target in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,43 @@
+"""shoppingitem: rev, updated_at and tombstones for the delta sync feed
+
+Revision ID: 20251022_0006
+Revises: 20251021_0005
+Create Date: 2025-10-22 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20251022_0006"
+down_revision = "20251021_0005"
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    sa.Column("updated_at", sa.DateTime(), nullable=True),
+    sa.Column("deleted_at", sa.DateTime(), nullable=True),
+    sa.Column("rev", sa.Integer(), nullable=False, server_default="0"),
+]
+
+
+def upgrade():
+    # db.migrate_shopping_items ya las añade al arrancar: cada paso es idempotente
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("shoppingitem")}
+    for col in COLUMNS:
+        if col.name not in existing:
+            op.add_column("shoppingitem", col)
+    op.execute("UPDATE shoppingitem SET updated_at = created_at WHERE updated_at IS NULL")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_shoppingitem_user_rev ON shoppingitem(user_id, rev, id)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_shoppingitem_user_rev")
+    try:
+        with op.batch_alter_table("shoppingitem") as batch:
+            batch.drop_column("rev")
+            batch.drop_column("deleted_at")
+            batch.drop_column("updated_at")
+    except Exception:
+        pass
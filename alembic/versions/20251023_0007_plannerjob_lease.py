@@ -0,0 +1,37 @@
+"""plannerjob: owner and lease_until so only one worker runs each job
+
+Revision ID: 20251023_0007
+Revises: 20251022_0006
+Create Date: 2025-10-23 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20251023_0007"
+down_revision = "20251022_0006"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column("owner", sa.String(), nullable=True),
+    sa.Column("lease_until", sa.DateTime(), nullable=True),
+]
+
+
+def upgrade():
+    # db.migrate_planner_jobs ya las añade al arrancar: sólo las que falten
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("plannerjob")}
+    for col in COLUMNS:
+        if col.name not in existing:
+            op.add_column("plannerjob", col)
+
+
+def downgrade():
+    try:
+        with op.batch_alter_table("plannerjob") as batch:
+            batch.drop_column("lease_until")
+            batch.drop_column("owner")
+    except Exception:
+        pass
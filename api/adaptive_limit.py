@@ -0,0 +1,238 @@
+from __future__ import annotations
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional, Protocol
+
+import httpx
+
+from .config import settings
+from .metrics import (
+    UPSTREAM_CONCURRENCY_LIMIT,
+    UPSTREAM_INFLIGHT,
+    UPSTREAM_QUEUE_DEPTH,
+    UPSTREAM_LIMIT_DECREASES,
+    record_timing,
+)
+from .llm_scheduler import LLMQueueFull, build_llm_queue
+
+
+def overload_reason(exc: BaseException) -> Optional[str]:
+    """
+    Clasifica una excepción de llamada externa: devuelve el motivo si indica
+    sobrecarga del servicio (429, 5xx, timeout) o None si es otro tipo de error.
+    """
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    status = getattr(exc, "status_code", None)
+    if status is None and isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    if status == 429:
+        return "429"
+    if isinstance(status, int) and status >= 500:
+        return "5xx"
+    return None
+
+
+class WaitQueue(Protocol):
+    """Cola de espera enchufable del limitador (FIFO por defecto)."""
+    def __len__(self) -> int: ...
+    def push(self, fut: asyncio.Future) -> None: ...
+    def pop(self) -> Optional[asyncio.Future]: ...
+    def discard(self, fut: asyncio.Future) -> None: ...
+
+
+class FifoQueue:
+    def __init__(self) -> None:
+        self._q: Deque[asyncio.Future] = deque()
+
+    def __len__(self) -> int:
+        return len(self._q)
+
+    def push(self, fut: asyncio.Future) -> None:
+        self._q.append(fut)
+
+    def pop(self) -> Optional[asyncio.Future]:
+        return self._q.popleft() if self._q else None
+
+    def discard(self, fut: asyncio.Future) -> None:
+        try:
+            self._q.remove(fut)
+        except ValueError:
+            pass
+
+
+class AdaptiveLimiter:
+    """
+    Límite de concurrencia AIMD (additive increase / multiplicative decrease).
+
+    - Mientras las llamadas terminan bien y con latencia sana, el límite sube
+      ~1 por cada "ventana" de `limit` llamadas (+1/limit por éxito).
+    - Ante 429, 5xx, timeouts o picos de latencia se multiplica por `backoff`
+      (como mucho una vez por `cooldown_s`, para no hundirlo con una ráfaga de
+      fallos concurrentes que corresponden al mismo episodio).
+    Los que esperan hueco se atienden según `queue` (FIFO si no se indica).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        latency_target_s: float = 30.0,
+        backoff: float = 0.5,
+        spike_factor: float = 3.0,
+        cooldown_s: float = 2.0,
+        queue: Optional[WaitQueue] = None,
+    ) -> None:
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target_s = latency_target_s
+        self.backoff = backoff
+        self.spike_factor = spike_factor
+        self.cooldown_s = cooldown_s
+
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._inflight = 0
+        self._waiters: WaitQueue = queue if queue is not None else FifoQueue()
+        self._ewma_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._publish()
+
+    # -------- Estado --------
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def estimate_wait_s(self) -> int:
+        """Estimación grosera de cuánto tardaría en vaciarse la cola actual."""
+        per_call = self._ewma_latency or self.latency_target_s or 1.0
+        rounds = (len(self._waiters) + 1) / max(self.limit, 1)
+        return max(1, math.ceil(rounds * per_call))
+
+    def _publish(self) -> None:
+        UPSTREAM_CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+        UPSTREAM_INFLIGHT.labels(self.name).set(self._inflight)
+        UPSTREAM_QUEUE_DEPTH.labels(self.name).set(len(self._waiters))
+
+    # -------- Adquisición / liberación --------
+    async def acquire(self) -> None:
+        if not self._waiters and self._inflight < self.limit:
+            self._inflight += 1
+            self._publish()
+            return
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        try:
+            self._waiters.push(fut)
+        except LLMQueueFull as e:
+            e.retry_after = self.estimate_wait_s()
+            raise
+        self._publish()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # nos dieron hueco justo al cancelar: lo devolvemos
+                self.release()
+            else:
+                self._waiters.discard(fut)
+                self._publish()
+            raise
+
+    def release(self) -> None:
+        self._inflight = max(0, self._inflight - 1)
+        self._wake()
+
+    def _wake(self) -> None:
+        while len(self._waiters) and self._inflight < self.limit:
+            fut = self._waiters.pop()
+            if fut is None:
+                break
+            if fut.done():
+                continue
+            self._inflight += 1
+            fut.set_result(None)
+        self._publish()
+
+    # -------- Ajuste AIMD --------
+    def record(self, latency_s: float, overload: Optional[str] = None) -> None:
+        """Registra el resultado de una llamada y ajusta el límite."""
+        if overload is None and self._is_latency_spike(latency_s):
+            overload = "latency"
+
+        if overload is not None:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown_s:
+                self._last_decrease = now
+                self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                UPSTREAM_LIMIT_DECREASES.labels(self.name, overload).inc()
+        else:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / max(self._limit, 1.0))
+            # sólo las latencias sanas alimentan la referencia
+            if self._ewma_latency is None:
+                self._ewma_latency = latency_s
+            else:
+                self._ewma_latency = 0.8 * self._ewma_latency + 0.2 * latency_s
+        # si el límite ha subido puede haber hueco para alguien en cola
+        self._wake()
+
+    def _is_latency_spike(self, latency_s: float) -> bool:
+        if self.latency_target_s and latency_s > self.latency_target_s:
+            return True
+        if self._ewma_latency is not None and latency_s > self._ewma_latency * self.spike_factor:
+            return True
+        return False
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Ocupa un hueco mientras dura el bloque y registra latencia/resultado."""
+        tq = time.perf_counter()
+        await self.acquire()
+        t0 = time.perf_counter()
+        record_timing(f"{self.name}_wait", t0 - tq)
+        overload: Optional[str] = None
+        measured = True
+        try:
+            yield
+        except asyncio.CancelledError:
+            measured = False  # cancelado desde fuera: no dice nada del servicio
+            raise
+        except Exception as e:
+            overload = overload_reason(e)
+            # errores que no son de sobrecarga (4xx, parseo...) no ajustan el límite
+            measured = overload is not None
+            raise
+        finally:
+            if measured:
+                self.record(time.perf_counter() - t0, overload)
+            self.release()
+
+
+llm_limiter = AdaptiveLimiter(
+    "llm",
+    initial=settings.llm_max_concurrency,
+    min_limit=settings.llm_concurrency_min,
+    max_limit=settings.llm_concurrency_max,
+    latency_target_s=settings.llm_latency_target_s,
+    queue=build_llm_queue(),
+)
+
+embed_limiter = AdaptiveLimiter(
+    "embeddings",
+    initial=settings.embed_max_concurrency,
+    min_limit=settings.embed_concurrency_min,
+    max_limit=settings.embed_concurrency_max,
+    latency_target_s=settings.embed_latency_target_s,
+)
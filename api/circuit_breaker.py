@@ -0,0 +1,162 @@
+from __future__ import annotations
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple, Type
+
+import httpx
+
+from .config import settings
+from .metrics import CIRCUIT_STATE, CIRCUIT_REJECTED
+from .llm_scheduler import LLMQueueFull
+from .utils.json_stream import JSONStreamError
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """El breaker de la dependencia está abierto: se falla rápido sin llamarla."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito '{name}' abierto")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(exc: BaseException) -> bool:
+    """Errores que hablan de la salud de la dependencia (no 4xx de validación, etc.)."""
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None and isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return True
+
+
+class CircuitBreaker:
+    """
+    Breaker por dependencia (closed → open → half_open → closed).
+
+    - Se abre tras `failure_threshold` fallos consecutivos; una llamada más lenta
+      que `slow_call_s` cuenta como fallo aunque termine bien.
+    - Abierto: rechaza al instante (CircuitOpenError) durante `reset_timeout_s`.
+    - Pasado ese tiempo deja pasar `half_open_max_calls` sondas: si salen bien se
+      cierra, si fallan vuelve a abrirse.
+    Las excepciones de `ignore` (errores de contenido, colas locales...) no cuentan.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        slow_call_s: Optional[float] = None,
+        half_open_max_calls: int = 1,
+        ignore: Tuple[Type[BaseException], ...] = (),
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = reset_timeout_s
+        self.slow_call_s = slow_call_s
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.ignore = ignore
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def _publish(self) -> None:
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUE[self._state])
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        self._publish()
+
+    def _reset(self) -> None:
+        self._state = CLOSED
+        self._failures = 0
+        self._probes = 0
+        self._publish()
+
+    def check(self) -> None:
+        """Lanza CircuitOpenError si ahora mismo no se admitiría una llamada."""
+        st = self.state
+        if st == OPEN or (st == HALF_OPEN and self._probes >= self.half_open_max_calls):
+            CIRCUIT_REJECTED.labels(self.name).inc()
+            retry = max(0.0, self.reset_timeout_s - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(self.name, retry)
+
+    def record_success(self, latency_s: float, probe: bool = False) -> None:
+        if self.slow_call_s is not None and latency_s > self.slow_call_s:
+            self.record_failure(probe)
+            return
+        if probe or self._state != CLOSED:
+            self._reset()
+        else:
+            self._failures = 0
+
+    def record_failure(self, probe: bool = False) -> None:
+        if probe or self._state != CLOSED:
+            self._trip()
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._trip()
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[None]:
+        self.check()
+        probe = self.state == HALF_OPEN
+        if probe:
+            self._state = HALF_OPEN
+            self._probes += 1
+            self._publish()
+        t0 = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            raise
+        except Exception as e:
+            if isinstance(e, self.ignore) or not is_dependency_failure(e):
+                if probe:
+                    self._probes = max(0, self._probes - 1)
+            else:
+                self.record_failure(probe)
+            raise
+        else:
+            self.record_success(time.perf_counter() - t0, probe)
+
+
+def _breaker(name: str, slow_call_s: float, ignore: Tuple[Type[BaseException], ...] = ()) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.breaker_failure_threshold,
+        reset_timeout_s=settings.breaker_reset_timeout_s,
+        slow_call_s=slow_call_s,
+        ignore=ignore,
+    )
+
+
+qdrant_breaker = _breaker("qdrant", settings.qdrant_slow_call_s, ignore=(ValueError,))
+embed_breaker = _breaker("embeddings", settings.embed_slow_call_s)
+# JSON inválido o cola local llena no dicen nada de la salud del LLM
+llm_breaker = _breaker("llm", settings.llm_slow_call_s, ignore=(JSONStreamError, LLMQueueFull))
@@ -5,6 +5,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
     prompts_dir: str = "api/prompts"
+    prompt_reload_interval_s: float = 1.0  # cada cuánto se mira el mtime de las plantillas (hot-reload)
     
     # Core
     log_level: str = "INFO"
@@ -21,11 +22,65 @@ class Settings(BaseSettings):
     azure_openai_api_version: str = "2024-02-15-preview"
 
     llm_timeout_s: int = 45
+    # Concurrencia adaptativa (AIMD): límite inicial y rango en el que se mueve
     llm_max_concurrency: int = 3
+    llm_concurrency_min: int = 1
+    llm_concurrency_max: int = 16
+    llm_latency_target_s: float = 30.0  # por encima se considera pico de latencia
+    embed_max_concurrency: int = 4
+    embed_concurrency_min: int = 1
+    embed_concurrency_max: int = 32
+    embed_latency_target_s: float = 5.0
+    # Planificador LLM: tamaño máximo de la cola (503 si se llena) y pesos por usuario ("user:peso,...")
+    llm_queue_max: int = 64
+    llm_user_weights: str = ""
+    # Streaming: cortar al completar el JSON y reintentar si la salida es inválida
+    llm_stream_json: bool = True
+    llm_stream_attempts: int = 2
+    # Circuit breakers (qdrant, embeddings, llm): fallos seguidos para abrir, segundos abierto
+    # antes de sondear y latencia a partir de la cual una llamada cuenta como fallo
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout_s: float = 30.0
+    qdrant_slow_call_s: float = 3.0
+    embed_slow_call_s: float = 10.0
+    llm_slow_call_s: float = 60.0
+    # Caché local de recuperaciones RAG (se sirve mientras Qdrant/embeddings no responden)
+    retrieval_cache_size: int = 512
+    # Planner: días de la semana generados en paralelo como máximo
+    planner_day_concurrency: int = 4
+    # Estrategia por defecto de generate-week: "per_day" (7 llamadas) o "one_shot" (1 prompt con 7 recetas)
+    planner_week_strategy: str = "per_day"
+    planner_week_context_chars: int = 6000  # tope del contexto deduplicado en one_shot
+    planner_job_poll_s: float = 2.0  # sondeo de progreso en /planner/jobs/{id}/events
+    planner_job_lease_s: float = 120.0  # un job sin renovar en este tiempo lo puede reclamar otro worker
+    # Recuperaciones precalculadas de las semillas del planner (se recalculan si cambia la colección)
+    seed_retrieval_enabled: bool = True
+    seed_retrieval_check_s: float = 60.0
+    # Extracción de ingredientes (lista de la compra): llamadas en paralelo y vida de la caché por receta
+    ingredient_extract_concurrency: int = 4
+    ingredient_extract_batch_size: int = 8  # recetas por prompt de extracción (1 = una llamada por receta)
+    ingredient_extract_ttl_s: int = 30 * 24 * 3600
+    # Parser por reglas: las frases con confianza menor van al LLM (>1 = siempre LLM)
+    ingredient_parse_min_confidence: float = 0.8
+    ingredient_resolve_retry_s: float = 300.0  # reintento de extracción en segundo plano tras una lectura provisional
+    # Caché del agregado semanal: la clave lleva las versiones de plan/catálogo, así que puede vivir mucho
+    agg_cache_ttl_s: int = 7 * 24 * 3600
+    # Tombstones de la lista de la compra: un cliente que no sincroniza en este plazo recibe reset
+    shopping_tombstone_ttl_days: int = 30
+    # Pregeneración del plan de la semana siguiente en horas valle (hora local "HH:MM-HH:MM"),
+    # para usuarios activos en los últimos `pregen_active_days` y con un tope de tokens por noche
+    pregen_enabled: bool = False
+    pregen_window: str = "02:00-06:00"
+    pregen_active_days: int = 7
+    pregen_max_users: int = 200
+    pregen_token_budget: int = 500_000
+    pregen_check_s: float = 300.0
 
 
     # RAG (Qdrant)
     qdrant_url: str = "http://localhost:6333"
+    # Modo embebido/local de Qdrant (":memory:" o ruta a un directorio); si se define, ignora qdrant_url
+    qdrant_location: Optional[str] = None
     collection_name: str = "recipes"
     rag_timeout_s: int = 10
 
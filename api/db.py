@@ -1,6 +1,7 @@
 from typing import Iterator
 from sqlmodel import SQLModel, create_engine, Session
 from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
 from .config import settings
 
 engine = create_engine(settings.db_url, echo=False)
@@ -20,6 +21,11 @@ def _safe_add_column(conn, table: str, column: str, decl: str):
         except Exception:
             pass
 
+def upsert_insert(session: Session, model):
+    """INSERT del dialecto de la sesión con soporte de ON CONFLICT (SQLite o PostgreSQL)."""
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
 def migrate_user_id_columns():
     with engine.begin() as conn:
         for table in ("shoppingitem", "appliance", "planentry"):
@@ -32,9 +38,76 @@ def migrate_user_id_columns():
         except Exception:
             pass
 
+def migrate_planner_jobs():
+    """Columnas del reparto de jobs entre workers (dueño y caducidad del lease)."""
+    with engine.begin() as conn:
+        _safe_add_column(conn, "plannerjob", "owner", "TEXT")
+        _safe_add_column(conn, "plannerjob", "lease_until", "DATETIME")
+
+def migrate_plan_entries():
+    """
+    Una entrada por (user_id, plan_date, meal): elimina duplicados conservando la
+    última insertada y crea el índice único (que también cubre el rango semanal).
+    """
+    with engine.begin() as conn:
+        _safe_add_column(conn, "planentry", "updated_at", "DATETIME")
+        conn.execute(text(
+            "DELETE FROM planentry WHERE rowid NOT IN ("
+            "SELECT MAX(rowid) FROM planentry GROUP BY user_id, plan_date, meal)"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_planentry_user_date_meal "
+            "ON planentry(user_id, plan_date, meal)"
+        ))
+        # Prefijo del índice único: ya no aporta nada
+        conn.execute(text("DROP INDEX IF EXISTS ix_planentry_user_date"))
+
+def migrate_shopping_items():
+    """
+    Un item por (user_id, name, unidad): suma las cantidades de los duplicados en
+    el último insertado, borra el resto y crea el índice único de expresión.
+    Añade además las columnas del feed de cambios (rev, updated_at, deleted_at).
+    """
+    key = "user_id, name, COALESCE(unit, '')"
+    with engine.begin() as conn:
+        # Feed de cambios: rev/updated_at por escritura y tombstones
+        _safe_add_column(conn, "shoppingitem", "updated_at", "DATETIME")
+        _safe_add_column(conn, "shoppingitem", "deleted_at", "DATETIME")
+        _safe_add_column(conn, "shoppingitem", "rev", "INTEGER NOT NULL DEFAULT 0")
+        conn.execute(text("UPDATE shoppingitem SET updated_at = created_at WHERE updated_at IS NULL"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_shoppingitem_user_rev ON shoppingitem(user_id, rev, id)"))
+        conn.execute(text(
+            "UPDATE shoppingitem SET qty = ("
+            "SELECT SUM(s2.qty) FROM shoppingitem s2 WHERE s2.user_id = shoppingitem.user_id "
+            "AND s2.name = shoppingitem.name AND COALESCE(s2.unit, '') = COALESCE(shoppingitem.unit, '')) "
+            f"WHERE rowid IN (SELECT MAX(rowid) FROM shoppingitem GROUP BY {key} HAVING COUNT(*) > 1)"
+        ))
+        conn.execute(text(
+            f"DELETE FROM shoppingitem WHERE rowid NOT IN (SELECT MAX(rowid) FROM shoppingitem GROUP BY {key})"
+        ))
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_shoppingitem_user_name_unit ON shoppingitem({key})"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_shoppingitem_user_name"))
+
 def init_db() -> None:
     SQLModel.metadata.create_all(engine)
     migrate_user_id_columns()
+    migrate_plan_entries()
+    migrate_shopping_items()
+    migrate_keyset_indexes()
+    migrate_planner_jobs()
+
+# Índices compuestos de la paginación por keyset (create_all no los añade a tablas existentes)
+KEYSET_INDEXES = {
+    "ix_shoppingitem_user_created": "shoppingitem(user_id, created_at, id)",
+    "ix_appliance_user_created": "appliance(user_id, created_at, id)",
+    "ix_product_user_category_name": "product(user_id, COALESCE(category, ''), name, id)",
+    "ix_userrecipe_user_created": "userrecipe(user_id, created_at, id)",
+}
+
+def migrate_keyset_indexes():
+    with engine.begin() as conn:
+        for name, target in KEYSET_INDEXES.items():
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
 
 def get_session() -> Iterator[Session]:
     with Session(engine, expire_on_commit=False) as session:
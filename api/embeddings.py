@@ -1,8 +1,13 @@
 from __future__ import annotations
 from typing import List, Dict, Optional
+import time
+import httpx
 from openai import AsyncAzureOpenAI
 
 from .config import settings
+from .adaptive_limit import embed_limiter
+from .circuit_breaker import embed_breaker
+from .metrics import EMBED_LATENCY, stage
 
 
 def _short_key(model_name: str) -> str:
@@ -67,17 +72,33 @@ def _parse_embed_response(data, expect_batch: bool) -> List[List[float]]:
 async def _post_embeddings_batch(model: str, inputs: List[str]) -> List[List[float]]:
     """
     Intento batch. Si el backend no soporta batch o devuelve tamaños inesperados,
-    llamamos per-item.
+    llamamos per-item. Cada llamada ocupa un hueco del limitador adaptativo.
+    Con el breaker abierto no se llama: vectores vacíos al instante (el llamador degrada).
     """
+    if embed_breaker.is_open:
+        return [[] for _ in inputs]
     timeout = settings.azure_openai_timeout_s
     async with httpx.AsyncClient(timeout=timeout) as client:
-
         try:
-            r = await client.embeddings.create(model=model, input=[t])
-            emb = r.data[0].embedding if r.data else []
+            async with embed_limiter.slot(), embed_breaker.call():
+                data = await _embed_call(client, model, inputs)
+            vecs = _parse_embed_response(data, expect_batch=True)
+            if len(vecs) == len(inputs):
+                return vecs
         except Exception:
-            emb = []
-        out.append(emb)
+            pass
+
+        out: List[List[float]] = []
+        for t in inputs:
+            try:
+                embed_breaker.check()
+                async with embed_limiter.slot(), embed_breaker.call():
+                    data = await _embed_call(client, model, t)
+                vecs = _parse_embed_response(data, expect_batch=False)
+                emb = vecs[0] if vecs else []
+            except Exception:
+                emb = []
+            out.append(emb)
     return out
 
 
@@ -87,7 +108,11 @@ async def embed_single(text: str, model: str) -> List[float]:
 
 
 async def embed_batch(texts: List[str], model: str) -> List[List[float]]:
-    return await _post_embeddings_batch(model, texts)
+    t0 = time.perf_counter()
+    with stage("embed"):
+        vecs = await _post_embeddings_batch(model, texts)
+    EMBED_LATENCY.labels(model).observe(time.perf_counter() - t0)
+    return vecs
 
 async def embed_dual(texts: List[str], models: Optional[List[str]] = None) -> Dict[str, List[List[float]]]:
     models = models or settings.parsed_embedding_models()
@@ -5,6 +5,8 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 
+from .llm_scheduler import LLMQueueFull
+
 class ErrorResponse(BaseModel):
     code: str = Field(examples=["bad_request"])
     detail: str = Field(examples=["Invalid input"])
@@ -22,9 +24,20 @@ def install_exception_handlers(app: FastAPI):
             422: "validation_error",
             429: "rate_limited",
             500: "internal_error",
+            503: "service_unavailable",
         }
         payload = ErrorResponse(code=code_map.get(exc.status_code, "error"), detail=str(exc.detail))
-        return JSONResponse(status_code=exc.status_code, content=payload.model_dump())
+        return JSONResponse(status_code=exc.status_code, content=payload.model_dump(), headers=getattr(exc, "headers", None))
+
+    @app.exception_handler(LLMQueueFull)
+    async def llm_queue_full_handler(request: Request, exc: LLMQueueFull):
+        retry_after = exc.retry_after or 5
+        payload = ErrorResponse(
+            code="overloaded",
+            detail="Demasiadas peticiones de generación en cola; reintenta más tarde.",
+            meta={"retry_after_s": retry_after},
+        )
+        return JSONResponse(status_code=503, content=payload.model_dump(), headers={"Retry-After": str(retry_after)})
 
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -1,13 +1,16 @@
 from __future__ import annotations
-import asyncio
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
+import json
+import httpx
 from openai import AsyncAzureOpenAI, APIError, APIConnectionError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 from .config import settings
-
-# Semáforo global para limitar concurrencia
-_llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+from .adaptive_limit import llm_limiter
+from .circuit_breaker import llm_breaker
+from .llm_scheduler import charge_tokens
+from .metrics import llm_call, observe_llm_usage, STREAM_EARLY_STOPS
+from .utils.json_stream import IncrementalJSONScanner, JSONStreamError
 
 # Cliente global de Azure OpenAI
 _azure_client = AsyncAzureOpenAI(
@@ -17,7 +20,9 @@ _azure_client = AsyncAzureOpenAI(
 )
 
 class LLMError(RuntimeError):
-    pass
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 @retry(
     reraise=True,
@@ -28,6 +33,8 @@ class LLMError(RuntimeError):
 async def _azure_generate(prompt: str, model: str, temperature: float, max_tokens: int) -> str:
     """
     Llama a Azure OpenAI con stream=false y devuelve el campo 'response' (texto).
+    Cada intento ocupa un hueco del limitador adaptativo (las esperas entre reintentos no).
+    Con el breaker del LLM abierto falla al instante con CircuitOpenError (sin reintentos).
     """
     url = f"{settings.azure_openai_endpoint.rstrip('/')}/api/generate"
     payload: Dict[str, Any] = {
@@ -40,23 +47,102 @@ async def _azure_generate(prompt: str, model: str, temperature: float, max_token
         }
     }
     timeout = settings.llm_timeout_s
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.post(url, json=payload)
-        if r.status_code >= 500:
-            raise LLMError(f"Azure OpenAI 5xx: {r.status_code}")
-        r.raise_for_status()
-        data = r.json()
-        if not isinstance(data, dict) or "response" not in data:
-            raise LLMError("Respuesta inválida de Azure OpenAI")
-        return str(data["response"])
+    llm_breaker.check()
+    async with llm_limiter.slot(), llm_breaker.call():
+        with llm_call(model):
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                r = await client.post(url, json=payload)
+                if r.status_code >= 500:
+                    raise LLMError(f"Azure OpenAI 5xx: {r.status_code}", status_code=r.status_code)
+                r.raise_for_status()
+                data = r.json()
+                if not isinstance(data, dict) or "response" not in data:
+                    raise LLMError("Respuesta inválida de Azure OpenAI")
+                charge_tokens(observe_llm_usage(model, data))
+                return str(data["response"])
 
 
 async def generate_json(prompt: str, model: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 1024) -> str:
     """
-    Genera texto (esperado JSON) usando Azure OpenAI, con límite de concurrencia.
+    Genera texto (esperado JSON) usando Azure OpenAI, con límite de concurrencia adaptativo.
+    """
+    mdl = model or settings.azure_openai_deployment_llm
+    return await _azure_generate(prompt=prompt, model=mdl, temperature=temperature, max_tokens=max_tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación de tokens de un texto (~4 caracteres por token) cuando el servidor no da el uso."""
+    return max(1, len(text) // 4)
+
+
+async def stream_json(
+    prompt: str,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    validate: Optional[Callable[[Any], Any]] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Genera en streaming y corta en cuanto el primer objeto/array JSON está completo
+    (y, si se indica, `validate(data)` no lanza). Al salir del bloque de streaming
+    se cierra la conexión, así que el modelo deja de generar (y de facturar) tokens.
+
+    Lanza JSONStreamError si la salida es estructuralmente inválida, no valida o
+    termina sin un JSON completo: el llamador puede reintentar sin esperar al final.
     """
     mdl = model or settings.azure_openai_deployment_llm
+    url = f"{settings.azure_openai_endpoint.rstrip('/')}/api/generate"
+    payload: Dict[str, Any] = {"model": mdl, "prompt": prompt, "stream": True}
+    if options:
+        payload["options"] = options
+    scanner = IncrementalJSONScanner()
+    chunks = 0
+    prompt_count: Optional[int] = None
+    charged = False
 
-    async with _llm_semaphore:
-        text = await _azure_generate(prompt=prompt, model=mdl, temperature=temperature, max_tokens=max_tokens)
-        return text
+    llm_breaker.check()
+    async with llm_limiter.slot(), llm_breaker.call():
+        with llm_call(mdl):
+            async with httpx.AsyncClient(timeout=timeout or settings.llm_timeout_s) as client:
+                async with client.stream("POST", url, json=payload) as r:
+                    if r.status_code >= 500:
+                        raise LLMError(f"Azure OpenAI 5xx: {r.status_code}", status_code=r.status_code)
+                    r.raise_for_status()
+                    try:
+                        async for line in r.aiter_lines():
+                            if not line.strip():
+                                continue
+                            try:
+                                evt = json.loads(line)
+                            except ValueError:
+                                raise LLMError("Evento de streaming inválido")
+                            chunks += 1
+                            if isinstance(evt.get("prompt_eval_count"), int):
+                                prompt_count = evt["prompt_eval_count"]
+                            if evt.get("done"):
+                                charge_tokens(observe_llm_usage(mdl, evt))
+                                charged = True
+                            text = scanner.feed(str(evt.get("response") or ""))
+                            if text is None:
+                                if evt.get("done"):
+                                    break
+                                continue
+                            try:
+                                data = json.loads(text)
+                                if validate is not None:
+                                    validate(data)
+                            except Exception as e:
+                                raise JSONStreamError(f"JSON completo pero inválido: {e}") from e
+                            if not evt.get("done"):
+                                STREAM_EARLY_STOPS.inc()
+                            return text
+                    finally:
+                        if chunks and not charged:
+                            # Cortado antes del evento final (o abortado): el servidor no informa del
+                            # uso. Prompt según el servidor si lo adelantó o estimado por longitud, y
+                            # los trozos recibidos como tokens de salida.
+                            charge_tokens(observe_llm_usage(mdl, {
+                                "prompt_eval_count": prompt_count or estimate_tokens(prompt),
+                                "eval_count": chunks,
+                            }))
+    raise JSONStreamError("La generación terminó sin un JSON completo")
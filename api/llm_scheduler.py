@@ -0,0 +1,169 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from typing_extensions import Literal
+
+from .config import settings
+from .metrics import LLM_SCHEDULER_QUEUED, LLM_SCHEDULER_REJECTED
+
+Priority = Literal["interactive", "batch", "background"]
+
+# Orden estricto entre clases: mientras haya trabajo interactivo esperando, se atiende antes.
+PRIORITY_ORDER: Tuple[Priority, ...] = ("interactive", "batch", "background")
+
+
+class TokenBudget:
+    """Tokens que puede gastar un bloque de trabajo (p.ej. la pregeneración nocturna)."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(0, int(limit))
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.used)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.limit
+
+    def charge(self, tokens: int) -> None:
+        self.used += max(0, int(tokens))
+
+
+@dataclass(frozen=True)
+class LLMWorkContext:
+    priority: Priority = "interactive"
+    user_id: str = "anonymous"
+    budget: Optional[TokenBudget] = None
+
+
+_current: ContextVar[LLMWorkContext] = ContextVar("llm_work_context", default=LLMWorkContext())
+
+
+def current_llm_context() -> LLMWorkContext:
+    return _current.get()
+
+
+@contextmanager
+def llm_context(priority: Priority, user_id: str, budget: Optional[TokenBudget] = None) -> Iterator[LLMWorkContext]:
+    """
+    Etiqueta las llamadas al LLM hechas dentro del bloque (incluidas las tareas
+    asyncio creadas dentro) con su clase de prioridad y usuario; con `budget`,
+    los tokens que consuman se descuentan de él.
+    """
+    ctx = LLMWorkContext(priority=priority, user_id=user_id or "anonymous", budget=budget)
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+
+
+def charge_tokens(tokens: int) -> None:
+    """Descuenta tokens del presupuesto del contexto actual, si lo hay."""
+    budget = _current.get().budget
+    if budget is not None:
+        budget.charge(tokens)
+
+
+class LLMQueueFull(RuntimeError):
+    """La cola de trabajo LLM está llena; `retry_after` es una estimación en segundos."""
+
+    def __init__(self, retry_after: Optional[int] = None):
+        super().__init__("Cola de LLM llena")
+        self.retry_after = retry_after
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    mapping: Dict[str, float] = {}
+    for pair in [p.strip() for p in (raw or "").split(",") if p.strip()]:
+        if ":" not in pair:
+            continue
+        user, w = pair.split(":", 1)
+        try:
+            mapping[user.strip()] = max(0.01, float(w.strip()))
+        except ValueError:
+            continue
+    return mapping
+
+
+@dataclass(order=True)
+class _Ticket:
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    fut: asyncio.Future = field(compare=False)
+    priority: Priority = field(compare=False)
+
+
+class FairQueue:
+    """
+    Cola de espera del limitador LLM: prioridad estricta entre clases y, dentro
+    de cada clase, weighted fair queuing (start-time fair queuing) por usuario.
+
+    Cada petición recibe una etiqueta `finish = max(vtime, último_finish_usuario) + 1/peso`;
+    se atiende la etiqueta más baja. Un usuario que encola 7 llamadas de golpe
+    queda intercalado con los demás en lugar de ir delante de todos.
+    """
+
+    def __init__(self, max_size: int, weights: Optional[Dict[str, float]] = None) -> None:
+        self.max_size = max_size
+        self.weights = weights or {}
+        self._heaps: Dict[Priority, List[_Ticket]] = {p: [] for p in PRIORITY_ORDER}
+        self._vtime: Dict[Priority, float] = {p: 0.0 for p in PRIORITY_ORDER}
+        self._last_finish: Dict[Tuple[Priority, str], float] = {}
+        self._by_fut: Dict[asyncio.Future, _Ticket] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._by_fut)
+
+    def push(self, fut: asyncio.Future) -> None:
+        if len(self._by_fut) >= self.max_size:
+            LLM_SCHEDULER_REJECTED.labels(current_llm_context().priority).inc()
+            raise LLMQueueFull()
+        ctx = current_llm_context()
+        prio = ctx.priority if ctx.priority in self._heaps else "interactive"
+        key = (prio, ctx.user_id)
+        start = max(self._vtime[prio], self._last_finish.get(key, 0.0))
+        finish = start + 1.0 / self.weights.get(ctx.user_id, 1.0)
+        self._last_finish[key] = finish
+        t = _Ticket(finish=finish, seq=next(self._seq), start=start, fut=fut, priority=prio)
+        heapq.heappush(self._heaps[prio], t)
+        self._by_fut[fut] = t
+        LLM_SCHEDULER_QUEUED.labels(prio).inc()
+
+    def pop(self) -> Optional[asyncio.Future]:
+        for prio in PRIORITY_ORDER:
+            heap = self._heaps[prio]
+            while heap:
+                t = heapq.heappop(heap)
+                if self._by_fut.pop(t.fut, None) is None:
+                    continue  # retirado (cancelado) previamente
+                LLM_SCHEDULER_QUEUED.labels(prio).dec()
+                self._vtime[prio] = max(self._vtime[prio], t.start)
+                if not heap:
+                    # clase vacía: olvidamos el historial para no penalizar a nadie
+                    self._last_finish = {k: v for k, v in self._last_finish.items() if k[0] != prio}
+                return t.fut
+        return None
+
+    def discard(self, fut: asyncio.Future) -> None:
+        t = self._by_fut.pop(fut, None)
+        if t is not None:
+            LLM_SCHEDULER_QUEUED.labels(t.priority).dec()
+            # la entrada se queda en el heap y se salta al hacer pop
+
+
+def build_llm_queue() -> FairQueue:
+    return FairQueue(
+        max_size=settings.llm_queue_max,
+        weights=_parse_weights(settings.llm_user_weights),
+    )
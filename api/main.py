@@ -7,10 +7,15 @@ import httpx
 
 from .config import settings
 from .db import init_db
-from .vectorstore import ensure_collection
+from .prompt_registry import prompt_registry
+from .vectorstore import ensure_collection, get_client
+from .circuit_breaker import qdrant_breaker, embed_breaker, llm_breaker
 from .routes.shopping import router as shopping_router
 from .routes.appliances import router as appliances_router
-from .routes.planner import router as planner_router
+from .routes.planner import router as planner_router, all_seed_triplets
+from .services.seed_retrieval import seed_retrieval
+from .services.pregen import pregen
+from .routes.planner_jobs import router as planner_jobs_router, resume_planner_jobs
 from .routes.catalog import router as catalog_router
 from .routes.admin import router as admin_router
 from .routes.auth import router as auth_router
@@ -19,6 +24,7 @@ from .routes.generate import router as generate_router
 from .routes.user_recipes import router as user_recipes_router
 from .middleware.rate_limit import RateLimitMiddleware
 from .middleware.size_limit import SizeLimitMiddleware
+from .middleware.server_timing import ServerTimingMiddleware
 from .errors import install_exception_handlers
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -54,6 +60,7 @@ app.add_middleware(
 # Middlewares
 app.add_middleware(SizeLimitMiddleware)     # 413 si Content-Length excede
 app.add_middleware(RateLimitMiddleware)     # 429 si exceso RPM
+app.add_middleware(ServerTimingMiddleware)  # Server-Timing por etapas (embed/search/llm...)
 
 # Prometheus
 instrumentator = Instrumentator().instrument(app)
@@ -65,14 +72,19 @@ install_exception_handlers(app)
 @app.on_event("startup")
 async def startup():
     init_db()
+    prompt_registry.preload()  # compila las plantillas una vez (falla pronto si falta la carpeta)
     vector_dims = settings.parsed_vector_dims()
     await ensure_collection(vector_dims)
+    resume_planner_jobs()  # jobs del planner que quedaron a medias en el último reinicio
+    seed_retrieval.schedule_warm(all_seed_triplets())  # RAG de las semillas del planner, en segundo plano
+    pregen.start()  # plan de la semana siguiente en horas valle (PREGEN_ENABLED)
 
 # Routers
 app.include_router(auth_router)
 app.include_router(shopping_router)
 app.include_router(appliances_router)
 app.include_router(planner_router)
+app.include_router(planner_jobs_router)
 app.include_router(catalog_router)
 app.include_router(admin_router)
 app.include_router(rag_router)
@@ -82,7 +94,7 @@ app.include_router(user_recipes_router)
 
 @app.get("/health", tags=["admin"], summary="Healthcheck simple")
 async def health():
-    return {"status": "ok", "qdrant": settings.qdrant_url, "llm": settings.azure_openai_deployment_llm}
+    return {"status": "ok", "qdrant": settings.qdrant_location or settings.qdrant_url, "llm": settings.azure_openai_deployment_llm}
 
 
 @app.get("/health/deep", tags=["admin"], summary="Healthcheck profundo (servicios externos)")
@@ -94,9 +106,12 @@ async def health_deep():
     t0 = time.perf_counter()
     q_ok, q_err = True, None
     try:
-        async with httpx.AsyncClient(timeout=3) as c:
-            r = await c.get(settings.qdrant_url.rstrip("/") + "/collections")
-            r.raise_for_status()
+        if settings.qdrant_location:
+            await get_client().collection_exists(settings.collection_name)
+        else:
+            async with httpx.AsyncClient(timeout=3) as c:
+                r = await c.get(settings.qdrant_url.rstrip("/") + "/collections")
+                r.raise_for_status()
     except Exception as e:
         q_ok, q_err = False, str(e)
         out["status"] = "degraded"
@@ -119,6 +134,10 @@ async def health_deep():
         "error": ao_err,
     }
 
+    # Estado de los circuit breakers
+    out["breakers"] = {b.name: b.state for b in (qdrant_breaker, embed_breaker, llm_breaker)}
+    if any(state != "closed" for state in out["breakers"].values()):
+        out["status"] = "degraded"
 
     return out
 
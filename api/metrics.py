@@ -0,0 +1,191 @@
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Métricas propias de la aplicación (las HTTP las expone prometheus-fastapi-instrumentator).
+# Se registran en el registry por defecto, así que aparecen en /metrics sin más.
+
+# -------- Concurrencia adaptativa hacia servicios externos (LLM / embeddings) --------
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "upstream_concurrency_limit",
+    "Límite de concurrencia actual (AIMD) por servicio externo",
+    ["upstream"],
+)
+UPSTREAM_INFLIGHT = Gauge(
+    "upstream_inflight_requests",
+    "Llamadas en curso por servicio externo",
+    ["upstream"],
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "upstream_queue_depth",
+    "Llamadas esperando un hueco de concurrencia por servicio externo",
+    ["upstream"],
+)
+UPSTREAM_LIMIT_DECREASES = Counter(
+    "upstream_limit_decreases_total",
+    "Recortes multiplicativos del límite de concurrencia",
+    ["upstream", "reason"],
+)
+
+# -------- Planificador de trabajo LLM (prioridades + reparto justo) --------
+LLM_SCHEDULER_QUEUED = Gauge(
+    "llm_scheduler_queued",
+    "Llamadas LLM en cola por clase de prioridad",
+    ["priority"],
+)
+LLM_SCHEDULER_REJECTED = Counter(
+    "llm_scheduler_rejected_total",
+    "Llamadas LLM rechazadas (503) por cola llena",
+    ["priority"],
+)
+
+# -------- Pipeline RAG/LLM por etapas --------
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Duración de cada etapa del pipeline (embed, search, prompt, llm, parse...)",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+EMBED_LATENCY = Histogram(
+    "embed_latency_seconds",
+    "Latencia de embeddings por modelo",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+RAG_QUERIES = Counter("rag_queries_total", "Búsquedas en el vector store", ["kind"])
+RAG_QUERY_SECONDS = Histogram(
+    "rag_query_seconds",
+    "Latencia de búsqueda en el vector store",
+    ["kind"],
+    buckets=_LATENCY_BUCKETS,
+)
+RAG_HITS = Histogram(
+    "rag_search_hits",
+    "Número de resultados devueltos por búsqueda",
+    ["kind"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21),
+)
+LLM_REQUESTS = Counter("llm_requests_total", "Llamadas al LLM por resultado", ["model", "outcome"])
+LLM_LATENCY = Histogram(
+    "llm_latency_seconds",
+    "Latencia de llamadas al LLM (sin espera en cola)",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens consumidos en el LLM", ["model", "kind"])  # kind: prompt|completion
+PARSE_FAILURES = Counter("llm_parse_failures_total", "Salidas del LLM que no se pudieron parsear/validar", ["kind"])
+FALLBACKS = Counter("pipeline_fallbacks_total", "Respuestas servidas con fallback determinista", ["pipeline", "reason"])
+STREAM_EARLY_STOPS = Counter("llm_stream_early_stops_total", "Generaciones cortadas al completarse el JSON")
+INGREDIENT_CACHE = Counter(
+    "ingredient_extract_cache_total",
+    "Extracciones de ingredientes servidas desde la caché, el parser por reglas o el LLM",
+    ["result"],  # hit|parsed|miss
+)
+PREGEN_WEEKS = Counter(
+    "planner_pregen_weeks_total",
+    "Semanas pregeneradas fuera de hora punta por resultado",
+    ["outcome"],  # generated|skipped|budget|busy|error
+)
+
+# ---- Circuit breakers ----
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Estado del breaker (0=cerrado, 1=semiabierto, 2=abierto)", ["dependency"])
+CIRCUIT_REJECTED = Counter("circuit_breaker_rejected_total", "Llamadas rechazadas al instante con el breaker abierto", ["dependency"])
+
+
+# -------- Server-Timing (tiempos por petición) --------
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def begin_request_timings() -> Token:
+    """Abre un acumulador de tiempos para la petición en curso (lo usa el middleware)."""
+    return _request_timings.set([])
+
+
+def end_request_timings(token: Token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mide una etapa: histograma Prometheus + entrada en Server-Timing."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        PIPELINE_STAGE_SECONDS.labels(name).observe(dt)
+        record_timing(name, dt)
+
+
+def format_server_timing(timings: List[Tuple[str, float]], total_s: Optional[float] = None) -> str:
+    """
+    Agrupa por nombre (p.ej. 7 llamadas 'llm' del planner) en el formato
+    `llm;dur=812.4;desc="x7", total;dur=900.1` (ms).
+    """
+    sums: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for name, dt in timings:
+        sums[name] = sums.get(name, 0.0) + dt
+        counts[name] = counts.get(name, 0) + 1
+    parts: List[str] = []
+    for name, dt in sums.items():
+        item = f"{name};dur={dt * 1000:.1f}"
+        if counts[name] > 1:
+            item += f';desc="x{counts[name]}"'
+        parts.append(item)
+    if total_s is not None:
+        parts.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def observe_llm_usage(model: str, data: Any) -> int:
+    """
+    Cuenta tokens si la respuesta los trae: formato /api/generate
+    (prompt_eval_count / eval_count) o estilo OpenAI (usage.prompt_tokens / completion_tokens).
+    Devuelve el total contado (0 si la respuesta no trae uso).
+    """
+    if not isinstance(data, dict):
+        return 0
+    usage = data.get("usage") if isinstance(data.get("usage"), dict) else {}
+    prompt_toks = data.get("prompt_eval_count", usage.get("prompt_tokens"))
+    completion_toks = data.get("eval_count", usage.get("completion_tokens"))
+    total = 0
+    if isinstance(prompt_toks, (int, float)) and prompt_toks > 0:
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_toks)
+        total += int(prompt_toks)
+    if isinstance(completion_toks, (int, float)) and completion_toks > 0:
+        LLM_TOKENS.labels(model, "completion").inc(completion_toks)
+        total += int(completion_toks)
+    return total
+
+
+@contextmanager
+def llm_call(model: str) -> Iterator[None]:
+    """Latencia + resultado de una llamada al LLM (etapa 'llm' en Server-Timing)."""
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        LLM_LATENCY.labels(model).observe(dt)
+        LLM_REQUESTS.labels(model, outcome).inc()
+        PIPELINE_STAGE_SECONDS.labels("llm").observe(dt)
+        record_timing("llm", dt)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from ..metrics import begin_request_timings, end_request_timings, format_server_timing
+
+class ServerTimingMiddleware(BaseHTTPMiddleware):
+    """
+    Añade la cabecera `Server-Timing` con las etapas medidas durante la petición
+    (embed, search, prompt, llm, parse...) más el total.
+    """
+    async def dispatch(self, request: Request, call_next):
+        token = begin_request_timings()
+        t0 = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            timings = end_request_timings(token)
+        response.headers["Server-Timing"] = format_server_timing(timings, time.perf_counter() - t0)
+        return response
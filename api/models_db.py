@@ -4,9 +4,21 @@ from datetime import datetime, date, timezone
 import uuid
 
 from sqlmodel import SQLModel, Field
-from sqlalchemy import Column, JSON as SAJSON
+from sqlalchemy import Column, Index, JSON as SAJSON, text
 
 class ShoppingItem(SQLModel, table=True):
+    """
+    Item de la lista: uno por (user_id, name, unidad). Las altas hacen upsert y
+    suman la cantidad; sin unidad cuenta como unidad vacía (COALESCE en el índice).
+    Cada escritura le asigna `rev` (secuencia por usuario) y los borrados dejan
+    tombstone (`deleted_at`) para que /shopping-list/changes los pueda servir.
+    """
+    __table_args__ = (
+        Index("ux_shoppingitem_user_name_unit", "user_id", "name", text("COALESCE(unit, '')"), unique=True),
+        Index("ix_shoppingitem_user_created", "user_id", "created_at", "id"),  # keyset del listado
+        Index("ix_shoppingitem_user_rev", "user_id", "rev", "id"),  # feed de cambios
+    )
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True, index=True)
     user_id: str = Field(default="default", index=True)
     name: str = Field(index=True)
@@ -15,9 +27,16 @@ class ShoppingItem(SQLModel, table=True):
     category: Optional[str] = None
     checked: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
+    deleted_at: Optional[datetime] = None
+    rev: int = 0
 
 
 class Appliance(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_appliance_user_created", "user_id", "created_at", "id"),  # keyset del listado
+    )
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True, index=True)
     user_id: str = Field(default="default", index=True)
     name: str = Field(index=True)
@@ -31,6 +50,15 @@ class Appliance(SQLModel, table=True):
 
 
 class PlanEntry(SQLModel, table=True):
+    """
+    Una comida del plan. Como mucho una por (user_id, plan_date, meal): las
+    escrituras hacen upsert. El índice único cubre además la consulta por rango
+    de semana (user_id + plan_date) y la de huecos ocupados (plan_date, meal).
+    """
+    __table_args__ = (
+        Index("ux_planentry_user_date_meal", "user_id", "plan_date", "meal", unique=True),
+    )
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True, index=True)
     user_id: str = Field(default="default", index=True)
     plan_date: date = Field(index=True)
@@ -40,12 +68,60 @@ class PlanEntry(SQLModel, table=True):
     recipe: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(SAJSON))
     appliances: Optional[List[str]] = Field(default=None, sa_column=Column(SAJSON))
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class RecipeIngredient(SQLModel, table=True):
+    """
+    Líneas de ingredientes materializadas al escribir una entrada del plan: una
+    fila por ingrediente con nombre canónico, cantidad, unidad y categoría.
+    Copian `plan_date` para agregar por rango con un GROUP BY, sin leer el JSON
+    de la receta ni llamar al LLM.
+    """
+    __table_args__ = (
+        Index("ix_recipeingredient_user_date", "user_id", "plan_date"),
+        Index("ix_recipeingredient_source", "source", "source_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(default="default")
+    source: str = Field(description="plan")
+    source_id: str
+    plan_date: Optional[date] = None
+    name: str
+    qty: Optional[float] = None
+    unit: Optional[str] = None
+    category: Optional[str] = None
+
+
+class PlannerJob(SQLModel, table=True):
+    """
+    Generación de plan semanal en segundo plano. `days` guarda cada día ya
+    generado ({index, plan_date, entry_id, title, recipe}) en orden de llegada.
+    `owner`/`lease_until`: worker que lo está ejecutando y hasta cuándo.
+    """
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True, index=True)
+    user_id: str = Field(default="default", index=True)
+    status: str = Field(default="queued", index=True, description="queued|running|done|failed")
+    week_start: date
+    params: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(SAJSON))
+    days: Optional[List[Dict[str, Any]]] = Field(default=None, sa_column=Column(SAJSON))
+    error: Optional[str] = None
+    owner: Optional[str] = None
+    lease_until: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
 
 
 class Product(SQLModel, table=True):
     """
     Catálogo de productos (posible por-usuario y/o global).
     """
+    __table_args__ = (
+        # keyset del listado: sin categoría ordena como ''
+        Index("ix_product_user_category_name", "user_id", text("COALESCE(category, '')"), "name", "id"),
+    )
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True, index=True)
     user_id: str = Field(default="default", index=True)
     name: str = Field(index=True, description="Nombre canónico en minúsculas (p.ej. 'calabacín')")
@@ -66,6 +142,25 @@ class KVCache(SQLModel, table=True):
     expires_at: Optional[datetime] = Field(default=None, index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class DataVersion(SQLModel, table=True):
+    """
+    Contador de versión por usuario y ámbito ("plan", "catalog"). Se incrementa
+    en la misma transacción que cada escritura y forma parte de las claves de
+    caché: una escritura invalida las entradas derivadas sin esperar al TTL.
+    """
+    user_id: str = Field(primary_key=True)
+    scope: str = Field(primary_key=True)
+    version: int = 0
+
+class WorkerLease(SQLModel, table=True):
+    """
+    Exclusión entre workers para trabajo periódico (p.ej. "pregen:<fecha>"): el
+    dueño la tiene hasta `expires_at`; después cualquiera la puede tomar.
+    """
+    name: str = Field(primary_key=True)
+    owner: str
+    expires_at: datetime
+
 class Cache(SQLModel, table=True):
     """
     Entradas de caché por usuario y clave.
@@ -5,7 +5,7 @@ from datetime import datetime
 import uuid
 
 from sqlalchemy.dialects.sqlite import JSON
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from sqlmodel import SQLModel, Field
 
 
@@ -14,6 +14,9 @@ class UserRecipe(SQLModel, table=True):
     Recetas creadas o guardadas por el usuario.
     Guardamos el objeto RecipeNeutral como JSON en 'recipe'.
     """
+    __table_args__ = (
+        Index("ix_userrecipe_user_created", "user_id", "created_at", "id"),  # keyset del listado
+    )
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True, index=True)
     user_id: str = Field(index=True)
 
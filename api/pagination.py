@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, literal, tuple_
+from sqlmodel import Session
+
+from . import db
+
+# Paginación por keyset: el cursor es la clave de ordenación de la última fila
+# devuelta, codificada y opaca para el cliente. La página siguiente es un
+# WHERE (k1, k2, ...) > cursor sobre un índice compuesto, sin OFFSET: cuesta lo
+# mismo la primera página que la milésima.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA = "application/x-ndjson"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, order: Sequence[Any]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(order):
+            raise ValueError
+        return [_from_json(col, v) for col, v in zip(order, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Cursor inválido")
+
+
+def _from_json(col: Any, value: Any) -> Any:
+    typ = getattr(col.type, "impl", col.type)  # TypeDecorator (p.ej. UTCDateTime) → tipo base
+    if not isinstance(typ, DateTime) or value is None:
+        return value
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def keyset(stmt, order: Sequence[Any], cursor: Optional[str], desc: bool = False):
+    """Aplica orden y, si hay cursor, el filtro por tupla (en el sentido de `desc`)."""
+    if cursor:
+        values = decode_cursor(cursor, order)
+        after = tuple_(*[literal(v, col.type) for col, v in zip(order, values)])
+        stmt = stmt.where(tuple_(*order) < after if desc else tuple_(*order) > after)
+    return stmt.order_by(*[col.desc() if desc else col for col in order])
+
+
+def paginate(
+    session: Session,
+    stmt,
+    order: Sequence[Any],
+    key: Callable[[Any], Sequence[Any]],
+    cursor: Optional[str],
+    limit: int,
+    desc: bool = False,
+) -> Tuple[List[Any], Optional[str]]:
+    """Una página (limit + 1 para saber si hay más) y el cursor de la siguiente, o None."""
+    rows = session.exec(keyset(stmt, order, cursor, desc).limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = rows[:limit]
+    return list(rows), encode_cursor(key(rows[-1]))
+
+
+def ndjson_response(stmt, dump: Callable[[Any], str], batch: int = 200) -> StreamingResponse:
+    """
+    Colección completa (desde el cursor ya aplicado a `stmt`) en NDJSON, leída con
+    un cursor en el servidor (yield_per) en su propia sesión: memoria constante.
+    """
+    def lines() -> Iterator[str]:
+        with Session(db.engine) as s:
+            buf: List[str] = []
+            for row in s.exec(stmt.execution_options(yield_per=batch)):
+                buf.append(dump(row) + "\n")
+                if len(buf) >= batch:
+                    yield "".join(buf)
+                    buf = []
+            if buf:
+                yield "".join(buf)
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def resolve_prompts_dir() -> Path:
+    tried: List[Path] = []
+    # 1) Si viene por settings (PROMPTS_DIR), respétalo
+    env_dir = getattr(settings, "prompts_dir", None)
+    if env_dir:
+        p = Path(env_dir)
+        if not p.is_absolute():
+            p = (REPO_ROOT / p).resolve()
+        tried.append(p)
+        if p.exists():
+            return p
+    # 2) Default preferido: api/prompts
+    p_api = (REPO_ROOT / "api" / "prompts").resolve()
+    tried.append(p_api)
+    if p_api.exists():
+        return p_api
+    # 3) Alternativa: prompts en raíz
+    p_root = (REPO_ROOT / "prompts").resolve()
+    tried.append(p_root)
+    if p_root.exists():
+        return p_root
+    # Si nada existe, devolvemos error claro
+    raise FileNotFoundError(
+        "No se encuentra la carpeta de prompts. Rutas intentadas:\n" +
+        "\n".join(f"- {str(t)}" for t in tried)
+    )
+
+
+@dataclass
+class PromptTemplate:
+    """
+    Plantilla ya compilada: el texto se trocea una sola vez en literales y campos
+    (sintaxis de str.format, con {{ }} como llaves literales) y `render` sólo concatena.
+    `version` es un hash del contenido, apto para claves de caché.
+    """
+    name: str
+    text: str
+    mtime_ns: int = 0
+    version: str = ""
+    _segments: List[Tuple[str, Optional[str]]] = field(default_factory=list, repr=False)
+
+    @classmethod
+    def compile(cls, name: str, text: str, mtime_ns: int = 0) -> "PromptTemplate":
+        segments: List[Tuple[str, Optional[str]]] = []
+        for literal, fname, spec, conv in Formatter().parse(text):
+            if spec or conv:
+                raise ValueError(f"Plantilla {name}: formato '{{{fname}!{conv}:{spec}}}' no soportado")
+            segments.append((literal, fname))
+        version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        return cls(name=name, text=text, mtime_ns=mtime_ns, version=version, _segments=segments)
+
+    @property
+    def fields(self) -> List[str]:
+        return [f for _, f in self._segments if f]
+
+    @property
+    def static_prefix(self) -> str:
+        """Texto fijo antes del primer campo: la parte que el proveedor puede cachear."""
+        out: List[str] = []
+        for literal, fname in self._segments:
+            out.append(literal)
+            if fname:
+                break
+        return "".join(out)
+
+    def render(self, **params: Any) -> str:
+        parts: List[str] = []
+        for literal, fname in self._segments:
+            parts.append(literal)
+            if fname:
+                if fname not in params:
+                    raise KeyError(f"Plantilla {self.name}: falta el parámetro '{fname}'")
+                parts.append(str(params[fname]))
+        return "".join(parts)
+
+
+class PromptRegistry:
+    """
+    Registro de plantillas de prompt: se leen y compilan una vez y se recargan
+    solas si cambia el mtime del fichero (comprobado como mucho cada
+    `reload_interval_s`). La carpeta se resuelve en el primer uso, no al importar.
+    """
+
+    def __init__(self, directory: Optional[Path] = None, reload_interval_s: float = 1.0) -> None:
+        self._directory = directory
+        self.reload_interval_s = reload_interval_s
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is None:
+            self._directory = resolve_prompts_dir()
+        return self._directory
+
+    def _load(self, name: str) -> PromptTemplate:
+        path = self.directory / name
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No se encuentra la plantilla de prompt: {path}")
+        cur = self._templates.get(name)
+        if cur is not None and cur.mtime_ns == st.st_mtime_ns:
+            return cur
+        tpl = PromptTemplate.compile(name, path.read_text(encoding="utf-8"), st.st_mtime_ns)
+        self._templates[name] = tpl
+        return tpl
+
+    def get(self, name: str) -> PromptTemplate:
+        now = time.monotonic()
+        cur = self._templates.get(name)
+        if cur is not None and now - self._checked_at.get(name, 0.0) < self.reload_interval_s:
+            return cur
+        with self._lock:
+            tpl = self._load(name)
+            self._checked_at[name] = now
+        return tpl
+
+    def render(self, name: str, **params: Any) -> str:
+        return self.get(name).render(**params)
+
+    def version(self, *names: str) -> str:
+        """Versión (hash) de una o varias plantillas, para incluir en claves de caché."""
+        return "+".join(self.get(n).version for n in names)
+
+    def preload(self) -> List[str]:
+        """Compila todas las plantillas .txt de la carpeta (al arrancar)."""
+        names = sorted(p.name for p in self.directory.glob("*.txt"))
+        for n in names:
+            self.get(n)
+        return names
+
+
+prompt_registry = PromptRegistry(reload_interval_s=settings.prompt_reload_interval_s)
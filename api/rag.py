@@ -1,6 +1,13 @@
-from typing import List, Dict
+from collections import OrderedDict
+from typing import Any, List, Dict, Tuple
+from .config import settings
 from .embeddings import embed_dual
 from .vectorstore import search
+from .metrics import FALLBACKS
+
+# Últimas recuperaciones correctas (LRU en memoria del proceso), para servirlas
+# mientras Qdrant o los embeddings están caídos o con el breaker abierto.
+_retrieval_cache: "OrderedDict[Tuple[str, int], List[Dict[str, Any]]]" = OrderedDict()
 
 def rrf_fuse(results_lists: List[List], k: int = 60) -> List:
     scores: Dict[str, float] = {}
@@ -22,6 +29,45 @@ async def hybrid_retrieve(query: str, top_k_each: int = 5) -> List:
             results.append(await search({key: vecs[0]}, top_k_each))
     return rrf_fuse(results)
 
+def query_vectors(emb: Dict[str, List[List[float]]], index: int = 0) -> Dict[str, List[float]]:
+    """Se queda con los vectores de la consulta `index` que tienen la dimensión esperada."""
+    dims = settings.parsed_vector_dims()
+    out: Dict[str, List[float]] = {}
+    for key, dim in dims.items():
+        vecs = emb.get(key) or []
+        if len(vecs) > index and isinstance(vecs[index], list) and len(vecs[index]) == dim:
+            out[key] = vecs[index]
+    return out
+
+def _cache_put(key: Tuple[str, int], hits: List[Dict[str, Any]]) -> None:
+    _retrieval_cache[key] = hits
+    _retrieval_cache.move_to_end(key)
+    while len(_retrieval_cache) > max(0, settings.retrieval_cache_size):
+        _retrieval_cache.popitem(last=False)
+
+async def retrieve(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Embeddings de la consulta + búsqueda en Qdrant, con degradación rápida:
+    si no hay vectores válidos o la búsqueda falla (breaker abierto incluido) se
+    sirve la última recuperación cacheada para esa consulta o, si no la hay,
+    una lista vacía (el llamador genera sin contexto).
+    """
+    key = (query, top_k)
+    try:
+        qvecs = query_vectors(await embed_dual([query]))
+        if not qvecs:
+            raise ValueError("Sin vectores de consulta válidos")
+        hits = await search(qvecs, top_k=top_k)
+    except Exception:
+        cached = _retrieval_cache.get(key)
+        if cached is not None:
+            FALLBACKS.labels("retrieval", "cache").inc()
+            return cached
+        FALLBACKS.labels("retrieval", "no_context").inc()
+        return []
+    _cache_put(key, hits)
+    return hits
+
 def build_context(hits, max_chars: int = 1400) -> str:
     parts: List[str] = []
     used = 0
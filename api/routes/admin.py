@@ -8,6 +8,7 @@ from ..security import get_current_user
 from ..schemas import Document, IngestRequest
 from ..embeddings import embed_dual
 from ..vectorstore import upsert_documents
+from ..services.versions import bump_version, CATALOG
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -33,6 +34,7 @@ def seed_catalog(
         if exists:
             continue
         session.add(Product(user_id=user_id, name=name, category=cat, synonyms=syn, is_global=False))
+    bump_version(session, user_id, CATALOG)
     session.commit()
     return {"ok": True, "count": len(BASE_SEED)}
 
@@ -1,31 +1,42 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from typing import List, Dict, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
 from sqlmodel import Session, select
 from ..db import get_session
 from ..models_db import Appliance
 from ..security import get_current_user
 from ..errors import ErrorResponse
+from ..pagination import NDJSON_MEDIA, NEXT_CURSOR_HEADER, keyset, ndjson_response, paginate
 
 router = APIRouter(prefix="/appliances", tags=["appliances"])
 
+LIST_ORDER = (Appliance.created_at, Appliance.id)  # descendente; índice ix_appliance_user_created
+
 @router.get(
     "",
     response_model=List[Appliance],
-    summary="Listar electrodomésticos",
-    responses={400: {"model": ErrorResponse}},
+    summary="Listar electrodomésticos (cursor en X-Next-Cursor; format=ndjson en streaming)",
+    responses={200: {"content": {NDJSON_MEDIA: {}}}, 400: {"model": ErrorResponse}},
 )
 def list_appliances(
+    response: Response,
     limit: int = Query(100, ge=1, le=500, example=100),
-    offset: int = Query(0, ge=0, example=0),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en X-Next-Cursor"),
+    offset: int = Query(0, ge=0, example=0, deprecated=True),
+    format: Literal["json", "ndjson"] = Query("json"),
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    return session.exec(
-        select(Appliance)
-        .where(Appliance.user_id == user_id)
-        .order_by(Appliance.created_at.desc())
-        .offset(offset).limit(limit)
-    ).all()
+    stmt = select(Appliance).where(Appliance.user_id == user_id)
+    if format == "ndjson":
+        return ndjson_response(keyset(stmt, LIST_ORDER, cursor, desc=True), lambda a: a.model_dump_json())
+    if offset and not cursor:
+        return session.exec(keyset(stmt, LIST_ORDER, None, desc=True).offset(offset).limit(limit)).all()
+    rows, next_cursor = paginate(
+        session, stmt, LIST_ORDER, lambda a: (a.created_at, a.id), cursor, limit, desc=True
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
 
 @router.post(
     "",
@@ -1,31 +1,52 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from typing import List, Dict, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
+from sqlalchemy import func
 from sqlmodel import Session, select
 from ..db import get_session
 from ..models_db import Product
 from ..security import get_current_user
 from ..errors import ErrorResponse
+from ..pagination import NDJSON_MEDIA, NEXT_CURSOR_HEADER, keyset, ndjson_response, paginate
+from ..services.versions import bump_version, CATALOG, GLOBAL_USER
 
 router = APIRouter(prefix="/catalog", tags=["catalog"])
 
+
+def _bump_catalog(session: Session, user_id: str, is_global: bool) -> None:
+    """Invalida los agregados cacheados del usuario (y de todos, si el producto es global)."""
+    bump_version(session, user_id, CATALOG)
+    if is_global:
+        bump_version(session, GLOBAL_USER, CATALOG)
+
+# Sin categoría ordena como '' (el keyset no puede comparar NULL); índice ix_product_user_category_name
+LIST_ORDER = (func.coalesce(Product.category, ""), Product.name, Product.id)
+
 @router.get(
     "/products",
     response_model=List[Product],
-    summary="Listar productos (catálogo del usuario)",
-    responses={400: {"model": ErrorResponse}},
+    summary="Listar productos (catálogo del usuario; cursor en X-Next-Cursor, format=ndjson en streaming)",
+    responses={200: {"content": {NDJSON_MEDIA: {}}}, 400: {"model": ErrorResponse}},
 )
 def list_products(
+    response: Response,
     limit: int = Query(200, ge=1, le=1000, example=200),
-    offset: int = Query(0, ge=0, example=0),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en X-Next-Cursor"),
+    offset: int = Query(0, ge=0, example=0, deprecated=True),
+    format: Literal["json", "ndjson"] = Query("json"),
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    return session.exec(
-        select(Product)
-        .where(Product.user_id == user_id)
-        .order_by(Product.category, Product.name)
-        .offset(offset).limit(limit)
-    ).all()
+    stmt = select(Product).where(Product.user_id == user_id)
+    if format == "ndjson":
+        return ndjson_response(keyset(stmt, LIST_ORDER, cursor), lambda p: p.model_dump_json())
+    if offset and not cursor:
+        return session.exec(keyset(stmt, LIST_ORDER, None).offset(offset).limit(limit)).all()
+    rows, next_cursor = paginate(
+        session, stmt, LIST_ORDER, lambda p: (p.category or "", p.name, p.id), cursor, limit
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
 
 @router.post(
     "/products",
@@ -40,7 +61,9 @@ def create_product(
     user_id: str = Depends(get_current_user),
 ):
     prod.user_id = user_id
-    session.add(prod); session.commit()
+    session.add(prod)
+    _bump_catalog(session, user_id, prod.is_global)
+    session.commit()
     return prod
 
 @router.patch(
@@ -59,10 +82,13 @@ def update_product(
     if not p or p.user_id != user_id:
         raise HTTPException(404, "Producto no encontrado")
     allowed = {"name", "category", "synonyms", "is_global"}
+    was_global = p.is_global
     for k, v in patch.items():
         if k in allowed:
             setattr(p, k, v)
-    session.add(p); session.commit()
+    session.add(p)
+    _bump_catalog(session, user_id, was_global or p.is_global)
+    session.commit()
     return p
 
 @router.delete(
@@ -78,5 +104,7 @@ def delete_product(
     p = session.get(Product, product_id)
     if not p or p.user_id != user_id:
         raise HTTPException(404, "Producto no encontrado")
-    session.delete(p); session.commit()
+    session.delete(p)
+    _bump_catalog(session, user_id, p.is_global)
+    session.commit()
     return {"ok": True}
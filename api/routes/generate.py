@@ -1,16 +1,21 @@
 from __future__ import annotations
-from typing import List, Literal, Dict, Any
+from typing import List, Literal, Dict, Any, Callable, Optional
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, Body, HTTPException, Depends
-from pathlib import Path
 import json, re
+import httpx
 
 from ..config import settings
 from ..schemas import RecipeNeutral
-from ..embeddings import embed_dual
-from ..vectorstore import search
+from ..rag import retrieve
+from ..prompt_registry import prompt_registry, PromptTemplate
 from ..security import get_current_user
-from ..llm import generate_json
+from ..llm import generate_json, stream_json, LLMError
+from ..utils.json_stream import JSONStreamError
+from ..adaptive_limit import llm_limiter
+from ..circuit_breaker import llm_breaker, CircuitOpenError
+from ..llm_scheduler import llm_context, charge_tokens
+from ..metrics import stage, llm_call, observe_llm_usage, PARSE_FAILURES, FALLBACKS
 
 router = APIRouter(tags=["recipes"], prefix="/recipes")
 
@@ -39,53 +44,19 @@ class RecipeGenResponse(BaseModel):
     sources: List[SourceHit]
 
 # -------------------------
-# Resolución de carpeta de prompts
+# Plantillas de prompt (registro compilado con hot-reload)
 # -------------------------
-REPO_ROOT = Path(__file__).resolve().parents[2]
-
-def _resolve_prompts_dir() -> Path:
-    tried: List[Path] = []
-    # 1) Si viene por settings (PROMPTS_DIR), respétalo
-    env_dir = getattr(settings, "prompts_dir", None)
-    if env_dir:
-        p = Path(env_dir)
-        if not p.is_absolute():
-            p = (REPO_ROOT / p).resolve()
-        tried.append(p)
-        if p.exists():
-            return p
-    # 2) Default preferido: api/prompts
-    p_api = (REPO_ROOT / "api" / "prompts").resolve()
-    tried.append(p_api)
-    if p_api.exists():
-        return p_api
-    # 3) Alternativa: prompts en raíz
-    p_root = (REPO_ROOT / "prompts").resolve()
-    tried.append(p_root)
-    if p_root.exists():
-        return p_root
-    # Si nada existe, devolvemos error claro
-    raise FileNotFoundError(
-        "No se encuentra la carpeta de prompts. Rutas intentadas:\n" +
-        "\n".join(f"- {str(t)}" for t in tried)
-    )
-
-PROMPTS_DIR = _resolve_prompts_dir()
-
 _TEMPLATE_MAP = {
     "strict":   "recipes.generate.strict.txt",
     "hybrid":   "recipes.generate.hybrid.txt",
     "creative": "recipes.generate.creative.txt",
 }
 
-def _read_template(mode: str) -> str:
+def _get_template(mode: str) -> PromptTemplate:
     fname = _TEMPLATE_MAP.get(mode)
     if not fname:
         raise FileNotFoundError(f"Modo no soportado: {mode}")
-    path = PROMPTS_DIR / fname
-    if not path.exists():
-        raise FileNotFoundError(f"No se encuentra la plantilla de prompt: {path}")
-    return path.read_text(encoding="utf-8")
+    return prompt_registry.get(fname)
 
 # -------------------------
 # Utilidades de RAG + LLM
@@ -115,7 +86,7 @@ def _format_context(hits: List[Dict[str, Any]]) -> str:
     return "\n\n---\n\n".join(blocks)
 
 def _render_prompt(req: RecipeGenRequest, context: str) -> str:
-    tpl = _read_template(req.mode)
+    tpl = _get_template(req.mode)
     # Requisitos del usuario en texto
     user_bits = []
     if req.ingredients:
@@ -130,7 +101,8 @@ def _render_prompt(req: RecipeGenRequest, context: str) -> str:
     allowed_appl = req.appliances or ['sartén','horno','airfryer','microondas','robot']
     allowed_appl_str = json.dumps(allowed_appl, ensure_ascii=False)
 
-    filled = tpl.format(
+    # Las plantillas llevan todo el texto fijo delante y estos campos al final
+    filled = tpl.render(
         appliances_allowed=allowed_appl_str,
         portions=req.portions,
         context=context,
@@ -138,14 +110,35 @@ def _render_prompt(req: RecipeGenRequest, context: str) -> str:
     )
     return filled
 
-async def _call_llm(prompt: str) -> str:
+async def _call_llm(prompt: str, validate: Optional[Callable[[Any], Any]] = None) -> str:
+    """
+    Llama al LLM y devuelve el texto JSON. Con streaming (por defecto) se corta en
+    cuanto el JSON está completo y valida con `validate`; si la salida es inválida
+    se aborta y reintenta sin esperar a que el modelo termine.
+    """
     model = getattr(settings, "azure_openai_deployment_llm", None) or "gpt-4o-mini"
+    timeout = getattr(settings, "azure_openai_timeout_s", 60.0)
+    if settings.llm_stream_json:
+        last_exc: Optional[JSONStreamError] = None
+        for _ in range(max(1, settings.llm_stream_attempts)):
+            try:
+                return await stream_json(prompt, model=model, timeout=timeout, validate=validate)
+            except JSONStreamError as e:
+                PARSE_FAILURES.labels("stream").inc()
+                last_exc = e
+        assert last_exc is not None
+        raise last_exc
+
     url = settings.azure_openai_endpoint.rstrip("/") + "/api/generate"
-    async with httpx.AsyncClient(timeout=getattr(settings, "azure_openai_timeout_s", 60.0)) as client:
-        r = await client.post(url, json={"model": model, "prompt": prompt, "stream": False})
-        r.raise_for_status()
-        data = r.json()
-        return data.get("response", "")
+    llm_breaker.check()
+    async with llm_limiter.slot(), llm_breaker.call():
+        with llm_call(model):
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                r = await client.post(url, json={"model": model, "prompt": prompt, "stream": False})
+                r.raise_for_status()
+                data = r.json()
+                charge_tokens(observe_llm_usage(model, data))
+                return data.get("response", "")
 
 def _extract_json(text: str) -> Dict[str, Any]:
     s = text.strip()
@@ -161,31 +154,74 @@ def _extract_json(text: str) -> Dict[str, Any]:
             return json.loads(s[start:end+1])
         raise
 
+# LLM caído, lento o con el breaker abierto: se sirve el fallback sin reintentar
+LLM_UNAVAILABLE = (CircuitOpenError, LLMError, httpx.HTTPError)
+
+def _fallback_recipe(ingredients: List[str], portions: int, appliances: List[str], reason: str) -> RecipeNeutral:
+    """Receta determinista (preparar + cocinar) cuando no hay salida válida del LLM."""
+    return RecipeNeutral(**{
+        "title": "Receta generada",
+        "portions": portions,
+        "steps_generic": [
+            {
+                "action": "prep",
+                "description": "Preparar ingredientes básicos.",
+                "ingredients": [*ingredients],
+                "tools": [],
+                "temperature_c": None,
+                "time_min": 5,
+                "speed": None,
+                "notes": f"Fallback: {reason}.",
+                "batching": False
+            },
+            {
+                "action": "cook",
+                "description": "Cocinar con el electrodoméstico disponible más conveniente.",
+                "ingredients": [*ingredients],
+                "tools": appliances[:1] if appliances else [],
+                "temperature_c": 190 if ("airfryer" in appliances) else None,
+                "time_min": 12,
+                "speed": None,
+                "notes": None,
+                "batching": False
+            }
+        ]
+    })
+
+def _is_fallback_recipe(recipe: RecipeNeutral) -> bool:
+    """¿Es la receta determinista de `_fallback_recipe` (no salió del LLM)?"""
+    return any((step.notes or "").startswith("Fallback:") for step in recipe.steps_generic)
+
+def _recipe_from_data(data: Dict[str, Any], portions: int) -> RecipeNeutral:
+    return RecipeNeutral(**{
+        "title": data.get("title") or "Receta",
+        "portions": int(data.get("portions") or portions),
+        "steps_generic": data.get("steps_generic") or [],
+        "ingredients": data.get("ingredients"),
+    })
+
 # -------------------------
 # Endpoint principal
 # -------------------------
-@router.post("/generate", response_model=RecipeGenResponse, summary="Generar receta con RAG (modo: strict|hybrid|creative)")
+@router.post(
+    "/generate",
+    response_model=RecipeGenResponse,
+    summary="Generar receta con RAG (modo: strict|hybrid|creative)",
+    responses={503: {"description": "Cola de generación llena (ver Retry-After)"}},
+)
 async def generate_recipe(
     req: RecipeGenRequest = Body(...),
     user_id: str = Depends(get_current_user),
 ):
-    # 1) Embeddings de la consulta
-    query = _build_query(req)
-    emb = await embed_dual([query])
-
-    # 2) Preparar query_vectors
-    dims = settings.parsed_vector_dims()
-    query_vectors: Dict[str, List[float]] = {}
-    for key in dims.keys():  # e.g. vector names
-        vecs = emb.get(key) or []
-        if not vecs or not isinstance(vecs[0], list) or len(vecs[0]) != dims[key]:
-            continue
-        query_vectors[key] = vecs[0]
-    if not query_vectors:
-        raise HTTPException(500, "Fallo al preparar embeddings de búsqueda (sin vectores válidos).")
+    # Petición interactiva: va por delante de planner/agregados en la cola del LLM
+    with llm_context("interactive", user_id):
+        return await _generate_recipe(req)
 
-    # 3) Búsqueda RAG
-    hits = await search(query_vectors, top_k=req.top_k)
+
+async def _generate_recipe(req: RecipeGenRequest) -> RecipeGenResponse:
+    # 1-3) Embeddings + búsqueda RAG (sin contexto si Qdrant/embeddings no responden)
+    query = _build_query(req)
+    hits = await retrieve(query, top_k=req.top_k)
 
     # 4) Contexto y fuentes
     context = _format_context(hits)
@@ -203,51 +239,30 @@ async def generate_recipe(
 
     # 5) Render de prompt desde archivo
     try:
-        prompt = _render_prompt(req, context)
+        with stage("prompt"):
+            prompt = _render_prompt(req, context)
     except FileNotFoundError as e:
         raise HTTPException(500, str(e))
 
-    # 6) LLM
-    raw = await _call_llm(prompt)
+    # 6) LLM (en streaming se valida contra RecipeNeutral según llega)
+    try:
+        raw = await _call_llm(prompt, validate=lambda d: _recipe_from_data(d, req.portions))
+    except JSONStreamError:
+        raw = ""  # sin JSON válido tras los reintentos → fallback
+    except LLM_UNAVAILABLE:
+        FALLBACKS.labels("generate", "llm_unavailable").inc()
+        recipe = _fallback_recipe(req.ingredients, req.portions, req.appliances, "modelo no disponible")
+        return RecipeGenResponse(recipe=recipe, mode=req.mode, sources=sources)
 
     # 7) Parseo/validación
     try:
-        data = _extract_json(raw)
-        recipe = RecipeNeutral(**{
-            "title": data.get("title") or "Receta",
-            "portions": int(data.get("portions") or req.portions),
-            "steps_generic": data.get("steps_generic") or []
-        })
+        with stage("parse"):
+            data = _extract_json(raw)
+            recipe = _recipe_from_data(data, req.portions)
     except Exception:
         # Fallback seguro si el LLM devolviera algo raro
-        safe = {
-            "title": "Receta generada",
-            "portions": req.portions,
-            "steps_generic": [
-                {
-                    "action": "prep",
-                    "description": "Preparar ingredientes básicos.",
-                    "ingredients": [*req.ingredients],
-                    "tools": [],
-                    "temperature_c": None,
-                    "time_min": 5,
-                    "speed": None,
-                    "notes": "Fallback: estructura inválida del modelo.",
-                    "batching": False
-                },
-                {
-                    "action": "cook",
-                    "description": "Cocinar con el electrodoméstico disponible más conveniente.",
-                    "ingredients": [*req.ingredients],
-                    "tools": req.appliances[:1] if req.appliances else [],
-                    "temperature_c": 190 if ("airfryer" in req.appliances) else None,
-                    "time_min": 12,
-                    "speed": None,
-                    "notes": None,
-                    "batching": False
-                }
-            ]
-        }
-        recipe = RecipeNeutral(**safe)
+        PARSE_FAILURES.labels("recipe").inc()
+        FALLBACKS.labels("generate", "parse").inc()
+        recipe = _fallback_recipe(req.ingredients, req.portions, req.appliances, "estructura inválida del modelo")
 
     return RecipeGenResponse(recipe=recipe, mode=req.mode, sources=sources)
@@ -1,19 +1,29 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any
-from datetime import date, timedelta, datetime
+import asyncio
+import hashlib
+import json
+import re
+from typing import Iterator, List, Dict, Any, Literal, Optional, Tuple
+from datetime import date, time, timedelta, datetime, timezone
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, Body, HTTPException, Query
+from fastapi import APIRouter, Depends, Body, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, AliasChoices, ConfigDict
 
 from sqlmodel import Session, select
+from sqlalchemy import func
 
-from ..db import get_session
+from .. import db
+from ..db import get_session, upsert_insert
 from ..security import get_current_user
 from ..config import settings
 from ..schemas import RecipeNeutral  # ✅ NO importamos RecipePlan
 from ..models_db import PlanEntry
+from ..llm_scheduler import llm_context, LLMQueueFull
+from ..metrics import stage, PARSE_FAILURES, FALLBACKS
+from ..utils.json_stream import JSONStreamError
 
 # Reutilizamos utilidades del generador para mantener prompts/estilo coherentes
 from .generate import (
@@ -23,10 +33,28 @@ from .generate import (
     _render_prompt as render_prompt,
     _extract_json as extract_json,
     _call_llm as call_llm,
+    _fallback_recipe as fallback_recipe,
+    LLM_UNAVAILABLE,
 )
 
-from ..embeddings import embed_dual
-from ..vectorstore import search
+from ..rag import retrieve
+from ..services.seed_retrieval import seed_retrieval
+from ..services.ingredient_lines import index_recipe, plan_lines_resolver, PLAN as PLAN_LINES
+from ..services.versions import bump_version, PLAN as PLAN_VERSION
+from ..prompt_registry import prompt_registry
+from ..utils.ical import stream_calendar, vevent
+
+WEEK_TEMPLATE = "planner.week.txt"
+
+# Hora local (flotante) y etiqueta de cada comida en el calendario
+MEAL_SLOTS = {
+    "breakfast": (time(8, 30), "Desayuno"),
+    "lunch": (time(14, 0), "Comida"),
+    "dinner": (time(21, 0), "Cena"),
+}
+# Súbelo si cambia el formato del .ics: invalida los ETag ya emitidos
+ICAL_FORMAT_VERSION = "1"
+ICAL_MAX_DAYS = 366
 
 router = APIRouter(tags=["planner"], prefix="/planner")
 
@@ -108,6 +136,89 @@ def _seed_pool(dietary: List[str], sin_gluten: bool) -> List[List[str]]:
     return base
 
 
+def _week_seeds(dietary: List[str]) -> List[List[str]]:
+    """Rotación de semillas de ingredientes para los 7 días."""
+    sin_gluten = any("sin gluten" == d.lower() for d in dietary)
+    seeds = _seed_pool(dietary, sin_gluten)
+    return [seeds[i % len(seeds)] for i in range(7)]
+
+
+MEALS = ("breakfast", "lunch", "dinner")
+Meal = Literal["breakfast", "lunch", "dinner"]
+
+
+def _breakfast_pool(dietary: List[str], sin_gluten: bool) -> List[List[str]]:
+    """Semillas de desayuno; las de comida y cena salen de _seed_pool."""
+    vegano = "vegano" in {d.lower() for d in dietary}
+    base = [
+        ["avena", "plátano", "canela"],
+        ["huevos", "tostada", "tomate"],
+        ["yogur", "frutos rojos", "nueces"],
+        ["tostada", "aguacate", "tomate"],
+        ["avena", "manzana", "yogur"],
+        ["huevos", "espinacas", "queso"],
+        ["tostada", "tomate", "aceite de oliva"],
+    ]
+    if vegano:
+        swap = {"huevos": "tofu", "yogur": "yogur de soja", "queso": "levadura nutricional"}
+        base = [[swap.get(x, x) for x in t] for t in base]
+    if sin_gluten:
+        swap = {"tostada": "tostada sin gluten", "avena": "avena sin gluten"}
+        base = [[swap.get(x, x) for x in t] for t in base]
+    return base
+
+
+def _meal_pool(dietary: List[str], meal: str) -> List[List[str]]:
+    sin_gluten = any("sin gluten" == d.lower() for d in dietary)
+    if meal == "breakfast":
+        return _breakfast_pool(dietary, sin_gluten)
+    return _seed_pool(dietary, sin_gluten)
+
+
+def _slot_seed(dietary: List[str], plan_date: date, meal: str, avoid: str = "") -> List[str]:
+    """
+    Semilla de un hueco (día + comida). La cena coincide con la rotación semanal
+    (_week_seeds); la comida va desplazada para no repetir la cena del mismo día.
+    Con `avoid` (título actual) se salta a la siguiente semilla cuyo ingrediente
+    principal no aparezca en él, para que regenerar cambie realmente el plato.
+    """
+    pool = _meal_pool(dietary, meal)
+    start = plan_date.weekday() + (3 if meal == "lunch" else 0)
+    order = [pool[(start + i) % len(pool)] for i in range(len(pool))]
+    avoid = avoid.lower()
+    for seed in order:
+        if not avoid or seed[0].lower() not in avoid:
+            return seed
+    return order[0]
+
+
+def all_seed_triplets() -> List[List[str]]:
+    """Todas las semillas posibles (omnívoro/vegetariano, con o sin gluten), para precalcular su RAG."""
+    out: List[List[str]] = []
+    for dietary in ([], ["vegetariano"]):
+        for sin_gluten in (False, True):
+            out.extend(_seed_pool(dietary, sin_gluten))
+            out.extend(_breakfast_pool(dietary, sin_gluten))
+    return out
+
+
+async def _retrieve_for_seed(gen_req: RecipeGenRequest, top_k: int) -> List[Dict[str, Any]]:
+    hits = await seed_retrieval.lookup(gen_req.ingredients, top_k)
+    if hits is None:
+        # Semilla no precalculada (o colección cambiada): embeddings + búsqueda en vivo
+        hits = await retrieve(build_query(gen_req), top_k=top_k)
+    return hits
+
+
+def _coerce_recipe(data: Dict[str, Any], portions: int) -> RecipeNeutral:
+    return RecipeNeutral(
+        title=str(data.get("title") or "Receta"),
+        portions=int(data.get("portions") or portions),
+        steps_generic=_fix_steps(data.get("steps_generic") or []),
+        ingredients=data.get("ingredients"),
+    )
+
+
 async def _generate_recipe_neutral(
     ingredients: List[str],
     portions: int,
@@ -126,70 +237,168 @@ async def _generate_recipe_neutral(
         mode=mode,  # "hybrid" por defecto
     )
 
-    # 1) Embeddings de la consulta
-    query = build_query(gen_req)
-    emb = await embed_dual([query])
-
-    # 2) Vectores válidos para Qdrant
-    dims = settings.parsed_vector_dims()
-    query_vectors: Dict[str, List[float]] = {}
-    for key in dims.keys():  # e.g. vector names
-        vecs = emb.get(key) or []
-        if vecs and isinstance(vecs[0], list) and len(vecs[0]) == dims[key]:
-            query_vectors[key] = vecs[0]
-    if not query_vectors:
-        raise HTTPException(500, "Fallo preparando embeddings de búsqueda (no hay vectores válidos).")
-
-    # 3) Búsqueda RAG
-    hits = await search(query_vectors, top_k=top_k)
+    # 1-3) RAG: hits precalculados si es una semilla fija; si no, embeddings + búsqueda
+    hits = await _retrieve_for_seed(gen_req, top_k)
 
     # 4) Prompt desde plantilla y llamada LLM
     context = format_context(hits)
-    prompt = render_prompt(gen_req, context)
-    raw = await call_llm(prompt)
+    with stage("prompt"):
+        prompt = render_prompt(gen_req, context)
+    try:
+        raw = await call_llm(prompt, validate=lambda d: _coerce_recipe(d, portions))
+    except JSONStreamError:
+        raw = ""  # sin JSON válido tras los reintentos → fallback
+    except LLM_UNAVAILABLE:
+        FALLBACKS.labels("planner", "llm_unavailable").inc()
+        return fallback_recipe(ingredients, portions, appliances, "modelo no disponible")
 
     # 5) Parseo/validación y fixes mínimos
     try:
-        data = extract_json(raw)
-        recipe = RecipeNeutral(
-            title=str(data.get("title") or "Receta"),
-            portions=int(data.get("portions") or portions),
-            steps_generic=_fix_steps(data.get("steps_generic") or []),
-        )
+        with stage("parse"):
+            data = extract_json(raw)
+            recipe = _coerce_recipe(data, portions)
     except Exception:
         # Fallback seguro si el modelo devuelve algo fuera de formato
-        recipe = RecipeNeutral(
-            title="Receta generada",
+        PARSE_FAILURES.labels("recipe").inc()
+        FALLBACKS.labels("planner", "parse").inc()
+        recipe = fallback_recipe(ingredients, portions, appliances, "estructura inválida del modelo")
+
+    return recipe
+
+
+async def _generate_days(
+    seeds: List[List[str]],
+    portions: int,
+    appliances: List[str],
+    dietary: List[str],
+) -> List[RecipeNeutral]:
+    """
+    Genera una receta por semilla en paralelo (como mucho `planner_day_concurrency`
+    a la vez) y devuelve las recetas en el mismo orden. Si un día falla se usa el
+    fallback determinista para ese día; si fallan todos por cola llena, 503.
+    """
+    sem = asyncio.Semaphore(max(1, settings.planner_day_concurrency))
+
+    async def one_day(seed: List[str]) -> RecipeNeutral | LLMQueueFull:
+        async with sem:
+            try:
+                return await _generate_recipe_neutral(
+                    ingredients=seed,
+                    portions=portions,
+                    appliances=appliances,
+                    dietary=dietary,
+                    top_k=5,
+                    mode="hybrid",
+                )
+            except LLMQueueFull as e:
+                return e
+            except Exception:
+                FALLBACKS.labels("planner", "day_error").inc()
+                return fallback_recipe(seed, portions, appliances, "error generando el día")
+
+    out = await asyncio.gather(*(one_day(seed) for seed in seeds))
+    rejected = [r for r in out if isinstance(r, LLMQueueFull)]
+    if rejected and len(rejected) == len(out):
+        raise rejected[0]
+    recipes: List[RecipeNeutral] = []
+    for seed, r in zip(seeds, out):
+        if isinstance(r, LLMQueueFull):
+            FALLBACKS.labels("planner", "queue_full").inc()
+            r = fallback_recipe(seed, portions, appliances, "cola de generación llena")
+        recipes.append(r)
+    return recipes
+
+
+def _dedup_hits(hit_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Une los pasajes de varias búsquedas sin repetir (por id o texto), de mayor a menor score."""
+    best: Dict[str, Dict[str, Any]] = {}
+    for hits in hit_lists:
+        for h in hits:
+            key = str(h.get("id") or (h.get("payload") or {}).get("text"))
+            if key not in best or float(h.get("score", 0.0)) > float(best[key].get("score", 0.0)):
+                best[key] = h
+    return sorted(best.values(), key=lambda h: float(h.get("score", 0.0)), reverse=True)
+
+
+def _require_list(data: Any) -> None:
+    if not isinstance(data, list):
+        raise ValueError("Se esperaba un array JSON")
+
+
+def _extract_json_array(text: str) -> List[Any]:
+    s = (text or "").strip()
+    if s.startswith("```"):
+        s = re.sub(r"^```(?:json)?\s*", "", s)
+        s = re.sub(r"\s*```$", "", s)
+    try:
+        data = json.loads(s)
+    except Exception:
+        start = s.find("["); end = s.rfind("]")
+        if start == -1 or end <= start:
+            raise
+        data = json.loads(s[start:end + 1])
+    _require_list(data)
+    return data
+
+
+async def _generate_week_one_shot(
+    seeds: List[List[str]],
+    portions: int,
+    appliances: List[str],
+    dietary: List[str],
+) -> List[RecipeNeutral]:
+    """
+    Un único prompt con todas las semillas y el contexto RAG deduplicado; se espera
+    un array con una receta por semilla. Cada receta se valida por separado y sólo
+    los días inválidos o ausentes se regeneran con el camino por día.
+    """
+    gen_reqs = [
+        RecipeGenRequest(ingredients=seed, portions=portions, appliances=appliances, dietary=dietary)
+        for seed in seeds
+    ]
+    hit_lists = await asyncio.gather(*(_retrieve_for_seed(r, 5) for r in gen_reqs))
+    context = format_context(_dedup_hits(hit_lists))[: settings.planner_week_context_chars]
+
+    with stage("prompt"):
+        prompt = prompt_registry.render(
+            WEEK_TEMPLATE,
+            appliances_allowed=json.dumps(appliances or ["sartén", "horno", "airfryer", "microondas", "robot"], ensure_ascii=False),
             portions=portions,
-            steps_generic=_fix_steps(
-                [
-                    {
-                        "action": "prep",
-                        "description": "Preparar ingredientes básicos.",
-                        "ingredients": [*ingredients],
-                        "tools": [],
-                        "temperature_c": None,
-                        "time_min": 5,
-                        "speed": None,
-                        "notes": "Fallback: estructura inválida del modelo.",
-                        "batching": False,
-                    },
-                    {
-                        "action": "cook",
-                        "description": "Cocinar con el electrodoméstico disponible más conveniente.",
-                        "ingredients": [*ingredients],
-                        "tools": appliances[:1] if appliances else [],
-                        "temperature_c": 190 if ("airfryer" in appliances) else None,
-                        "time_min": 12,
-                        "speed": None,
-                        "notes": None,
-                        "batching": False,
-                    },
-                ]
-            ),
+            dietary=", ".join(dietary) or "ninguna",
+            days="\n".join(f"{i}. {', '.join(seed)}" for i, seed in enumerate(seeds, start=1)),
+            context=context,
         )
 
-    return recipe
+    recipes: List[Optional[RecipeNeutral]] = [None] * len(seeds)
+    try:
+        raw = await call_llm(prompt, validate=_require_list)
+    except (JSONStreamError, *LLM_UNAVAILABLE):
+        raw = ""
+    try:
+        with stage("parse"):
+            items = _extract_json_array(raw)
+    except Exception:
+        items = []
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        day = item.get("day")
+        idx = day - 1 if isinstance(day, int) and 1 <= day <= len(seeds) else pos
+        if idx >= len(seeds) or recipes[idx] is not None:
+            continue
+        try:
+            recipes[idx] = _coerce_recipe(item, portions)
+        except Exception:
+            continue
+
+    invalid = [i for i, r in enumerate(recipes) if r is None]
+    if invalid:
+        PARSE_FAILURES.labels("week_day").inc(len(invalid))
+        FALLBACKS.labels("planner", "one_shot_regenerate").inc(len(invalid))
+        regenerated = await _generate_days([seeds[i] for i in invalid], portions, appliances, dietary)
+        for i, r in zip(invalid, regenerated):
+            recipes[i] = r
+    return [r for r in recipes if r is not None]
 
 
 # ------------------------------------------------------
@@ -210,6 +419,11 @@ class WeekGenRequest(BaseModel):
     appliances: List[str] = Field(default_factory=list, description="Electrodomésticos disponibles")
     dietary: List[str] = Field(default_factory=list, description="Preferencias/restricciones")
     persist: bool = Field(True, description="Si true, persiste el plan generado")
+    strategy: Optional[Literal["per_day", "one_shot"]] = Field(
+        None,
+        description="per_day: una llamada por día; one_shot: un único prompt con las 7 recetas "
+                    "(sólo se regeneran los días inválidos). Por defecto, PLANNER_WEEK_STRATEGY.",
+    )
 
 
 class RecipePlanOut(BaseModel):
@@ -224,6 +438,113 @@ class RecipePlanOut(BaseModel):
     created_at: datetime
 
 
+class SlotRegenRequest(BaseModel):
+    """Regenera una sola comida del plan (una llamada al LLM)."""
+    plan_date: date = Field(..., description="Día a regenerar (YYYY-MM-DD)")
+    meal: Meal = Field("dinner", description="breakfast|lunch|dinner")
+    ingredients: Optional[List[str]] = Field(
+        None, description="Semilla de ingredientes; por defecto, la siguiente de la rotación distinta del plato actual"
+    )
+    portions: Optional[int] = Field(None, ge=1, le=12, description="Por defecto, las de la entrada existente")
+    appliances: Optional[List[str]] = Field(None, description="Por defecto, los de la entrada existente")
+    dietary: List[str] = Field(default_factory=list, description="Preferencias/restricciones")
+
+
+class PlanExtendRequest(BaseModel):
+    """Amplía el plan a más semanas y/o comidas generando sólo los huecos vacíos."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    start: date = Field(
+        ...,
+        description="Semana inicial (se normaliza al lunes). Acepta 'start' o 'start_date'.",
+        validation_alias=AliasChoices("start", "start_date"),
+    )
+    weeks: int = Field(1, ge=1, le=8, description="Número de semanas a cubrir")
+    meals: List[Meal] = Field(default_factory=lambda: ["dinner"], min_length=1, description="Comidas por día")
+    portions: int = Field(2, ge=1, le=12, description="Raciones por receta")
+    appliances: List[str] = Field(default_factory=list, description="Electrodomésticos disponibles")
+    dietary: List[str] = Field(default_factory=list, description="Preferencias/restricciones")
+
+
+class PlanExtendOut(BaseModel):
+    created: List[RecipePlanOut]
+    existing: int = Field(..., description="Huecos que ya tenían receta y no se han regenerado")
+
+
+def _entry_out(r: PlanEntry) -> RecipePlanOut:
+    try:
+        recipe = RecipeNeutral(**(r.recipe or {}))
+    except Exception:
+        recipe = RecipeNeutral(title=r.title or "Receta", portions=r.portions or 2, steps_generic=[])
+    return RecipePlanOut(
+        plan_date=r.plan_date,
+        meal=r.meal,
+        portions=r.portions,
+        appliances=r.appliances or [],
+        title=r.title or recipe.title,
+        id=r.id,
+        recipe=recipe,
+        created_at=r.created_at,
+    )
+
+
+def upsert_plan_entries(
+    session: Session,
+    user_id: str,
+    slots: List[Tuple[date, str, RecipeNeutral]],
+    portions: int,
+    appliances: List[str],
+) -> List[PlanEntry]:
+    """
+    Inserta o reemplaza las recetas de los huecos (plan_date, meal) con un único
+    INSERT ... ON CONFLICT; conserva id y created_at de las entradas existentes.
+    Devuelve las entradas en el orden de `slots`. No hace commit.
+    """
+    if not slots:
+        return []
+    now = datetime.now(timezone.utc)
+    values = [
+        {
+            "id": str(uuid4()),
+            "user_id": user_id,
+            "plan_date": d,
+            "meal": m,
+            "portions": portions,
+            "appliances": appliances,
+            "title": recipe.title or "Receta",
+            "recipe": recipe.model_dump(),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for d, m, recipe in slots
+    ]
+    stmt = upsert_insert(session, PlanEntry).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "plan_date", "meal"],
+        set_={c: stmt.excluded[c] for c in ("portions", "appliances", "title", "recipe", "updated_at")},
+    )
+    session.execute(stmt)
+
+    dates = [d for d, _, _ in slots]
+    rows = session.exec(
+        select(PlanEntry).where(
+            PlanEntry.user_id == user_id,
+            PlanEntry.plan_date >= min(dates),
+            PlanEntry.plan_date <= max(dates),
+            PlanEntry.meal.in_({m for _, m, _ in slots}),
+        ).execution_options(populate_existing=True)
+    ).all()
+    by_slot = {(r.plan_date, r.meal): r for r in rows}
+    entries = [by_slot[(d, m)] for d, m, _ in slots]
+    # Líneas de ingredientes en la misma transacción (la lista de la compra ya no lee el JSON)
+    indexed = [index_recipe(session, user_id, PLAN_LINES, entry.id, d, recipe) for entry, (d, _, recipe) in zip(entries, slots)]
+    if not all(indexed):
+        # Recetas sin ingredientes conocidos: el LLM los extrae en segundo plano, no al leer
+        plan_lines_resolver.schedule_after_commit(session, user_id, min(dates), max(dates))
+    bump_version(session, user_id, PLAN_VERSION)
+    return entries
+
+
 # ------------------------------------------------------
 # Endpoints
 # ------------------------------------------------------
@@ -231,68 +552,54 @@ class RecipePlanOut(BaseModel):
     "/generate-week",
     summary="Generar plan semanal (1 cena/día, modo híbrido con RAG)",
     response_model=List[RecipePlanOut],
+    responses={503: {"description": "Cola de generación llena (ver Retry-After)"}},
 )
 async def generate_week(
     req: WeekGenRequest = Body(...),
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    monday, _ = week_bounds(req.start)
-
-    # Construye una rotación de semillas de ingredientes
-    sin_gluten = any("sin gluten" == d.lower() for d in req.dietary)
-    seeds = _seed_pool(req.dietary, sin_gluten)
+    # 7 llamadas (en paralelo acotado): clase "batch" para no bloquear las peticiones interactivas
+    with llm_context("batch", user_id):
+        return await _generate_week(req, session, user_id)
 
-    results: List[RecipePlanOut] = []
-    for i in range(7):
-        plan_date = monday + timedelta(days=i)
-        seed = seeds[i % len(seeds)]
 
-        # Genera receta anclada al RAG (modo híbrido)
-        recipe = await _generate_recipe_neutral(
-            ingredients=seed,
-            portions=req.portions,
-            appliances=req.appliances,
-            dietary=req.dietary,
-            top_k=5,
-            mode="hybrid",
-        )
+async def _generate_week(req: WeekGenRequest, session: Session, user_id: str) -> List[RecipePlanOut]:
+    monday, _ = week_bounds(req.start)
 
-        # Crea el objeto de respuesta (y opcionalmente persistimos)
-        title = recipe.title or "Receta"
-        rid = str(uuid4())
-
-        if req.persist:
-            entry = PlanEntry(
-                id=rid,
-                user_id=user_id,
-                plan_date=plan_date,
-                meal="dinner",
-                portions=req.portions,
-                appliances=req.appliances,
-                title=title,
-                recipe=recipe.model_dump(),
-                created_at=datetime.utcnow(),
-            )
-            session.add(entry)
-
-        results.append(
-            RecipePlanOut(
-                plan_date=plan_date,
-                meal="dinner",
-                portions=req.portions,
-                appliances=req.appliances,
-                title=title,
-                id=rid,
-                recipe=recipe,
-                created_at=datetime.utcnow(),
-            )
-        )
+    days = [monday + timedelta(days=i) for i in range(7)]
+    strategy = req.strategy or settings.planner_week_strategy
+    generate = _generate_week_one_shot if strategy == "one_shot" else _generate_days
+    recipes = await generate(
+        _week_seeds(req.dietary),
+        portions=req.portions,
+        appliances=req.appliances,
+        dietary=req.dietary,
+    )
 
     if req.persist:
+        # Una sola sentencia y una transacción para toda la semana; regenerar la
+        # semana reemplaza las cenas existentes en vez de duplicarlas
+        entries = upsert_plan_entries(
+            session, user_id, [(d, "dinner", r) for d, r in zip(days, recipes)], req.portions, req.appliances
+        )
         session.commit()
+        return [_entry_out(e) for e in entries]
 
-    return results
+    now = datetime.now(timezone.utc)
+    return [
+        RecipePlanOut(
+            plan_date=plan_date,
+            meal="dinner",
+            portions=req.portions,
+            appliances=req.appliances,
+            title=recipe.title or "Receta",
+            id=str(uuid4()),
+            recipe=recipe,
+            created_at=now,
+        )
+        for plan_date, recipe in zip(days, recipes)
+    ]
 
 
 @router.get(
@@ -311,25 +618,192 @@ def get_week(
             PlanEntry.user_id == user_id,
             PlanEntry.plan_date >= monday,
             PlanEntry.plan_date <= sunday,
-        ).order_by(PlanEntry.plan_date)
+        ).order_by(PlanEntry.plan_date, PlanEntry.meal)
     ).all()
 
-    out: List[RecipePlanOut] = []
-    for r in rows:
-        try:
-            recipe = RecipeNeutral(**(r.recipe or {}))
-        except Exception:
-            recipe = RecipeNeutral(title=r.title or "Receta", portions=r.portions or 2, steps_generic=[])
-        out.append(
-            RecipePlanOut(
-                plan_date=r.plan_date,
-                meal=r.meal,
-                portions=r.portions,
-                appliances=r.appliances or [],
-                title=r.title or recipe.title,
-                id=r.id,
-                recipe=recipe,
-                created_at=r.created_at,
-            )
+    return [_entry_out(r) for r in rows]
+
+
+@router.post(
+    "/entries/regenerate",
+    summary="Regenerar una sola comida del plan (día + comida)",
+    response_model=RecipePlanOut,
+    responses={503: {"description": "Cola de generación llena (ver Retry-After)"}},
+)
+async def regenerate_entry(
+    req: SlotRegenRequest = Body(...),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    entry = session.exec(
+        select(PlanEntry).where(
+            PlanEntry.user_id == user_id,
+            PlanEntry.plan_date == req.plan_date,
+            PlanEntry.meal == req.meal,
         )
-    return out
+    ).first()
+    portions = req.portions or (entry.portions if entry else 2)
+    appliances = req.appliances if req.appliances is not None else ((entry.appliances or []) if entry else [])
+    seed = req.ingredients or _slot_seed(req.dietary, req.plan_date, req.meal, avoid=(entry.title or "") if entry else "")
+
+    # Una sola receta y el usuario espera la respuesta: prioridad interactiva
+    with llm_context("interactive", user_id):
+        recipe = await _generate_recipe_neutral(
+            ingredients=seed,
+            portions=portions,
+            appliances=appliances,
+            dietary=req.dietary,
+        )
+
+    (entry,) = upsert_plan_entries(session, user_id, [(req.plan_date, req.meal, recipe)], portions, appliances)
+    session.commit()
+    return _entry_out(entry)
+
+
+@router.post(
+    "/extend",
+    summary="Ampliar el plan a varias semanas/comidas generando sólo los huecos vacíos",
+    response_model=PlanExtendOut,
+    responses={503: {"description": "Cola de generación llena (ver Retry-After)"}},
+)
+async def extend_plan(
+    req: PlanExtendRequest = Body(...),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    monday, _ = week_bounds(req.start)
+    last = monday + timedelta(days=7 * req.weeks - 1)
+    meals = list(dict.fromkeys(req.meals))
+
+    rows = session.exec(
+        select(PlanEntry.plan_date, PlanEntry.meal).where(
+            PlanEntry.user_id == user_id,
+            PlanEntry.plan_date >= monday,
+            PlanEntry.plan_date <= last,
+        )
+    ).all()
+    taken = {(d, m) for d, m in rows}
+    slots = [(monday + timedelta(days=i), meal) for i in range(7 * req.weeks) for meal in meals]
+    missing = [s for s in slots if s not in taken]
+    if not missing:
+        return PlanExtendOut(created=[], existing=len(slots))
+
+    with llm_context("batch", user_id):
+        recipes = await _generate_days(
+            [_slot_seed(req.dietary, d, m) for d, m in missing],
+            portions=req.portions,
+            appliances=req.appliances,
+            dietary=req.dietary,
+        )
+
+    entries = upsert_plan_entries(
+        session, user_id, [(d, m, r) for (d, m), r in zip(missing, recipes)], req.portions, req.appliances
+    )
+    session.commit()
+    return PlanExtendOut(created=[_entry_out(e) for e in entries], existing=len(slots) - len(missing))
+
+
+# ------------------------------------------------------
+# Exportación iCal
+# ------------------------------------------------------
+def _plan_etag(session: Session, user_id: str, first: date, last: date) -> str:
+    """ETag débil a partir de (nº de entradas, última modificación) del rango: una sola consulta agregada."""
+    count, last_mod = session.exec(
+        select(func.count(PlanEntry.id), func.max(func.coalesce(PlanEntry.updated_at, PlanEntry.created_at))).where(
+            PlanEntry.user_id == user_id,
+            PlanEntry.plan_date >= first,
+            PlanEntry.plan_date <= last,
+        )
+    ).one()
+    raw = f"{ICAL_FORMAT_VERSION}|{user_id}|{first}|{last}|{count}|{last_mod}"
+    return 'W/"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip() for t in if_none_match.split(",")}
+    # Comparación débil: W/"x" equivale a "x"
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+
+def _ical_event(r: PlanEntry) -> str:
+    start, label = MEAL_SLOTS.get(r.meal, (time(13, 0), r.meal))
+    steps = (r.recipe or {}).get("steps_generic") or []
+    minutes = sum(int(st.get("time_min") or 0) for st in steps if isinstance(st, dict)) or 60
+    description = "\n".join(
+        f"{i}. {st.get('description')}" for i, st in enumerate(steps, start=1) if isinstance(st, dict) and st.get("description")
+    )
+    return vevent(
+        uid=f"{r.id}@fullfoodapp",
+        day=r.plan_date,
+        start=start,
+        duration_min=minutes,
+        summary=f"{label}: {r.title or 'Receta'}",
+        description=description or None,
+        stamp=r.updated_at or r.created_at,
+        categories=[label],
+    )
+
+
+def _iter_plan_events(user_id: str, first: date, last: date) -> Iterator[str]:
+    """Recorre PlanEntry con un cursor en el servidor (yield_per): memoria constante sea cual sea el rango."""
+    with Session(db.engine) as s:
+        result = s.execute(
+            select(PlanEntry).where(
+                PlanEntry.user_id == user_id,
+                PlanEntry.plan_date >= first,
+                PlanEntry.plan_date <= last,
+            ).order_by(PlanEntry.plan_date, PlanEntry.meal).execution_options(yield_per=100)
+        )
+        for r in result.scalars():
+            yield _ical_event(r)
+
+
+def _ical_response(session: Session, user_id: str, first: date, last: date, if_none_match: Optional[str]) -> Response:
+    etag = _plan_etag(session, user_id, first, last)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f'inline; filename="plan_{first}_{last}.ics"'
+    return StreamingResponse(
+        stream_calendar(f"FullFoodApp {first} – {last}", _iter_plan_events(user_id, first, last)),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers,
+    )
+
+
+@router.get(
+    "/week.ics",
+    summary="Exportar la semana en iCal (ETag / 304 si no ha cambiado)",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/calendar": {}}}, 304: {"description": "Sin cambios desde el ETag enviado"}},
+)
+def export_week_ics(
+    start: date = Query(..., description="YYYY-MM-DD (cualquier día de la semana)"),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    monday, sunday = week_bounds(start)
+    return _ical_response(session, user_id, monday, sunday, if_none_match)
+
+
+@router.get(
+    "/plan.ics",
+    summary="Exportar un rango de fechas en iCal (ETag / 304 si no ha cambiado)",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/calendar": {}}}, 304: {"description": "Sin cambios desde el ETag enviado"}},
+)
+def export_range_ics(
+    start: date = Query(..., description="Primer día (YYYY-MM-DD)"),
+    end: date = Query(..., description="Último día, incluido (YYYY-MM-DD)"),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    if end < start:
+        raise HTTPException(400, "end debe ser posterior o igual a start")
+    if (end - start).days >= ICAL_MAX_DAYS:
+        raise HTTPException(400, f"Rango máximo: {ICAL_MAX_DAYS} días")
+    return _ical_response(session, user_id, start, end, if_none_match)
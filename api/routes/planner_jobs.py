@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Set
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+
+from .. import db
+from ..config import settings
+from ..db import get_session
+from ..security import get_current_user
+from ..models_db import PlannerJob
+from ..schemas import RecipeNeutral
+from ..llm_scheduler import llm_context, LLMQueueFull
+from ..metrics import FALLBACKS
+from ..workers import WORKER_ID
+from .generate import _fallback_recipe as fallback_recipe
+from .planner import (
+    WeekGenRequest,
+    week_bounds,
+    _week_seeds,
+    _generate_recipe_neutral,
+    _generate_week_one_shot,
+    upsert_plan_entries,
+)
+
+router = APIRouter(tags=["planner"], prefix="/planner/jobs")
+
+FINAL_STATUSES = ("done", "failed")
+
+# Tareas vivas (referencia fuerte para que el GC no las cancele) y avisos de cambios por job
+_tasks: Set[asyncio.Task] = set()
+_changed: Dict[str, asyncio.Event] = {}
+
+
+# ------------------------------------------------------
+# Modelos de respuesta
+# ------------------------------------------------------
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    week_start: date
+    days_total: int = 7
+    days_done: int
+    days: List[Dict[str, Any]]
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _status(job: PlannerJob) -> JobStatus:
+    days = sorted(job.days or [], key=lambda d: d["index"])
+    return JobStatus(
+        job_id=job.id,
+        status=job.status,
+        week_start=job.week_start,
+        days_done=len(days),
+        days=days,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+
+# ------------------------------------------------------
+# Worker
+# ------------------------------------------------------
+def _notify(job_id: str) -> None:
+    ev = _changed.pop(job_id, None)
+    if ev is not None:
+        ev.set()
+
+
+async def _wait_change(job_id: str, timeout: float) -> None:
+    ev = _changed.setdefault(job_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(ev.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass  # sondeo periódico: otro worker puede estar avanzando el job
+
+
+def _claimable(now: datetime):
+    """En cola, o en marcha con el lease caducado (el worker que lo llevaba murió)."""
+    return or_(
+        PlannerJob.status == "queued",
+        (PlannerJob.status == "running") & or_(PlannerJob.lease_until.is_(None), PlannerJob.lease_until < now),
+    )
+
+
+def _claim(job_id: str) -> bool:
+    """
+    Reclama el job para este worker con un UPDATE condicional (atómico frente a
+    otros workers). False si no es reclamable: de otro worker o ya terminado.
+    """
+    now = _now()
+    with Session(db.engine) as s:
+        res = s.execute(
+            update(PlannerJob)
+            .where(
+                PlannerJob.id == job_id, _claimable(now),
+            )
+            .values(
+                status="running",
+                owner=WORKER_ID,
+                lease_until=now + timedelta(seconds=settings.planner_job_lease_s),
+                updated_at=now,
+            )
+        )
+        s.commit()
+    return res.rowcount == 1
+
+
+def _renew(job_id: str) -> bool:
+    with Session(db.engine) as s:
+        res = s.execute(
+            update(PlannerJob)
+            .where(PlannerJob.id == job_id, PlannerJob.owner == WORKER_ID, PlannerJob.status == "running")
+            .values(lease_until=_now() + timedelta(seconds=settings.planner_job_lease_s))
+        )
+        s.commit()
+    return res.rowcount == 1
+
+
+async def _keep_lease(job_id: str) -> None:
+    while True:
+        await asyncio.sleep(settings.planner_job_lease_s / 3)
+        if not _renew(job_id):
+            return
+
+
+def _persist_day(job_id: str, req: WeekGenRequest, user_id: str, index: int, plan_date: date, recipe: RecipeNeutral) -> None:
+    """
+    Guarda el día en PlanEntry y lo añade al job en la misma transacción.
+    Idempotente por índice: un día ya guardado (p.ej. por un worker anterior
+    del mismo job) no se vuelve a escribir.
+    """
+    with Session(db.engine, expire_on_commit=False) as s:
+        job = s.get(PlannerJob, job_id)
+        if job is not None and any(d["index"] == index for d in job.days or []):
+            return
+        (entry,) = upsert_plan_entries(s, user_id, [(plan_date, "dinner", recipe)], req.portions, req.appliances)
+        if job is not None:
+            day = {
+                "index": index,
+                "plan_date": plan_date.isoformat(),
+                "entry_id": entry.id,
+                "title": entry.title,
+                "recipe": entry.recipe,
+            }
+            job.days = [*(job.days or []), day]  # lista nueva para que SQLAlchemy detecte el cambio
+            job.updated_at = _now()
+            s.add(job)
+        s.commit()
+    _notify(job_id)
+
+
+def _finish(job_id: str, status: str, error: Optional[str] = None) -> None:
+    with Session(db.engine) as s:
+        job = s.get(PlannerJob, job_id)
+        if job is None or job.owner != WORKER_ID:
+            return  # otro worker lo reclamó (nuestro lease caducó): lo cierra él
+        job.status = status
+        job.error = error
+        job.lease_until = None
+        job.updated_at = job.finished_at = _now()
+        s.add(job)
+        s.commit()
+    _notify(job_id)
+
+
+async def _generate_day(seed: List[str], req: WeekGenRequest) -> RecipeNeutral:
+    """En segundo plano no hay prisa: con la cola llena se espera y se reintenta."""
+    while True:
+        try:
+            return await _generate_recipe_neutral(
+                ingredients=seed,
+                portions=req.portions,
+                appliances=req.appliances,
+                dietary=req.dietary,
+                top_k=5,
+                mode="hybrid",
+            )
+        except LLMQueueFull as e:
+            await asyncio.sleep(e.retry_after or 5.0)
+        except Exception:
+            FALLBACKS.labels("planner", "day_error").inc()
+            return fallback_recipe(seed, req.portions, req.appliances, "error generando el día")
+
+
+async def run_job(job_id: str) -> None:
+    """
+    Genera los días que falten del job (reanudable) y los persiste según van
+    saliendo. Sólo corre si este worker lo reclama; mientras, renueva el lease.
+    Si el proceso se para a medias, el job queda en 'running' y, caducado el
+    lease, se retoma al arrancar (ver resume_planner_jobs).
+    """
+    if not _claim(job_id):
+        return
+    with Session(db.engine) as s:
+        job = s.get(PlannerJob, job_id)
+        req = WeekGenRequest(**job.params)
+        user_id = job.user_id
+        done = {d["index"] for d in (job.days or [])}
+    _notify(job_id)
+
+    monday, _ = week_bounds(req.start)
+    seeds = _week_seeds(req.dietary)
+    pending = [i for i in range(7) if i not in done]
+    heartbeat = asyncio.create_task(_keep_lease(job_id))
+    try:
+        with llm_context("batch", user_id):
+            if (req.strategy or settings.planner_week_strategy) == "one_shot":
+                recipes = await _generate_week_one_shot([seeds[i] for i in pending], req.portions, req.appliances, req.dietary)
+                for i, recipe in zip(pending, recipes):
+                    _persist_day(job_id, req, user_id, i, monday + timedelta(days=i), recipe)
+            else:
+                sem = asyncio.Semaphore(max(1, settings.planner_day_concurrency))
+
+                async def one_day(i: int) -> None:
+                    async with sem:
+                        recipe = await _generate_day(seeds[i], req)
+                    _persist_day(job_id, req, user_id, i, monday + timedelta(days=i), recipe)
+
+                await asyncio.gather(*(one_day(i) for i in pending))
+    except Exception as e:
+        _finish(job_id, "failed", str(e))
+        return
+    finally:
+        heartbeat.cancel()
+    _finish(job_id, "done")
+
+
+def spawn_job(job_id: str) -> asyncio.Task:
+    task = asyncio.create_task(run_job(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def resume_planner_jobs() -> int:
+    """
+    Relanza los jobs que quedaron a medias en un reinicio: en cola o con el lease
+    caducado. Con varios workers cada job lo ejecuta sólo quien lo reclama.
+    """
+    with Session(db.engine) as s:
+        ids = s.exec(select(PlannerJob.id).where(_claimable(_now()))).all()
+    for job_id in ids:
+        spawn_job(job_id)
+    return len(ids)
+
+
+# ------------------------------------------------------
+# Eventos (SSE / NDJSON)
+# ------------------------------------------------------
+def _format_event(fmt: str, event: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    if fmt == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({"event": event, **data}, ensure_ascii=False, default=str) + "\n"
+
+
+async def job_events(job_id: str, fmt: str) -> AsyncIterator[str]:
+    """
+    Emite cada día en cuanto está guardado y un evento final (done|failed).
+    La BD es la fuente de verdad: si el cliente se reconecta recibe lo ya hecho.
+    """
+    sent = 0
+    while True:
+        with Session(db.engine) as s:
+            job = s.get(PlannerJob, job_id)
+        if job is None:
+            return
+        days = job.days or []
+        for day in days[sent:]:
+            yield _format_event(fmt, "day", day)
+        sent = len(days)
+        if job.status in FINAL_STATUSES:
+            yield _format_event(fmt, job.status, {"job_id": job.id, "days_done": sent, "error": job.error})
+            return
+        await _wait_change(job_id, settings.planner_job_poll_s)
+
+
+# ------------------------------------------------------
+# Endpoints
+# ------------------------------------------------------
+def _get_job(session: Session, job_id: str, user_id: str) -> PlannerJob:
+    job = session.get(PlannerJob, job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(404, "Job no encontrado")
+    return job
+
+
+@router.post(
+    "",
+    status_code=202,
+    response_model=JobCreated,
+    summary="Lanzar la generación del plan semanal en segundo plano",
+)
+async def create_job(
+    req: WeekGenRequest = Body(...),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    # Los días se guardan siempre en PlanEntry según se generan (persist se ignora)
+    monday, _ = week_bounds(req.start)
+    job = PlannerJob(user_id=user_id, week_start=monday, params=req.model_dump(mode="json"), days=[])
+    session.add(job)
+    session.commit()
+    spawn_job(job.id)
+    return JobCreated(
+        job_id=job.id,
+        status=job.status,
+        status_url=f"/planner/jobs/{job.id}",
+        events_url=f"/planner/jobs/{job.id}/events",
+    )
+
+
+@router.get("/{job_id}", response_model=JobStatus, summary="Estado y días ya generados de un job")
+def get_job(
+    job_id: str,
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    return _status(_get_job(session, job_id, user_id))
+
+
+@router.get(
+    "/{job_id}/events",
+    summary="Progreso del job en streaming (SSE o NDJSON)",
+    responses={200: {"content": {"text/event-stream": {}, "application/x-ndjson": {}}}},
+)
+async def stream_job(
+    job_id: str,
+    request: Request,
+    format: Optional[Literal["sse", "ndjson"]] = Query(None, description="Por defecto según la cabecera Accept"),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    _get_job(session, job_id, user_id)
+    fmt = format or ("sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson")
+    media = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        job_events(job_id, fmt),
+        media_type=media,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -9,7 +9,7 @@ from ..config import settings
 from ..security import get_current_user
 from ..schemas import Document, IngestRequest, SearchRequest, SearchResponse, SearchHit
 from ..embeddings import embed_dual
-from ..vectorstore import upsert_documents, search
+from ..vectorstore import upsert_documents, search, mark_collection_changed
 from ..errors import ErrorResponse
 
 router = APIRouter(prefix="/rag", tags=["rag"])
@@ -109,4 +109,5 @@ def rag_clear(
         client.recreate_collection(collection_name=settings.collection_name, vectors_config=cfg)
     else:
         client.delete_collection(settings.collection_name)
+    mark_collection_changed()
     return {"ok": True, "recreated": recreate, "collection": settings.collection_name}
@@ -1,19 +1,26 @@
-from typing import List, Dict
-from datetime import date, timedelta
-import csv
-import io
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from typing import Iterator, List, Dict, Literal, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+from uuid import uuid4
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Query, Response
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
-from ..db import get_session
-from ..models_db import ShoppingItem, PlanEntry
-from ..schemas import RecipeNeutral, AggregatedItem
+from sqlalchemy import case, delete, func, text, update
+from pydantic import BaseModel, Field
+from .. import db
+from ..db import get_session, upsert_insert
+from ..models_db import ShoppingItem
+from ..schemas import AggregatedItem
 from ..services.ingredients import extract_ingredients
-from ..services.quantify import extract_and_aggregate
+from ..services.quantify import extract_prompt_version
+from ..services.ingredient_lines import aggregate_lines, ensure_plan_lines
+from ..services.cache import make_key, get_payload, set_payload, drop_stale
 from ..services.catalog import categorize_names
-from ..services.cache import make_key, get_payload, set_payload
+from ..services.versions import bump_version, get_version, get_versions, raise_version, SHOPPING, SHOPPING_PURGED
+from ..config import settings
 from ..security import get_current_user
 from ..errors import ErrorResponse
+from ..pagination import NDJSON_MEDIA, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset, ndjson_response, paginate
+from ..utils.tabular import accepts_gzip, csv_chunks, gzip_chunks, ndjson_chunks, xlsx_available, xlsx_chunks
 
 router = APIRouter(tags=["shopping"])
 
@@ -22,26 +29,97 @@ def week_bounds(start: date):
     sunday = monday + timedelta(days=6)
     return monday, sunday
 
-# -------- Listado con paginación --------
+# -------- Listado con paginación (keyset) --------
+LIST_ORDER = (ShoppingItem.created_at, ShoppingItem.id)  # descendente; índice ix_shoppingitem_user_created
+
+
 @router.get(
     "/shopping-list",
     response_model=List[ShoppingItem],
-    summary="Listar items de compra",
-    responses={400: {"model": ErrorResponse}},
+    summary="Listar items de compra (cursor en X-Next-Cursor; format=ndjson para la lista completa en streaming)",
+    responses={200: {"content": {NDJSON_MEDIA: {}}}, 400: {"model": ErrorResponse}},
 )
 def list_items(
+    response: Response,
     limit: int = Query(100, ge=1, le=500, example=100),
-    offset: int = Query(0, ge=0, example=0),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en X-Next-Cursor"),
+    offset: int = Query(0, ge=0, example=0, deprecated=True),
+    format: Literal["json", "ndjson"] = Query("json"),
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    stmt = (
-        select(ShoppingItem)
-        .where(ShoppingItem.user_id == user_id)
-        .order_by(ShoppingItem.created_at.desc())
-        .offset(offset).limit(limit)
+    stmt = select(ShoppingItem).where(ShoppingItem.user_id == user_id, ShoppingItem.deleted_at.is_(None))
+    if format == "ndjson":
+        return ndjson_response(keyset(stmt, LIST_ORDER, cursor, desc=True), lambda r: r.model_dump_json())
+    if offset and not cursor:
+        return session.exec(keyset(stmt, LIST_ORDER, None, desc=True).offset(offset).limit(limit)).all()
+    rows, next_cursor = paginate(
+        session, stmt, LIST_ORDER, lambda r: (r.created_at, r.id), cursor, limit, desc=True
     )
-    return session.exec(stmt).all()
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+# -------- Alta en bloque (upsert) --------
+def _norm_name(raw: str) -> str:
+    return " ".join(raw.strip().lower().split())
+
+
+def upsert_items(session: Session, user_id: str, items: List[AggregatedItem]) -> List[ShoppingItem]:
+    """
+    Alta/merge de items en una sola sentencia INSERT ... ON CONFLICT sobre
+    (user_id, name, COALESCE(unit, '')) con RETURNING: suma cantidades si ya
+    existe y conserva la categoría previa si no llega una nueva; un item borrado
+    (tombstone) revive con la cantidad nueva. Los repetidos dentro de la misma
+    petición se fusionan antes. No hace commit.
+    Devuelve los items en el orden de entrada (sin repetidos).
+    """
+    merged: Dict[Tuple[str, str], Dict] = {}
+    for a in items:
+        name = _norm_name(a.name)
+        if not name:
+            continue
+        key = (name, a.unit or "")
+        row = merged.get(key)
+        if row is None:
+            merged[key] = {"name": name, "unit": a.unit, "qty": a.qty, "category": a.category}
+        else:
+            if a.qty is not None:
+                row["qty"] = a.qty if row["qty"] is None else row["qty"] + a.qty
+            row["category"] = a.category or row["category"]
+    if not merged:
+        return []
+
+    now = datetime.now(timezone.utc)
+    rev = bump_version(session, user_id, SHOPPING)
+    values = [
+        {"id": str(uuid4()), "user_id": user_id, "checked": False, "created_at": now,
+         "updated_at": now, "deleted_at": None, "rev": rev, **row}
+        for row in merged.values()
+    ]
+    table = ShoppingItem.__table__
+    stmt = upsert_insert(session, ShoppingItem).values(values)
+    deleted = table.c.deleted_at.is_not(None)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.name, text("COALESCE(unit, '')")],
+        set_={
+            "qty": case(
+                (deleted, stmt.excluded.qty),
+                (table.c.qty.is_(None), stmt.excluded.qty),
+                (stmt.excluded.qty.is_(None), table.c.qty),
+                else_=table.c.qty + stmt.excluded.qty,
+            ),
+            "category": func.coalesce(stmt.excluded.category, table.c.category),
+            "checked": case((deleted, False), else_=table.c.checked),
+            "deleted_at": None,
+            "updated_at": stmt.excluded.updated_at,
+            "rev": stmt.excluded.rev,
+        },
+    ).returning(ShoppingItem)
+    rows = session.scalars(stmt, execution_options={"populate_existing": True}).all()
+    by_key = {(r.name, r.unit or ""): r for r in rows}
+    return [by_key[k] for k in merged]
+
 
 # -------- Alta rápida (strings) --------
 @router.post("/shopping-list/items", response_model=List[ShoppingItem], summary="Añadir items por nombre")
@@ -50,63 +128,72 @@ def add_items(
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    created: List[ShoppingItem] = []
-    for raw in items:
-        name = " ".join(raw.strip().lower().split())
-        if not name:
-            continue
-        existing = session.exec(
-            select(ShoppingItem)
-            .where(ShoppingItem.user_id == user_id, ShoppingItem.name == name)
-        ).first()
-        if existing:
-            created.append(existing)
-            continue
-        it = ShoppingItem(user_id=user_id, name=name)
-        session.add(it)
-        session.commit()
-        created.append(it)
-    return created
+    out = upsert_items(session, user_id, [AggregatedItem(name=raw) for raw in items])
+    session.commit()
+    return out
 
 # -------- Alta detallada (qty/unit/category) --------
 @router.post(
     "/shopping-list/items-detailed",
     response_model=List[ShoppingItem],
     summary="Añadir/merge items detallados (qty/unit/category)",
+    description="Un item por nombre+unidad: si ya existe se suman las cantidades. Una sola transacción.",
 )
 def add_items_detailed(
     items: List[AggregatedItem] = Body(...),
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    out: List[ShoppingItem] = []
-    for a in items:
-        name = " ".join(a.name.strip().lower().split())
-        existing = session.exec(
-            select(ShoppingItem).where(ShoppingItem.user_id == user_id, ShoppingItem.name == name)
-        ).first()
-        if not existing:
-            it = ShoppingItem(user_id=user_id, name=name, qty=a.qty, unit=a.unit, category=a.category)
-            session.add(it)
-            session.commit()
-            out.append(it)
-        else:
-            if existing.qty is not None and a.qty is not None and (existing.unit == a.unit):
-                existing.qty = (existing.qty or 0) + a.qty
-            else:
-                # si cambian unidades o no hay qty previa, sobrescribe con la nueva info
-                if a.qty is not None:
-                    existing.qty = a.qty
-                if a.unit is not None:
-                    existing.unit = a.unit
-            if a.category:
-                existing.category = a.category
-            session.add(existing)
-            session.commit()
-            out.append(existing)
+    out = upsert_items(session, user_id, items)
+    session.commit()
     return out
 
-# -------- Edición / borrado --------
+# -------- Edición / borrado (tombstones) --------
+def _live_item(session: Session, user_id: str, item_id: str) -> ShoppingItem:
+    it = session.get(ShoppingItem, item_id)
+    if not it or it.user_id != user_id or it.deleted_at is not None:
+        raise HTTPException(404, "Item no encontrado")
+    return it
+
+
+def _purge_tombstones(session: Session, user_id: str) -> None:
+    """
+    Borra de verdad los tombstones más viejos que `shopping_tombstone_ttl_days` y
+    guarda la última rev purgada: un cursor anterior recibe reset en /changes.
+    """
+    horizon = datetime.now(timezone.utc) - timedelta(days=settings.shopping_tombstone_ttl_days)
+    expired = (ShoppingItem.user_id == user_id, ShoppingItem.deleted_at.is_not(None), ShoppingItem.deleted_at < horizon)
+    last_rev = session.exec(select(func.max(ShoppingItem.rev)).where(*expired)).one()
+    if last_rev is None:
+        return
+    session.execute(delete(ShoppingItem).where(*expired))
+    raise_version(session, user_id, SHOPPING_PURGED, last_rev)
+
+
+def _free_name_unit(session: Session, user_id: str, item_id: str, name: str, unit: Optional[str]) -> None:
+    """
+    Deja libre (name, unit) para renombrar un item: 409 si lo ocupa otro item vivo;
+    un tombstone se borra en la misma transacción y, como en la purga, se sube la
+    rev purgada para que los clientes que no lo vieron reciban reset. No hace commit.
+    """
+    other = session.exec(
+        select(ShoppingItem).where(
+            ShoppingItem.user_id == user_id,
+            ShoppingItem.id != item_id,
+            ShoppingItem.name == name,
+            func.coalesce(ShoppingItem.unit, "") == (unit or ""),
+        )
+    ).first()
+    if other is None:
+        return
+    if other.deleted_at is None:
+        raise HTTPException(409, "Ya existe un item con ese nombre y unidad")
+    purged_rev = other.rev
+    session.delete(other)
+    session.flush()
+    raise_version(session, user_id, SHOPPING_PURGED, purged_rev)
+
+
 @router.patch("/shopping-list/{item_id}", response_model=ShoppingItem, summary="Actualizar un item")
 def update_item(
     item_id: str,
@@ -114,13 +201,20 @@ def update_item(
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    it = session.get(ShoppingItem, item_id)
-    if not it or it.user_id != user_id:
-        raise HTTPException(404, "Item no encontrado")
+    it = _live_item(session, user_id, item_id)
     allowed = {"name", "qty", "unit", "category", "checked"}
+    if "name" in patch:
+        patch = {**patch, "name": _norm_name(str(patch["name"] or ""))}
+        if not patch["name"]:
+            raise HTTPException(400, "El nombre no puede estar vacío")
+    name, unit = patch.get("name", it.name), patch.get("unit", it.unit)
+    if (name, unit or "") != (it.name, it.unit or ""):
+        _free_name_unit(session, user_id, item_id, name, unit)
     for k, v in patch.items():
         if k in allowed:
             setattr(it, k, v)
+    it.updated_at = datetime.now(timezone.utc)
+    it.rev = bump_version(session, user_id, SHOPPING)
     session.add(it)
     session.commit()
     return it
@@ -131,10 +225,11 @@ def delete_item(
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    it = session.get(ShoppingItem, item_id)
-    if not it or it.user_id != user_id:
-        raise HTTPException(404, "Item no encontrado")
-    session.delete(it)
+    it = _live_item(session, user_id, item_id)
+    it.deleted_at = it.updated_at = datetime.now(timezone.utc)
+    it.rev = bump_version(session, user_id, SHOPPING)
+    session.add(it)
+    _purge_tombstones(session, user_id)
     session.commit()
     return {"ok": True}
 
@@ -143,11 +238,67 @@ def clear_items(
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    rows = session.exec(select(ShoppingItem).where(ShoppingItem.user_id == user_id)).all()
-    for r in rows:
-        session.delete(r)
+    now = datetime.now(timezone.utc)
+    res = session.execute(
+        update(ShoppingItem)
+        .where(ShoppingItem.user_id == user_id, ShoppingItem.deleted_at.is_(None))
+        .values(deleted_at=now, updated_at=now, rev=bump_version(session, user_id, SHOPPING))
+    )
+    _purge_tombstones(session, user_id)
     session.commit()
-    return {"ok": True, "deleted": len(rows)}
+    return {"ok": True, "deleted": res.rowcount}
+
+# -------- Sincronización incremental --------
+CHANGES_ORDER = (ShoppingItem.rev, ShoppingItem.id)  # índice ix_shoppingitem_user_rev
+
+
+class ShoppingChanges(BaseModel):
+    items: List[ShoppingItem] = Field(default_factory=list, description="Altas y modificaciones")
+    deleted: List[str] = Field(default_factory=list, description="Ids borrados")
+    cursor: str = Field(..., description="Cursor para la siguiente llamada (since)")
+    has_more: bool = False
+    reset: bool = Field(False, description="El cursor era demasiado antiguo: esto es la lista completa")
+
+
+@router.get(
+    "/shopping-list/changes",
+    response_model=ShoppingChanges,
+    summary="Cambios de la lista desde un cursor (altas, modificaciones y borrados)",
+    description=(
+        "Sin `since` devuelve la lista completa. Con el `cursor` de la respuesta anterior "
+        "sólo lo que ha cambiado desde entonces; si `has_more`, repetir con el nuevo cursor."
+    ),
+    responses={400: {"model": ErrorResponse}},
+)
+def list_changes(
+    since: Optional[str] = Query(None, description="Cursor opaco devuelto por la llamada anterior"),
+    limit: int = Query(500, ge=1, le=2000),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    stmt = select(ShoppingItem).where(ShoppingItem.user_id == user_id)
+    reset = False
+    if since:
+        since_rev = decode_cursor(since, CHANGES_ORDER)[0]
+        # Tombstones purgados después de ese cursor: no se pueden servir como borrados
+        reset = since_rev < get_version(session, user_id, SHOPPING_PURGED)
+    if since is None or reset:
+        since = None
+        stmt = stmt.where(ShoppingItem.deleted_at.is_(None))
+    rows = session.exec(keyset(stmt, CHANGES_ORDER, since).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = encode_cursor((rows[-1].rev, rows[-1].id))
+    else:
+        cursor = since or encode_cursor((get_version(session, user_id, SHOPPING), ""))
+    return ShoppingChanges(
+        items=[r for r in rows if r.deleted_at is None],
+        deleted=[r.id for r in rows if r.deleted_at is not None],
+        cursor=cursor,
+        has_more=has_more,
+        reset=reset,
+    )
 
 # -------- Agregado semanal (con cache) --------
 @router.get(
@@ -168,7 +319,15 @@ async def aggregate_week(
     user_id: str = Depends(get_current_user),
 ):
     monday, sunday = week_bounds(start)
-    cache_key = make_key("agg-week", {"week_start": str(monday)})
+    # Versiones de plan/catálogo (se incrementan en cada escritura) y de la plantilla de
+    # extracción: cualquier cambio produce otra clave, así que el TTL puede ser largo
+    # La semana va en claro en el prefijo para poder retirar las versiones anteriores
+    week_prefix = f"agg-week:{monday}"
+    cache_key = make_key(week_prefix, {
+        "week_start": str(monday),
+        "prompt": extract_prompt_version(),
+        "versions": get_versions(session, user_id),
+    })
     cached = get_payload(session, user_id, cache_key)
     if cached is not None and isinstance(cached, list):
         try:
@@ -176,48 +335,48 @@ async def aggregate_week(
         except Exception:
             pass
 
-    plans = session.exec(
-        select(PlanEntry).where(
-            PlanEntry.user_id == user_id,
-            PlanEntry.plan_date >= monday,
-            PlanEntry.plan_date <= sunday,
-        )
-    ).all()
+    result, complete = await _aggregate_range(session, user_id, monday, sunday)
 
-    aggregated: List[AggregatedItem] = []
-    for p in plans:
-        if not p.recipe:
-            continue
-        try:
-            recipe = RecipeNeutral(**p.recipe)
-        except Exception:
-            continue
-        items = await extract_and_aggregate(recipe, session, user_id)
-        aggregated.extend(items)
-
-    # Merge por (name, unit)
-    merged: Dict[tuple, AggregatedItem] = {}
-    for a in aggregated:
-        key = (a.name, a.unit or "ud")
-        if key not in merged:
-            merged[key] = AggregatedItem(name=a.name, qty=a.qty, unit=a.unit, category=None)
-        else:
-            if a.qty is not None and merged[key].qty is not None:
-                merged[key].qty = (merged[key].qty or 0) + a.qty
-            elif a.qty is not None and merged[key].qty is None:
-                merged[key].qty = a.qty
+    # Con líneas provisionales (el LLM no resolvió alguna receta) no se cachea:
+    # la siguiente lectura vuelve a intentar la extracción
+    if complete:
+        drop_stale(session, user_id, week_prefix + ":", keep=cache_key)
+        set_payload(session, user_id, cache_key, [r.model_dump() for r in result], ttl_seconds=settings.agg_cache_ttl_s)
+    return result
 
-    result = list(merged.values())
-    # Categorizar
+async def _aggregate_range(session: Session, user_id: str, first: date, last: date) -> Tuple[List[AggregatedItem], bool]:
+    """
+    Completa sin LLM las líneas de ingredientes que falten y agrega con un GROUP
+    BY en SQL; lo que aún no está extraído sale provisional y se resuelve en
+    segundo plano. Devuelve (agregado, ¿sin líneas provisionales?).
+    """
+    provisional = ensure_plan_lines(session, user_id, first, last)
+    result = aggregate_lines(session, user_id, first, last, provisional)
+    # Categoría según el catálogo actual (las líneas guardan la del momento de escribirlas)
     cat_map = categorize_names(session, user_id, [it.name for it in result])
     for it in result:
-        it.category = cat_map.get(it.name, None)
-
-    # Orden amigable
+        it.category = cat_map.get(it.name, it.category)
     result.sort(key=lambda x: ((x.category or "zzzz"), x.name))
+    return result, not provisional
+
 
-    # Cache 12h
-    set_payload(session, user_id, cache_key, [r.model_dump() for r in result], ttl_seconds=12*3600)
+@router.get(
+    "/shopping-list/aggregate-range",
+    response_model=List[AggregatedItem],
+    summary="Agregado de ingredientes de un rango de fechas",
+    responses={400: {"model": ErrorResponse}},
+)
+async def aggregate_range(
+    start: date = Query(..., description="Primer día (YYYY-MM-DD)"),
+    end: date = Query(..., description="Último día, incluido (YYYY-MM-DD)"),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user),
+):
+    if end < start:
+        raise HTTPException(400, "end debe ser posterior o igual a start")
+    if (end - start).days > 92:
+        raise HTTPException(400, "Rango máximo: 93 días")
+    result, _ = await _aggregate_range(session, user_id, start, end)
     return result
 
 # -------- Persistir agregado semanal en lista --------
@@ -234,33 +393,78 @@ async def build_from_week(
     aggr = await aggregate_week(start=start, session=session, user_id=user_id)
     return add_items_detailed(items=aggr, session=session, user_id=user_id)
 
-# -------- Export CSV --------
+# -------- Export (CSV / NDJSON / XLSX) --------
+EXPORT_COLUMNS = ["name", "qty", "unit", "category", "checked", "created_at"]
+EXPORT_MEDIA = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+ExportFormat = Literal["csv", "ndjson", "xlsx"]
+
+
+def _iter_export_rows(user_id: str) -> Iterator[Tuple]:
+    """Filas de la lista con un cursor en el servidor (yield_per): memoria constante sea cual sea el tamaño."""
+    with Session(db.engine) as s:
+        result = s.execute(
+            select(
+                ShoppingItem.name, ShoppingItem.qty, ShoppingItem.unit,
+                ShoppingItem.category, ShoppingItem.checked, ShoppingItem.created_at,
+            )
+            .where(ShoppingItem.user_id == user_id, ShoppingItem.deleted_at.is_(None))
+            .order_by(ShoppingItem.category, ShoppingItem.name)
+            .execution_options(yield_per=500)
+        )
+        for name, qty, unit, category, checked, created_at in result:
+            yield name, qty, unit, category, checked, created_at.isoformat() if created_at else None
+
+
+def _csv_rows(rows: Iterator[Tuple]) -> Iterator[list]:
+    for name, qty, unit, category, checked, created_at in rows:
+        yield [name, qty if qty is not None else "", unit or "", category or "", int(checked), created_at or ""]
+
+
+def _export_response(fmt: str, user_id: str, accept_encoding: Optional[str]) -> StreamingResponse:
+    rows = _iter_export_rows(user_id)
+    if fmt == "xlsx":
+        if not xlsx_available():
+            raise HTTPException(501, "Exportación XLSX no disponible: falta openpyxl")
+        body: Iterator = xlsx_chunks(EXPORT_COLUMNS, rows, title="Lista de la compra")
+    elif fmt == "ndjson":
+        body = ndjson_chunks(EXPORT_COLUMNS, rows)
+    else:
+        body = csv_chunks(EXPORT_COLUMNS, _csv_rows(rows))
+    headers = {"Content-Disposition": f"attachment; filename=shopping_list.{fmt}", "Vary": "Accept-Encoding"}
+    # XLSX ya es un zip: no se vuelve a comprimir
+    if fmt != "xlsx" and accepts_gzip(accept_encoding):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA[fmt], headers=headers)
+
+
+@router.get(
+    "/shopping-list/export",
+    summary="Exportar lista de la compra en streaming (CSV, NDJSON o XLSX; gzip si el cliente lo acepta)",
+    response_class=StreamingResponse,
+    responses={200: {"content": {m: {"schema": {"type": "string", "format": "binary"}} for m in EXPORT_MEDIA.values()}},
+               501: {"model": ErrorResponse}},
+)
+def export_items(
+    format: ExportFormat = Query("csv", description="csv | ndjson | xlsx (requiere openpyxl)"),
+    accept_encoding: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user),
+):
+    return _export_response(format, user_id, accept_encoding)
+
+
 @router.get(
     "/shopping-list/export.csv",
     summary="Exportar lista de la compra (CSV)",
+    response_class=StreamingResponse,
     responses={200: {"content": {"text/csv": {"schema": {"type": "string", "format": "binary"}}}}},
 )
 def export_csv(
-    session: Session = Depends(get_session),
+    accept_encoding: Optional[str] = Header(None),
     user_id: str = Depends(get_current_user),
 ):
-    rows = session.exec(
-        select(ShoppingItem)
-        .where(ShoppingItem.user_id == user_id)
-        .order_by(ShoppingItem.category, ShoppingItem.name)
-    ).all()
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(["name", "qty", "unit", "category", "checked", "created_at"])
-    for r in rows:
-        writer.writerow([
-            r.name,
-            r.qty if r.qty is not None else "",
-            r.unit or "",
-            r.category or "",
-            int(r.checked),
-            r.created_at.isoformat()
-        ])
-    buf.seek(0)
-    headers = {"Content-Disposition": "attachment; filename=shopping_list.csv"}
-    return StreamingResponse(iter([buf.read()]), media_type="text/csv", headers=headers)
+    return _export_response("csv", user_id, accept_encoding)
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import Session, select
 
 from ..db import get_session
 from ..security import get_current_user
 from ..errors import ErrorResponse
+from ..pagination import NDJSON_MEDIA, NEXT_CURSOR_HEADER, keyset, ndjson_response, paginate
 from ..models_user_recipes import UserRecipe
 from ..schemas_user_recipes import UserRecipeCreate, UserRecipeUpdate, UserRecipeOut
 from ..services.recipe_text import recipe_to_text
@@ -89,43 +90,52 @@ async def create_user_recipe(
     )
 
 
+def _out(r: UserRecipe) -> UserRecipeOut:
+    return UserRecipeOut(
+        id=r.id,
+        user_id=r.user_id,
+        title=r.title,
+        portions=r.portions,
+        tags=r.tags,
+        appliances=r.appliances,
+        recipe=r.recipe,  # se valida contra RecipeNeutral
+        source=r.source,
+        public=r.public,
+        created_at=r.created_at,
+        updated_at=r.updated_at,
+    )
+
+
+LIST_ORDER = (UserRecipe.created_at, UserRecipe.id)  # descendente; índice ix_userrecipe_user_created
+
+
 @router.get(
     "",
     response_model=List[UserRecipeOut],
-    summary="Listar recetas del usuario",
+    summary="Listar recetas del usuario (cursor en X-Next-Cursor; format=ndjson en streaming)",
+    responses={200: {"content": {NDJSON_MEDIA: {}}}, 400: {"model": ErrorResponse}},
 )
 def list_user_recipes(
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en X-Next-Cursor"),
+    offset: int = Query(0, ge=0, deprecated=True),
+    format: Literal["json", "ndjson"] = Query("json"),
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user),
 ):
-    stmt = (
-        select(UserRecipe)
-        .where(UserRecipe.user_id == user_id)
-        .order_by(UserRecipe.created_at.desc())
-        .offset(offset)
-        .limit(limit)
+    stmt = select(UserRecipe).where(UserRecipe.user_id == user_id)
+    if format == "ndjson":
+        return ndjson_response(keyset(stmt, LIST_ORDER, cursor, desc=True), lambda r: _out(r).model_dump_json())
+    if offset and not cursor:
+        rows = session.exec(keyset(stmt, LIST_ORDER, None, desc=True).offset(offset).limit(limit)).all()
+        return [_out(r) for r in rows]
+    rows, next_cursor = paginate(
+        session, stmt, LIST_ORDER, lambda r: (r.created_at, r.id), cursor, limit, desc=True
     )
-    rows = session.exec(stmt).all()
-    res: List[UserRecipeOut] = []
-    for r in rows:
-        res.append(
-            UserRecipeOut(
-                id=r.id,
-                user_id=user_id,
-                title=r.title,
-                portions=r.portions,
-                tags=r.tags,
-                appliances=r.appliances,
-                recipe=r.recipe,  # se valida contra RecipeNeutral
-                source=r.source,
-                public=r.public,
-                created_at=r.created_at,
-                updated_at=r.updated_at,
-            )
-        )
-    return res
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [_out(r) for r in rows]
 
 
 @router.get(
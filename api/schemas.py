@@ -69,10 +69,36 @@ class StepGeneric(BaseModel):
             return None
         return v
 
+class IngredientItem(BaseModel):
+    name: str
+    qty: Optional[float] = None
+    unit: Optional[str] = None
+
 class RecipeNeutral(BaseModel):
     title: str
     portions: int
     steps_generic: List[StepGeneric]
+    # Lista de la compra de la receta (con cantidades para `portions`), si el modelo la emite
+    ingredients: Optional[List[IngredientItem]] = None
+
+    @field_validator("ingredients", mode="before")
+    @classmethod
+    def _drop_bad_ingredients(cls, v):
+        # Opcional y tolerante: descarta entradas sin nombre o mal formadas en vez de invalidar la receta
+        if not isinstance(v, list):
+            return None
+        out = []
+        for it in v:
+            if not isinstance(it, dict) or not str(it.get("name") or "").strip():
+                continue
+            qty = it.get("qty")
+            unit = it.get("unit")
+            out.append({
+                "name": str(it["name"]).strip(),
+                "qty": qty if isinstance(qty, (int, float)) and not isinstance(qty, bool) else None,
+                "unit": unit.strip() if isinstance(unit, str) and unit.strip() else None,
+            })
+        return out or None
 
 class AppliancePlanStep(BaseModel):
     action: str
@@ -88,11 +114,6 @@ class RecipePlan(BaseModel):
     recipe: RecipeNeutral
     plans: List[CompiledPlan]
 
-class IngredientItem(BaseModel):
-    name: str
-    qty: Optional[float] = None
-    unit: Optional[str] = None
-
 class AggregatedItem(BaseModel):
     name: str
     qty: Optional[float] = None
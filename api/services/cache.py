@@ -6,6 +6,7 @@ from datetime import datetime, timedelta, timezone
 import hashlib
 import json
 
+from sqlalchemy import delete, or_
 from sqlmodel import Session, select
 from ..models_db import Cache
 
@@ -100,6 +101,20 @@ def set_cache(
     session.commit()
 
 
+def drop_stale(session: Session, user_id: str, prefix: str, keep: str) -> None:
+    """
+    Borra las entradas del usuario con claves `prefix*` distintas de `keep` (p.ej.
+    versiones anteriores de la misma semana) y las ya expiradas. No hace commit.
+    """
+    session.execute(delete(Cache).where(
+        Cache.user_id == user_id,
+        or_(
+            Cache.key.startswith(prefix, autoescape=True) & (Cache.key != keep),
+            Cache.expires_at < now_utc(),
+        ),
+    ))
+
+
 def get_payload(session: Session, user_id: str, key: str) -> Optional[Any]:
     """
     Devuelve solo el payload (o None si no existe / está expirado).
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, event, func
+from sqlmodel import Session, select
+
+from .. import db
+from ..config import settings
+from ..llm_scheduler import llm_context
+from ..models_db import PlanEntry, RecipeIngredient
+from ..schemas import AggregatedItem, RecipeNeutral
+from .catalog import categorize_names
+from .units import merge_quantities
+from .quantify import _aggregate_items, _items_or_fallback, extract_items_many, known_items, parse_recipe
+
+PLAN = "plan"
+
+
+def write_lines(
+    session: Session,
+    user_id: str,
+    source: str,
+    source_id: str,
+    plan_date: Optional[date],
+    items: List[Dict[str, Any]],
+) -> int:
+    """Reemplaza las líneas de una receta (agregadas por nombre+unidad y categorizadas). No hace commit."""
+    drop_lines(session, source, source_id)
+    aggregated = _aggregate_items(items)
+    cat_map = categorize_names(session, user_id, [a.name for a in aggregated]) if aggregated else {}
+    session.add_all([
+        RecipeIngredient(
+            user_id=user_id,
+            source=source,
+            source_id=source_id,
+            plan_date=plan_date,
+            name=a.name,
+            qty=a.qty,
+            unit=a.unit,
+            category=cat_map.get(a.name),
+        )
+        for a in aggregated
+    ])
+    return len(aggregated)
+
+
+def index_recipe(
+    session: Session,
+    user_id: str,
+    source: str,
+    source_id: str,
+    plan_date: Optional[date],
+    recipe: RecipeNeutral,
+) -> bool:
+    """
+    Materializa las líneas al escribir la receta si se conocen sin LLM (emitidas
+    por el generador, parseadas o en la caché de extracción). Si no, borra las
+    anteriores y quedan pendientes para PlanLinesResolver.
+    """
+    items = known_items(session, recipe)
+    if items is None:
+        drop_lines(session, source, source_id)
+        return False
+    write_lines(session, user_id, source, source_id, plan_date, items)
+    return True
+
+
+def drop_lines(session: Session, source: str, source_id: str) -> None:
+    session.execute(delete(RecipeIngredient).where(
+        RecipeIngredient.source == source, RecipeIngredient.source_id == source_id
+    ))
+
+
+def _pending_entries(session: Session, user_id: str, first: date, last: date) -> List[Tuple[PlanEntry, RecipeNeutral]]:
+    """Entradas del rango sin líneas materializadas (datos antiguos o extracción pendiente)."""
+    indexed = select(RecipeIngredient.source_id).where(
+        RecipeIngredient.source == PLAN, RecipeIngredient.user_id == user_id
+    )
+    pending = session.exec(
+        select(PlanEntry).where(
+            PlanEntry.user_id == user_id,
+            PlanEntry.plan_date >= first,
+            PlanEntry.plan_date <= last,
+            PlanEntry.id.not_in(indexed),
+        )
+    ).all()
+    out = []
+    for e in pending:
+        try:
+            out.append((e, RecipeNeutral(**(e.recipe or {}))))
+        except Exception:
+            continue
+    return out
+
+
+def ensure_plan_lines(session: Session, user_id: str, first: date, last: date) -> List[Dict[str, Any]]:
+    """
+    Completa, sin LLM, las líneas de las entradas del rango que aún no las tienen:
+    se materializa lo que ya se conoce (emitido, parseado o en caché). Para el
+    resto devuelve líneas provisionales (estimaciones del parser o fallback
+    determinista) sólo para esta lectura y encarga la extracción en segundo plano.
+    """
+    pending = _pending_entries(session, user_id, first, last)
+    provisional: List[Dict[str, Any]] = []
+    for e, recipe in pending:
+        known = known_items(session, recipe)
+        if known is None:
+            sure, _, guesses = parse_recipe(recipe)
+            provisional.extend(_items_or_fallback(recipe, sure + guesses))
+            continue
+        write_lines(session, user_id, PLAN, e.id, e.plan_date, known)
+    if pending:
+        session.commit()
+    if provisional:
+        plan_lines_resolver.schedule(user_id, first, last)
+    return provisional
+
+
+class PlanLinesResolver:
+    """
+    Extracción con el LLM, fuera del camino de lectura, de las entradas del plan
+    sin líneas. Se lanza al escribir el plan (tras el commit) y desde las
+    lecturas que sirvieron líneas provisionales; en ese caso, como mucho cada
+    `ingredient_resolve_retry_s` por usuario y rango, para que un LLM que no
+    responde no se llame en cada lectura.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[Tuple[str, date, date], asyncio.Task] = {}
+        self._tried_at: Dict[Tuple[str, date, date], float] = {}
+
+    def schedule(self, user_id: str, first: date, last: date, force: bool = False) -> Optional[asyncio.Task]:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None  # sin bucle (scripts, tests síncronos): queda para la siguiente lectura
+        key = (user_id, first, last)
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            return task
+        now = time.monotonic()
+        if not force and now - self._tried_at.get(key, float("-inf")) < settings.ingredient_resolve_retry_s:
+            return None
+        self._tried_at[key] = now
+        self._tasks[key] = asyncio.create_task(self.run(user_id, first, last))
+        return self._tasks[key]
+
+    def schedule_after_commit(self, session: Session, user_id: str, first: date, last: date) -> None:
+        """Encarga la extracción cuando la transacción de `session` confirme (antes no se vería)."""
+        event.listen(session, "after_commit", lambda _s: self.schedule(user_id, first, last, force=True), once=True)
+
+    async def run(self, user_id: str, first: date, last: date) -> int:
+        """Extrae (prioridad background) y materializa lo que quede resuelto. Devuelve cuántas entradas."""
+        with Session(db.engine, expire_on_commit=False) as s:
+            pending = _pending_entries(s, user_id, first, last)
+            if not pending:
+                return 0
+            with llm_context("background", user_id):
+                await extract_items_many([r for _, r in pending], s, user_id)
+            done = 0
+            for e, recipe in pending:
+                known = known_items(s, recipe)
+                if known is not None:
+                    write_lines(s, user_id, PLAN, e.id, e.plan_date, known)
+                    done += 1
+            s.commit()
+        return done
+
+
+plan_lines_resolver = PlanLinesResolver()
+
+
+def aggregate_lines(
+    session: Session,
+    user_id: str,
+    first: date,
+    last: date,
+    provisional: Sequence[Dict[str, Any]] = (),
+) -> List[AggregatedItem]:
+    """
+    Lista de la compra de un rango de fechas: un único GROUP BY sobre las líneas
+    materializadas, más las provisionales de `ensure_plan_lines` si las hay.
+    """
+    rows = session.exec(
+        select(
+            RecipeIngredient.name,
+            RecipeIngredient.unit,
+            func.sum(RecipeIngredient.qty),
+            func.max(RecipeIngredient.category),
+        ).where(
+            RecipeIngredient.user_id == user_id,
+            RecipeIngredient.source == PLAN,
+            RecipeIngredient.plan_date >= first,
+            RecipeIngredient.plan_date <= last,
+        ).group_by(RecipeIngredient.name, RecipeIngredient.unit)
+    ).all()
+    # Las líneas ya están en unidad base; sólo queda juntar dimensiones distintas
+    # del mismo ingrediente entre recetas (p.ej. dientes de ajo en una y gramos en otra)
+    categories = {n: c for n, _, _, c in rows if c}
+    return [
+        AggregatedItem(name=n, qty=q, unit=u, category=categories.get(n))
+        for n, q, u in merge_quantities(
+            [(n, q, u) for n, u, q, _ in rows]
+            + [(a.name, a.qty, a.unit) for a in _aggregate_items(list(provisional))]
+        )
+    ]
+
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .units import CONTAINERS, FACTORS, UNIT_ALIASES, canonical_unit
+
+# Parser por reglas de frases de ingredientes en español ("1/2 taza de leche",
+# "2-3 dientes de ajo", "una pizca de sal", "2 latas de 400 g de tomate").
+# Primer nivel de la extracción: cada línea lleva una confianza y sólo las que
+# quedan por debajo del umbral pasan al LLM.
+
+_FRACTIONS = {"½": "1/2", "¼": "1/4", "¾": "3/4", "⅓": "1/3", "⅔": "2/3", "⅛": "1/8"}
+_NUMBER_WORDS: Dict[str, float] = {
+    "un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12,
+    "medio": 0.5, "media": 0.5, "cuarto": 0.25,
+}
+_UNQUANTIFIED = re.compile(r"\b(?:al gusto|c/s|cantidad suficiente|opcional)\b")
+
+_NUM = r"\d+(?:[.,]\d+)?"
+_QTY = rf"(?:\d+\s+\d+/\d+|\d+/\d+|{_NUM})"
+_RANGE_RE = re.compile(rf"^(?P<a>{_QTY})\s*(?:-|–|a|o)\s*(?P<b>{_QTY})\s+(?P<rest>.+)$")
+_QTY_RE = re.compile(rf"^(?P<q>{_QTY})\s*(?P<rest>.*)$")
+_NESTED_RE = re.compile(rf"^(?:de\s+)?(?P<q>{_QTY})\s*(?P<u>[^\s]+)\s+(?:de\s+)?(?P<name>.+)$")
+
+
+@dataclass(frozen=True)
+class ParsedLine:
+    text: str
+    name: str
+    qty: Optional[float]
+    unit: Optional[str]
+    confidence: float
+
+    def item(self) -> Dict[str, object]:
+        return {"name": self.name, "qty": self.qty, "unit": self.unit}
+
+
+def _number(raw: str) -> Optional[float]:
+    raw = raw.strip().replace(",", ".")
+    try:
+        if " " in raw:  # mixto: "1 1/2"
+            whole, frac = raw.split()
+            return float(whole) + _number(frac)
+        if "/" in raw:
+            num, den = raw.split("/")
+            return float(num) / float(den) if float(den) else None
+        return float(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize(text: str) -> str:
+    s = text.strip().lower()
+    for sym, frac in _FRACTIONS.items():
+        s = re.sub(rf"(\d){sym}", rf"\1 {frac}", s).replace(sym, frac)
+    s = re.sub(r"(\d)([a-zñáéíóú])", r"\1 \2", s)  # "200g" → "200 g"
+    return " ".join(s.split())
+
+
+def _strip_de(s: str) -> str:
+    return re.sub(r"^(?:de|del)\s+", "", s).strip()
+
+
+def _clean_name(raw: str) -> Tuple[str, float]:
+    """Nombre sin coletillas ("cebolla, picada") y penalización si no parece un ingrediente."""
+    name = _strip_de(raw.split(",")[0]).strip(" .;:")
+    if not name:
+        return "", 0.0
+    if re.search(r"\d", name):
+        return name, 0.4
+    if len(name.split()) > 5:
+        return name, 0.5
+    return name, 0.0
+
+
+def _split_unit(rest: str) -> Tuple[Optional[str], str, bool]:
+    """Primera palabra como unidad: (unidad canónica | None, resto, ¿unidad conocida?)."""
+    head, _, tail = rest.partition(" ")
+    if head in UNIT_ALIASES:
+        return canonical_unit(head), _strip_de(tail), True
+    # "2 manojitos de perejil": parece unidad pero no la conocemos
+    if tail.startswith("de "):
+        return canonical_unit(head), _strip_de(tail), False
+    return None, rest, True
+
+
+def parse_phrase(text: str) -> ParsedLine:
+    """Frase de ingrediente → ParsedLine con confianza en [0, 1]."""
+    s = _normalize(text)
+    confidence = 0.95
+    if "(" in s:
+        s = " ".join(re.sub(r"\([^)]*\)", " ", s).split())
+        confidence -= 0.05
+    if _UNQUANTIFIED.search(s):
+        name, penalty = _clean_name(_UNQUANTIFIED.sub(" ", s))
+        return ParsedLine(text, name, None, None, max(0.0, 0.9 - penalty) if name else 0.0)
+
+    qty: Optional[float] = None
+    rest = s
+    if m := _RANGE_RE.match(s):
+        a, b = _number(m.group("a")), _number(m.group("b"))
+        if a is not None and b is not None:
+            qty, rest, confidence = (a + b) / 2, m.group("rest"), confidence - 0.1
+    elif (m := _QTY_RE.match(s)) and m.group("rest"):
+        qty, rest = _number(m.group("q")), m.group("rest")
+    elif s.startswith("un par de "):
+        qty, rest = 2.0, s[len("un par de "):]
+    else:
+        head, _, tail = s.partition(" ")
+        if head in _NUMBER_WORDS and tail:
+            qty, rest = float(_NUMBER_WORDS[head]), tail
+        elif head in UNIT_ALIASES and tail.startswith("de "):
+            qty, rest, confidence = 1.0, s, confidence - 0.1  # "pizca de sal", "cucharada de aceite"
+
+    if qty is None:
+        # Sin cantidad ni "al gusto": el nombre es fiable pero la cantidad falta, así
+        # que la línea queda por debajo del umbral y el LLM la estima con la receta
+        name, penalty = _clean_name(s)
+        plain = bool(name) and re.fullmatch(r"[a-zñáéíóúü ]+", name) and len(name.split()) <= 4
+        return ParsedLine(text, name, None, None, 0.6 if plain else round(max(0.0, 0.5 - penalty), 2))
+
+    unit, rest, known = _split_unit(rest)
+    if not known:
+        confidence -= 0.3
+    if unit in CONTAINERS and (m := _NESTED_RE.match(rest)):
+        inner_q, inner_u = _number(m.group("q")), canonical_unit(m.group("u"))
+        if inner_q is not None and inner_u in FACTORS:
+            qty, unit, rest = qty * inner_q, inner_u, m.group("name")
+    if unit is None:
+        unit = "ud"  # "2 huevos"
+        confidence -= 0.05
+
+    name, penalty = _clean_name(rest)
+    if not name:
+        return ParsedLine(text, "", qty, unit, 0.0)
+    return ParsedLine(text, name, qty, unit, round(max(0.0, confidence - penalty), 2))
+
+
+def parse_phrases(texts: List[str], min_confidence: float) -> Tuple[List[ParsedLine], List[ParsedLine]]:
+    """
+    Parsea frases desduplicadas → (seguras, dudosas). Las líneas sin cantidad de un
+    ingrediente que ya aparece con cantidad (p.ej. el mismo en otro paso) se omiten.
+    """
+    seen = set()
+    parsed: List[ParsedLine] = []
+    for t in texts:
+        key = _normalize(t)
+        if key and key not in seen:
+            seen.add(key)
+            parsed.append(parse_phrase(t))
+    quantified = {p.name for p in parsed if p.qty is not None}
+    parsed = [p for p in parsed if p.qty is not None or p.name not in quantified]
+    sure = [p for p in parsed if p.confidence >= min_confidence]
+    unsure = [p for p in parsed if p.confidence < min_confidence]
+    return sure, unsure
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from .. import db
+from ..config import settings
+from ..models_db import PlanEntry, PlannerJob
+from ..llm_scheduler import llm_context, LLMQueueFull, TokenBudget
+from ..circuit_breaker import llm_breaker
+from ..metrics import PREGEN_WEEKS
+from ..workers import acquire_lease
+from ..routes.planner import (
+    WeekGenRequest,
+    week_bounds,
+    upsert_plan_entries,
+    _generate_week,
+)
+from ..routes.generate import _is_fallback_recipe as is_fallback_recipe
+
+
+# Una pasada por noche entre todos los workers: la lease del día la toma uno solo
+# (si muere a medias, otro la puede retomar pasado este tiempo)
+LEASE_S = 6 * 3600
+
+
+def parse_window(raw: str) -> Tuple[time, time]:
+    """'HH:MM-HH:MM' → (inicio, fin); la ventana puede cruzar la medianoche (p.ej. 23:00-05:00)."""
+    start, end = (part.strip() for part in raw.split("-", 1))
+    return time.fromisoformat(start), time.fromisoformat(end)
+
+
+def in_window(now: datetime, raw: str) -> bool:
+    start, end = parse_window(raw)
+    t = now.time()
+    if start <= end:
+        return start <= t < end
+    return t >= start or t < end
+
+
+def active_users(session: Session, since: datetime, limit: int) -> List[str]:
+    """Usuarios que han tocado su plan (entradas o jobs) desde `since`, los más recientes primero."""
+    last: Dict[str, datetime] = {}
+    rows = session.exec(
+        select(PlanEntry.user_id, func.max(func.coalesce(PlanEntry.updated_at, PlanEntry.created_at)))
+        .where(func.coalesce(PlanEntry.updated_at, PlanEntry.created_at) >= since)
+        .group_by(PlanEntry.user_id)
+    ).all()
+    rows += session.exec(
+        select(PlannerJob.user_id, func.max(PlannerJob.created_at))
+        .where(PlannerJob.created_at >= since)
+        .group_by(PlannerJob.user_id)
+    ).all()
+    for user_id, ts in rows:
+        if ts is not None and (user_id not in last or str(ts) > str(last[user_id])):
+            last[user_id] = ts
+    return sorted(last, key=lambda u: str(last[u]), reverse=True)[:limit]
+
+
+def week_request(session: Session, user_id: str, monday: date) -> WeekGenRequest:
+    """Parámetros de la última semana pedida por el usuario (job) o, si no hay, de su última entrada."""
+    job = session.exec(
+        select(PlannerJob).where(PlannerJob.user_id == user_id).order_by(PlannerJob.created_at.desc())
+    ).first()
+    if job is not None and job.params:
+        params = {**job.params, "start": monday, "persist": True}
+        return WeekGenRequest(**params)
+    entry = session.exec(
+        select(PlanEntry).where(PlanEntry.user_id == user_id).order_by(PlanEntry.plan_date.desc())
+    ).first()
+    return WeekGenRequest(
+        start=monday,
+        portions=entry.portions if entry else 2,
+        appliances=(entry.appliances or []) if entry else [],
+    )
+
+
+def has_plan(session: Session, user_id: str, monday: date) -> bool:
+    return session.exec(
+        select(PlanEntry.id).where(
+            PlanEntry.user_id == user_id,
+            PlanEntry.plan_date >= monday,
+            PlanEntry.plan_date <= monday + timedelta(days=6),
+        )
+    ).first() is not None
+
+
+class OffPeakPregen:
+    """
+    Genera en horas valle el borrador del plan de la semana siguiente para los
+    usuarios activos, con prioridad "background" y un tope de tokens por noche.
+    Reutiliza el pipeline de generate-week; por la mañana GET /planner/week es
+    sólo una lectura. Nunca pisa una semana que ya tenga entradas. Con varios
+    workers, cada noche la ejecuta sólo el que toma la lease "pregen:<fecha>",
+    así que el tope de tokens es global.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._last_run: Optional[date] = None
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.now(timezone.utc)
+        monday = week_bounds(now.date())[0] + timedelta(days=7)
+        since = now - timedelta(days=settings.pregen_active_days)
+        budget = TokenBudget(settings.pregen_token_budget)
+        stats = {"generated": 0, "skipped": 0, "budget": 0, "busy": 0, "error": 0}
+
+        with Session(db.engine) as s:
+            if not acquire_lease(s, f"pregen:{now.date()}", LEASE_S, now):
+                return stats  # otro worker ya se encarga de esta noche
+            users = active_users(s, since, settings.pregen_max_users)
+        per_week = 0  # tokens medios de una semana, para no empezar una que no cabe
+        for i, user_id in enumerate(users):
+            if budget.exhausted or (per_week and budget.remaining < per_week):
+                stats["budget"] += len(users) - i
+                break
+            if llm_breaker.is_open:
+                stats["busy"] += len(users) - i
+                break
+            with Session(db.engine, expire_on_commit=False) as s:
+                if has_plan(s, user_id, monday):
+                    stats["skipped"] += 1
+                    continue
+                req = week_request(s, user_id, monday)
+                used_before = budget.used
+                try:
+                    with llm_context("background", user_id, budget=budget):
+                        days = await _generate_week(req.model_copy(update={"persist": False}), s, user_id)
+                except LLMQueueFull:
+                    # Hay tráfico de mayor prioridad: lo dejamos para la siguiente pasada
+                    stats["busy"] += len(users) - i
+                    break
+                except Exception:
+                    stats["error"] += 1
+                    continue
+                per_week = max(per_week, budget.used - used_before)
+                # Una semana con días de fallback no se guarda: contaría como plan
+                # hecho y la siguiente pasada ya no la reintentaría
+                if any(is_fallback_recipe(d.recipe) for d in days):
+                    stats["error"] += 1
+                    continue
+                upsert_plan_entries(
+                    s, user_id, [(d.plan_date, d.meal, d.recipe) for d in days], req.portions, req.appliances
+                )
+                s.commit()
+                stats["generated"] += 1
+
+        for outcome, n in stats.items():
+            if n:
+                PREGEN_WEEKS.labels(outcome).inc(n)
+        return stats
+
+    async def loop(self) -> None:
+        while True:
+            now = datetime.now()  # la ventana se expresa en hora local del servidor
+            if in_window(now, settings.pregen_window) and self._last_run != now.date():
+                try:
+                    stats = await self.run_once()
+                except Exception:
+                    stats = {}
+                # Si la cola estaba ocupada se reintenta en la siguiente comprobación
+                if not stats.get("busy"):
+                    self._last_run = now.date()
+            await asyncio.sleep(settings.pregen_check_s)
+
+    def start(self) -> Optional[asyncio.Task]:
+        if not settings.pregen_enabled:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.loop())
+        return self._task
+
+
+pregen = OffPeakPregen()
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import asyncio
 import json
 import re
-from collections import defaultdict
+from datetime import timedelta
 
-from sqlmodel import Session
+from sqlmodel import Session, select
 
+from ..config import settings
+from ..models_db import Cache
 from ..schemas import AggregatedItem, RecipeNeutral
 from .ingredients import extract_ingredients  # parser básico de ingredientes desde RecipeNeutral
-from .catalog import categorize_names
+from .units import merge_quantities
+from .ingredient_parser import parse_phrases
+from .cache import make_key, now_utc, _as_aware
+from ..metrics import PARSE_FAILURES, FALLBACKS, INGREDIENT_CACHE
+from ..prompt_registry import prompt_registry
 
 # Opcional: si existe la util de LLM del generador, la usamos; si no, seguimos con fallback sin romper.
 try:
@@ -17,6 +24,19 @@ try:
 except Exception:  # pragma: no cover
     call_llm = None  # type: ignore
 
+EXTRACT_TEMPLATE = "ingredients.extract.txt"
+EXTRACT_BATCH_TEMPLATE = "ingredients.extract_batch.txt"
+# La extracción sólo depende del contenido de la receta y del prompt: se comparte entre usuarios
+EXTRACT_CACHE_USER = "_shared"
+
+
+def extract_prompt_version() -> str:
+    """Versión de la plantilla de extracción (para claves de caché de agregados)."""
+    try:
+        return prompt_registry.version(EXTRACT_TEMPLATE, EXTRACT_BATCH_TEMPLATE)
+    except FileNotFoundError:
+        return "none"
+
 
 # -----------------------------
 # Helpers de parsing/normalización
@@ -86,6 +106,19 @@ def _try_qty_unit(s: str) -> Tuple[Optional[float], Optional[str]]:
     return qty, unit
 
 
+def _recipe_payload(recipe: RecipeNeutral) -> Dict[str, Any]:
+    return {
+        "title": recipe.title,
+        "portions": recipe.portions,
+        "steps": [s.model_dump() if hasattr(s, "model_dump") else s for s in recipe.steps_generic],
+    }
+
+
+def extract_cache_key(recipe: RecipeNeutral) -> str:
+    """Hash del contenido de la receta (lo que ve el prompt) + versión de la plantilla."""
+    return make_key("ingr", {"recipe": _recipe_payload(recipe), "prompt": extract_prompt_version()})
+
+
 # -----------------------------
 # LLM extraction (opcional, tolerante a fallos)
 # -----------------------------
@@ -103,19 +136,11 @@ async def llm_extract_ingredients(
     if call_llm is None:
         return []
 
-    # Prompt minimalista y robusto (evita depender de archivo de plantilla).
-    # Si quieres moverlo a /api/prompts/ más adelante, sin problema.
-    sys_prompt = (
-        "Eres un asistente que EXTRAe ingredientes a partir de una receta en JSON.\n"
-        "Responde EXCLUSIVAMENTE con un array JSON de objetos con claves: name, qty, unit.\n"
-        "Ejemplo: [{\"name\":\"aceite de oliva\",\"qty\":15,\"unit\":\"ml\"}, {\"name\":\"sal\",\"qty\":null,\"unit\":null}]"
-    )
-    user_payload = {
-        "title": recipe.title,
-        "portions": recipe.portions,
-        "steps": recipe.steps_generic,
-    }
-    prompt = f"{sys_prompt}\n\nRECIPE_JSON:\n```json\n{json.dumps(user_payload, ensure_ascii=False)}\n```"
+    # Plantilla fija delante y el JSON de la receta al final (prefijo cacheable)
+    try:
+        prompt = prompt_registry.render(EXTRACT_TEMPLATE, recipe_json=json.dumps(_recipe_payload(recipe), ensure_ascii=False))
+    except FileNotFoundError:
+        return []
 
     try:
         raw = await call_llm(prompt)
@@ -124,8 +149,13 @@ async def llm_extract_ingredients(
 
     data = _safe_json_parse(raw)
     if not isinstance(data, list):
+        PARSE_FAILURES.labels("ingredients").inc()
         return []
+    return _normalize_items(data)
+
 
+def _normalize_items(data: List[Any]) -> List[Dict[str, Any]]:
+    """Valida/normaliza un array [{name, qty, unit}] devuelto por el LLM."""
     items: List[Dict[str, Any]] = []
     for it in data:
         if not isinstance(it, dict):
@@ -150,79 +180,234 @@ async def llm_extract_ingredients(
     return items
 
 
+def _require_batch(data: Any) -> None:
+    if not isinstance(data, (dict, list)):
+        raise ValueError("Se esperaba un objeto JSON por índice de receta")
+
+
+def _batch_arrays(data: Any, n: int) -> List[Optional[List[Any]]]:
+    """
+    Arrays por receta a partir de la respuesta por lotes. Acepta el formato pedido
+    ({"0": [...], ...}) y, por tolerancia, una lista posicional de arrays o de
+    objetos {"index": i, "ingredients": [...]}.
+    """
+    out: List[Optional[List[Any]]] = [None] * n
+    if isinstance(data, dict):
+        pairs = list(data.items())
+    elif isinstance(data, list):
+        pairs = []
+        for pos, it in enumerate(data):
+            if isinstance(it, dict) and "ingredients" in it:
+                pairs.append((it.get("index", pos), it.get("ingredients")))
+            else:
+                pairs.append((pos, it))
+    else:
+        return out
+    for key, arr in pairs:
+        try:
+            idx = int(key)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < n and isinstance(arr, list) and out[idx] is None:
+            out[idx] = arr
+    return out
+
+
+async def llm_extract_ingredients_batch(
+    recipes: Sequence[RecipeNeutral],
+    session: Session,
+    user_id: str,
+) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Extrae los ingredientes de N recetas con un único prompt (instrucciones y
+    ejemplo una sola vez). Devuelve, por receta, la lista normalizada o None si
+    su array falta o no es válido (el llamador decide el fallback). Nunca levanta.
+    """
+    if call_llm is None or not recipes:
+        return [None] * len(recipes)
+    payload = [{"index": i, **_recipe_payload(r)} for i, r in enumerate(recipes)]
+    try:
+        prompt = prompt_registry.render(EXTRACT_BATCH_TEMPLATE, recipes_json=json.dumps(payload, ensure_ascii=False))
+        raw = await call_llm(prompt, validate=_require_batch)
+    except Exception:
+        return [None] * len(recipes)
+
+    try:
+        data = json.loads(raw)
+    except Exception:
+        data = _safe_json_parse(raw)
+    out: List[Optional[List[Dict[str, Any]]]] = []
+    for arr in _batch_arrays(data, len(recipes)):
+        items = _normalize_items(arr) if arr is not None else []
+        out.append(items or None)
+    invalid = sum(1 for x in out if x is None)
+    if invalid:
+        PARSE_FAILURES.labels("ingredients_batch").inc(invalid)
+    return out
+
+
 # -----------------------------
 # Agregado + categorización
 # -----------------------------
 
 def _aggregate_items(items: List[Dict[str, Any]]) -> List[AggregatedItem]:
-    merged: Dict[Tuple[str, Optional[str]], float] = defaultdict(float)
-    seen_keys: set = set()
-
-    # Sumamos cantidades por (name, unit). Si qty es None, mantenemos una sola entrada.
+    """Suma por (name, unidad canónica): "200 g" + "0,2 kg" o "1 cda" + "15 ml" son una sola línea."""
+    lines = []
     for it in items:
         name = _norm_name(it.get("name", ""))
         if not name:
             continue
         unit = it.get("unit", None)
         qty = it.get("qty", None)
-
-        key = (name, unit if isinstance(unit, str) else None)
-        if qty is None:
-            # Si no hay cantidad, aseguramos que exista la clave (sin sumar)
-            if key not in seen_keys and key not in merged:
-                merged[key] = 0.0
-                seen_keys.add(key)
-            continue
-
         try:
-            merged[key] += float(qty)
+            qv: Optional[float] = float(qty) if qty is not None else None
         except Exception:
             # si qty no es convertible, la ignoramos como None
-            if key not in seen_keys and key not in merged:
-                merged[key] = 0.0
-                seen_keys.add(key)
+            qv = None
+        lines.append((name, qv, unit if isinstance(unit, str) else None))
 
-    # Construimos lista resultante (qty 0.0 -> None para “desconocida”)
-    result: List[AggregatedItem] = []
-    for (name, unit), total in merged.items():
-        q: Optional[float] = None if total == 0.0 else total
-        result.append(AggregatedItem(name=name, qty=q, unit=unit, category=None))
-    return result
+    # (qty None = "desconocida")
+    return [
+        AggregatedItem(name=name, qty=q, unit=unit, category=None)
+        for name, q, unit in merge_quantities(lines)
+    ]
 
 
-async def extract_and_aggregate(
-    recipe: RecipeNeutral,
-    session: Session,
-    user_id: str,
-) -> List[AggregatedItem]:
+def recipe_ingredient_items(recipe: RecipeNeutral) -> List[Dict[str, Any]]:
+    """Ingredientes con cantidad que emitió el propio modelo al generar la receta ([] si no hay)."""
+    return _normalize_items([i.model_dump() for i in recipe.ingredients or []])
+
+
+def parse_recipe(recipe: RecipeNeutral) -> Tuple[List[Dict[str, Any]], Optional[RecipeNeutral], List[Dict[str, Any]]]:
     """
-    Pipeline tolerante:
-    1) Intenta LLM → lista [{name, qty, unit}]
-    2) Si falla o viene vacío → fallback determinista a partir de los steps de la receta
-    3) Agrega por (name,unit) y categoriza
+    Primer nivel de la extracción, sin red: parser por reglas de las frases de
+    ingredientes de los pasos. Devuelve (líneas seguras, receta residual con las
+    dudosas para el LLM | None si no hace falta, estimaciones del parser para las
+    dudosas). Sin frases que parsear, la residual es la receta entera.
     """
-    items: List[Dict[str, Any]] = []
+    phrases = [i for step in recipe.steps_generic for i in (step.ingredients or [])]
+    sure, unsure = parse_phrases(phrases, settings.ingredient_parse_min_confidence)
+    items = _normalize_items([p.item() for p in sure])
+    if not unsure:
+        return items, (None if items else recipe), []
+    residual = RecipeNeutral(
+        title=recipe.title,
+        portions=recipe.portions,
+        steps_generic=[{"action": "prep", "description": "Ingredientes", "ingredients": [p.text for p in unsure]}],
+    )
+    return items, residual, _normalize_items([p.item() for p in unsure])
 
-    # 1) LLM (no rompe si falla)
-    try:
-        items = await llm_extract_ingredients(recipe, session, user_id)
-    except Exception:
-        items = []
 
-    # 2) Fallback determinista si hace falta
-    if not items:
-        names = extract_ingredients(recipe)  # List[str]
-        items = [{"name": _norm_name(n), "qty": None, "unit": None} for n in names if _norm_name(n)]
+def _lookup_cached(session: Session, keys: Sequence[str]) -> Tuple[Dict[str, Cache], Dict[str, List[Dict[str, Any]]]]:
+    now = now_utc()
+    cached: Dict[str, Cache] = {
+        row.key: row
+        for row in session.exec(
+            select(Cache).where(Cache.user_id == EXTRACT_CACHE_USER, Cache.key.in_(set(keys)))
+        ).all()
+    }
+    found = {
+        k: row.payload for k, row in cached.items()
+        if isinstance(row.payload, list) and not (row.expires_at and _as_aware(row.expires_at) < now)
+    }
+    return cached, found
+
 
-    # 3) Agregado
-    aggregated = _aggregate_items(items)
+def known_items(session: Session, recipe: RecipeNeutral) -> Optional[List[Dict[str, Any]]]:
+    """Ingredientes disponibles sin llamar al LLM (emitidos, parseados o ya en caché), o None."""
+    items = recipe_ingredient_items(recipe)
+    if items:
+        return items
+    items, residual, _ = parse_recipe(recipe)
+    if residual is None:
+        return items
+    key = extract_cache_key(recipe)
+    return _lookup_cached(session, [key])[1].get(key)
 
-    # 4) Categorías
-    cat_map = categorize_names(session, user_id, [a.name for a in aggregated])
-    for a in aggregated:
-        a.category = cat_map.get(a.name, None)
 
-    # Orden amigable por categoría y nombre
-    aggregated.sort(key=lambda x: ((x.category or "zzzz"), x.name))
+async def extract_items_many(
+    recipes: Sequence[RecipeNeutral],
+    session: Session,
+    user_id: str,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Ingredientes [{name, qty, unit}] de cada receta, en el mismo orden.
+    Memoizado en la tabla Cache por hash de contenido; de lo que falta, el parser
+    por reglas resuelve las frases claras y sólo las dudosas van al LLM, en
+    paralelo (como mucho `ingredient_extract_concurrency`). Una receta que el LLM
+    no resuelve se queda con las estimaciones del parser (o []) y no se cachea.
+    """
+    keys = [extract_cache_key(r) for r in recipes]
+    now = now_utc()
+    cached, found = _lookup_cached(session, keys)
+    # Recetas que ya traen su lista de ingredientes (esquema de generación): sin LLM
+    found.update({k: emitted for k, r in zip(keys, recipes) if (emitted := recipe_ingredient_items(r))})
+    missing: Dict[str, RecipeNeutral] = {}  # recetas repetidas: una sola llamada
+    partial: Dict[str, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+    parsed = 0
+    for k, r in zip(keys, recipes):
+        if k in found or k in missing:
+            continue
+        sure, residual, guesses = parse_recipe(r)
+        if residual is None:
+            found[k] = sure
+            parsed += 1
+        else:
+            missing[k], partial[k] = residual, (sure, guesses)
+    INGREDIENT_CACHE.labels("hit").inc(len(keys) - len(missing) - parsed)
+    INGREDIENT_CACHE.labels("parsed").inc(parsed)
+    INGREDIENT_CACHE.labels("miss").inc(len(missing))
+
+    if missing:
+        sem = asyncio.Semaphore(max(1, settings.ingredient_extract_concurrency))
+
+        async def one(recipe: RecipeNeutral) -> List[Dict[str, Any]]:
+            async with sem:
+                try:
+                    return await llm_extract_ingredients(recipe, session, user_id)
+                except Exception:
+                    return []
+
+        async def batch(chunk: List[RecipeNeutral]) -> List[List[Dict[str, Any]]]:
+            async with sem:
+                got = await llm_extract_ingredients_batch(chunk, session, user_id)
+            # Fallback por receta: sólo las que el lote no resolvió van de una en una
+            retry = [i for i, items in enumerate(got) if items is None]
+            if retry:
+                FALLBACKS.labels("ingredients", "batch_item").inc(len(retry))
+                for i, items in zip(retry, await asyncio.gather(*(one(chunk[i]) for i in retry))):
+                    got[i] = items
+            return [items or [] for items in got]
+
+        todo = list(missing.values())
+        size = settings.ingredient_extract_batch_size
+        if size > 1 and len(todo) > 1:
+            chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+            results = [items for part in await asyncio.gather(*(batch(c) for c in chunks)) for items in part]
+        else:
+            results = await asyncio.gather(*(one(r) for r in todo))
+        expires = now + timedelta(seconds=settings.ingredient_extract_ttl_s)
+        for key, items in zip(missing, results):
+            sure, guesses = partial[key]
+            if not items:
+                if sure or guesses:
+                    found[key] = sure + guesses
+                continue
+            items = sure + items
+            found[key] = items
+            row = cached.get(key) or Cache(user_id=EXTRACT_CACHE_USER, key=key, created_at=now)
+            row.payload, row.updated_at, row.expires_at = items, now, expires
+            session.add(row)
+        session.commit()  # una sola transacción para todas las recetas nuevas
+
+    return [found.get(k, []) for k in keys]
+
+
+def _items_or_fallback(recipe: RecipeNeutral, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Si el LLM no dio nada: fallback determinista a partir de los steps de la receta."""
+    if items:
+        return items
+    FALLBACKS.labels("ingredients", "llm_empty").inc()
+    names = extract_ingredients(recipe)  # List[str]
+    return [{"name": _norm_name(n), "qty": None, "unit": None} for n in names if _norm_name(n)]
 
-    return aggregated
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..config import settings
+from ..embeddings import embed_dual
+from ..rag import query_vectors
+from ..vectorstore import search, collection_stamp, collection_version
+from ..metrics import RAG_QUERIES
+
+Seed = Tuple[str, ...]
+
+# Recuperamos de más al precalcular y recortamos al top_k pedido (máximo de RecipeGenRequest)
+WARM_TOP_K = 8
+
+
+def seed_query(seed: Sequence[str]) -> str:
+    """Consulta canónica de una semilla: sólo depende de sus ingredientes."""
+    return "ingredientes: " + ", ".join(seed)
+
+
+class SeedRetrieval:
+    """
+    Hits de Qdrant precalculados para las semillas fijas del planner.
+
+    - `warm(seeds)` embebe todas las consultas en un solo lote y busca en paralelo.
+    - `lookup(seed, top_k)` devuelve los hits en memoria, o None si la semilla no
+      está caliente o la colección ha cambiado (escrituras de este proceso o
+      points_count distinto, comprobado como mucho cada `seed_retrieval_check_s`);
+      en ese caso se recalcula en segundo plano y el llamador recupera en vivo.
+      Si un calentamiento falló (Qdrant o embeddings caídos), un fallo de lookup
+      lo reintenta, como mucho cada `seed_retrieval_check_s`.
+    """
+
+    def __init__(self) -> None:
+        self._seeds: List[Seed] = []
+        self._hits: Dict[Seed, List[Dict[str, Any]]] = {}
+        self._stamp: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._warm_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def warm_seeds(self) -> int:
+        return len(self._hits)
+
+    async def warm(self, seeds: Optional[Sequence[Sequence[str]]] = None) -> int:
+        if seeds is not None:
+            self._seeds = list(dict.fromkeys(tuple(s) for s in seeds))
+        if not self._seeds:
+            return 0
+        self._warm_at = time.monotonic()
+        try:
+            stamp = await collection_stamp()
+        except Exception:
+            return 0  # Qdrant no disponible: se reintentará en un lookup posterior
+        queries = [seed_query(s) for s in self._seeds]
+        try:
+            emb = await embed_dual(queries)
+        except Exception:
+            return 0
+
+        async def one(i: int) -> Optional[List[Dict[str, Any]]]:
+            qvecs = query_vectors(emb, i)
+            if not qvecs:
+                return None
+            try:
+                return await search(qvecs, top_k=WARM_TOP_K)
+            except Exception:
+                return None
+
+        results = await asyncio.gather(*(one(i) for i in range(len(queries))))
+        self._hits = {seed: hits for seed, hits in zip(self._seeds, results) if hits is not None}
+        self._stamp = stamp
+        self._checked_at = time.monotonic()
+        return len(self._hits)
+
+    def schedule_warm(self, seeds: Optional[Sequence[Sequence[str]]] = None) -> Optional[asyncio.Task]:
+        """Lanza `warm` en segundo plano (sin duplicar si ya hay uno en curso)."""
+        if not settings.seed_retrieval_enabled:
+            return None
+        if seeds is not None:
+            self._seeds = list(dict.fromkeys(tuple(s) for s in seeds))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.warm())
+        return self._task
+
+    async def _still_fresh(self) -> bool:
+        if time.monotonic() - self._checked_at < settings.seed_retrieval_check_s:
+            return True
+        self._checked_at = time.monotonic()
+        try:
+            return await collection_stamp() == self._stamp
+        except Exception:
+            return True  # no sabemos si cambió: mejor servir lo que hay que nada
+
+    def _retry_due(self) -> bool:
+        return self._warm_at is None or time.monotonic() - self._warm_at >= settings.seed_retrieval_check_s
+
+    async def lookup(self, seed: Sequence[str], top_k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        if not settings.seed_retrieval_enabled:
+            return None
+        hits = self._hits.get(tuple(seed))
+        if hits is None:
+            # Semilla fija sin hits: el último calentamiento falló o fue parcial
+            if tuple(seed) in self._seeds and self._retry_due():
+                self.schedule_warm()
+            return None
+        changed_here = self._stamp is None or self._stamp[0] != collection_version()
+        if changed_here or not await self._still_fresh():
+            self._hits = {}
+            self.schedule_warm()
+            return None
+        RAG_QUERIES.labels("seed_cache").inc()
+        return hits[:top_k]
+
+
+seed_retrieval = SeedRetrieval()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Motor de unidades determinista: alias → unidad canónica, factores a la unidad
+# base de cada dimensión y equivalencias por ingrediente para mezclar dimensiones.
+# Los valores de cocina salen de data/knowledge/conversions_es.md.
+
+MASS, VOLUME, COUNT = "mass", "volume", "count"
+
+# Unidad base de cada dimensión: es la que se guarda y se suma
+BASE_UNIT = {MASS: "g", VOLUME: "ml", COUNT: "ud"}
+
+# Unidad canónica → (dimensión, factor a la unidad base)
+FACTORS: Dict[str, Tuple[str, float]] = {
+    "mg": (MASS, 0.001),
+    "g": (MASS, 1.0),
+    "kg": (MASS, 1000.0),
+    "ml": (VOLUME, 1.0),
+    "cl": (VOLUME, 10.0),
+    "dl": (VOLUME, 100.0),
+    "l": (VOLUME, 1000.0),
+    "taza": (VOLUME, 240.0),
+    "cda": (VOLUME, 15.0),
+    "cdta": (VOLUME, 5.0),
+    "ud": (COUNT, 1.0),
+}
+
+UNIT_ALIASES: Dict[str, str] = {
+    "mg": "mg", "miligramo": "mg", "miligramos": "mg",
+    "g": "g", "gr": "g", "grs": "g", "gramo": "g", "gramos": "g",
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogramo": "kg", "kilogramos": "kg",
+    "ml": "ml", "mililitro": "ml", "mililitros": "ml",
+    "cl": "cl", "centilitro": "cl", "centilitros": "cl",
+    "dl": "dl", "decilitro": "dl", "decilitros": "dl",
+    "l": "l", "lt": "l", "lts": "l", "litro": "l", "litros": "l",
+    "taza": "taza", "tazas": "taza",
+    "cda": "cda", "cdas": "cda", "cucharada": "cda", "cucharadas": "cda", "c/s": "cda", "cs": "cda",
+    "cdta": "cdta", "cdtas": "cdta", "cucharadita": "cdta", "cucharaditas": "cdta", "c/c": "cdta", "cc": "cdta",
+    "ud": "ud", "uds": "ud", "u": "ud", "unidad": "ud", "unidades": "ud", "pieza": "ud", "piezas": "ud",
+    "diente": "diente", "dientes": "diente",
+    "pizca": "pizca", "pizcas": "pizca",
+    "lata": "lata", "latas": "lata",
+    "bote": "bote", "botes": "bote", "tarro": "tarro", "tarros": "tarro",
+    "paquete": "paquete", "paquetes": "paquete", "sobre": "sobre", "sobres": "sobre",
+    "brick": "brick", "bricks": "brick", "vaso": "vaso", "vasos": "vaso",
+    "manojo": "manojo", "manojos": "manojo", "ramita": "rama", "ramitas": "rama", "rama": "rama", "ramas": "rama",
+    "hoja": "hoja", "hojas": "hoja", "loncha": "loncha", "lonchas": "loncha",
+    "rebanada": "rebanada", "rebanadas": "rebanada", "cabeza": "cabeza", "cabezas": "cabeza",
+    "puñado": "puñado", "puñados": "puñado", "chorro": "chorro", "chorrito": "chorro", "chorros": "chorro",
+}
+
+# Envases: "2 latas de 400 g" se cuenta como 800 g
+CONTAINERS = {"lata", "bote", "tarro", "paquete", "sobre", "brick"}
+
+# Peso aproximado de una unidad de recuento por ingrediente (g)
+UNIT_WEIGHTS: Dict[str, Dict[str, float]] = {
+    "ajo": {"diente": 3.5},   # 1 diente de ajo ≈ 3–4 g
+    "cebolla": {"ud": 150.0},  # 1 cebolla mediana ≈ 150 g
+}
+
+# Densidades aproximadas (g/ml) para pasar volumen a peso
+DENSITIES: Dict[str, float] = {
+    "agua": 1.0,
+    "leche": 1.03,
+    "aceite": 0.92,
+    "vinagre": 1.01,
+    "harina": 0.55,
+    "azúcar": 0.85,
+    "arroz": 0.8,
+    "sal": 1.2,
+}
+
+
+def canonical_unit(raw: Optional[str]) -> Optional[str]:
+    """Alias → unidad canónica ("gramos" → "g"); las desconocidas se devuelven normalizadas."""
+    if raw is None:
+        return None
+    u = " ".join(str(raw).strip().lower().split()).rstrip(".")
+    if not u:
+        return None
+    return UNIT_ALIASES.get(u, u)
+
+
+def _lookup(name: str, table: Dict[str, object]) -> Optional[object]:
+    # Coincidencia por palabras completas, la clave más larga ("aceite de oliva" →
+    # "aceite"); "sal" no casa con "salmón" ni "agua" con "aguacate"
+    padded = " " + " ".join(re.findall(r"\w+", name.lower())) + " "
+    hits = [k for k in table if f" {k} " in padded]
+    return table[max(hits, key=len)] if hits else None
+
+
+def to_base(qty: Optional[float], unit: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """Lleva la cantidad a la unidad base de su dimensión (0,2 kg → 200 g; 1 cda → 15 ml)."""
+    unit = canonical_unit(unit)
+    if unit not in FACTORS:
+        return qty, unit
+    dim, factor = FACTORS[unit]
+    return (qty * factor if qty is not None else None), BASE_UNIT[dim]
+
+
+def grams(name: str, qty: float, unit: Optional[str]) -> Optional[float]:
+    """Peso en gramos si la unidad y el ingrediente lo permiten; None si no hay equivalencia."""
+    qty, unit = to_base(qty, unit)
+    if unit == "g":
+        return qty
+    if unit == "ml":
+        density = _lookup(name, DENSITIES)
+        return qty * density if density is not None else None
+    weights = _lookup(name, UNIT_WEIGHTS)
+    if weights and unit in weights:
+        return qty * weights[unit]
+    return None
+
+
+Line = Tuple[str, Optional[float], Optional[str]]
+
+
+def merge_quantities(lines: Iterable[Line]) -> List[Line]:
+    """
+    Suma líneas (name, qty, unit) ya normalizadas de nombre: cada una pasa a su
+    unidad base y, si un ingrediente aparece en varias dimensiones convertibles
+    a peso (p.ej. "2 dientes" y "10 g" de ajo), se juntan en gramos. Las líneas
+    sin cantidad sólo aseguran la entrada; total 0 → qty None.
+    """
+    totals: Dict[Tuple[str, Optional[str]], Optional[float]] = {}
+    for name, qty, unit in lines:
+        qty, unit = to_base(qty, unit)
+        key = (name, unit)
+        if qty is None:
+            totals.setdefault(key, None)
+        else:
+            totals[key] = (totals.get(key) or 0.0) + qty
+
+    by_name: Dict[str, List[Optional[str]]] = defaultdict(list)
+    for name, unit in totals:
+        by_name[name].append(unit)
+    for name, units in by_name.items():
+        if len(units) < 2:
+            continue
+        convertible = {
+            u: g for u in units
+            if u != "g" and totals[(name, u)] is not None
+            and (g := grams(name, totals[(name, u)], u)) is not None
+        }
+        # Sólo se mezcla si hay un total en gramos o al menos dos unidades que se pueden pesar
+        if not convertible or ("g" not in units and len(convertible) < 2):
+            continue
+        total_g = totals.get((name, "g")) or 0.0
+        for u, g in convertible.items():
+            total_g += g
+            del totals[(name, u)]
+        totals[(name, "g")] = total_g
+
+    return [(name, (q if q else None), unit) for (name, unit), q in totals.items()]
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Dict, Sequence
+
+from sqlalchemy import case
+from sqlmodel import Session, select
+
+from ..db import upsert_insert
+from ..models_db import DataVersion
+
+PLAN = "plan"
+CATALOG = "catalog"
+# Secuencia de cambios de la lista de la compra (rev de cada item) y última rev de tombstones purgados
+SHOPPING = "shopping"
+SHOPPING_PURGED = "shopping-purged"
+# Ámbito compartido: productos globales del catálogo (afectan a todos los usuarios)
+GLOBAL_USER = "_global"
+
+
+def bump_version(session: Session, user_id: str, scope: str) -> int:
+    """
+    Incrementa la versión con un único upsert y la devuelve; no hace commit (va en
+    la transacción de la escritura, así que sirve de secuencia por usuario).
+    """
+    table = DataVersion.__table__
+    stmt = upsert_insert(session, DataVersion).values(user_id=user_id, scope=scope, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "scope"],
+        set_={"version": table.c.version + 1},
+    ).returning(table.c.version)
+    return session.execute(stmt).scalar_one()
+
+
+def raise_version(session: Session, user_id: str, scope: str, value: int) -> None:
+    """Sube la versión hasta `value` si es mayor (nunca la baja). No hace commit."""
+    table = DataVersion.__table__
+    stmt = upsert_insert(session, DataVersion).values(user_id=user_id, scope=scope, version=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "scope"],
+        set_={"version": case((table.c.version > stmt.excluded.version, table.c.version), else_=stmt.excluded.version)},
+    )
+    session.execute(stmt)
+
+
+def get_version(session: Session, user_id: str, scope: str) -> int:
+    row = session.get(DataVersion, (user_id, scope))
+    return row.version if row else 0
+
+
+def get_versions(session: Session, user_id: str, scopes: Sequence[str] = (PLAN, CATALOG)) -> Dict[str, int]:
+    """Versiones del usuario y las globales ("scope" y "scope@global"), en una consulta; 0 si no hay fila."""
+    rows = session.exec(
+        select(DataVersion).where(
+            DataVersion.user_id.in_((user_id, GLOBAL_USER)), DataVersion.scope.in_(scopes)
+        )
+    ).all()
+    out: Dict[str, int] = {}
+    for r in rows:
+        key = r.scope if r.user_id == user_id else f"{r.scope}@global"
+        out[key] = r.version
+    return out
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from datetime import date, datetime, time, timezone
+from typing import Iterable, Iterator, Optional
+
+CRLF = "\r\n"
+
+
+def escape_text(value: str) -> str:
+    """Escapa un valor TEXT según RFC 5545 (\\, ; , y saltos de línea)."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str, limit: int = 75) -> str:
+    """Pliega una línea a `limit` octetos (UTF-8) sin partir caracteres; continúa con espacio."""
+    out = []
+    buf = b""
+    for ch in line:
+        enc = ch.encode("utf-8")
+        if len(buf) + len(enc) > limit:
+            out.append(buf.decode("utf-8"))
+            buf = b" "  # la continuación empieza por un espacio, que cuenta en el límite
+        buf += enc
+    out.append(buf.decode("utf-8"))
+    return CRLF.join(out) + CRLF
+
+
+def _utc_stamp(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def calendar_start(name: str) -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//FullFoodApp//Planner//ES",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ]
+    return "".join(fold_line(x) for x in lines)
+
+
+def calendar_end() -> str:
+    return "END:VCALENDAR" + CRLF
+
+
+def vevent(
+    uid: str,
+    day: date,
+    start: time,
+    duration_min: int,
+    summary: str,
+    description: Optional[str] = None,
+    stamp: Optional[datetime] = None,
+    categories: Iterable[str] = (),
+) -> str:
+    """Un VEVENT con hora local flotante (sin zona): la comida es a esa hora allí donde esté el usuario."""
+    start_dt = datetime.combine(day, start)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{_utc_stamp(stamp or datetime.now(timezone.utc))}",
+        f"DTSTART:{start_dt.strftime('%Y%m%dT%H%M%S')}",
+        f"DURATION:PT{max(1, int(duration_min))}M",
+        f"SUMMARY:{escape_text(summary)}",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    cats = [escape_text(c) for c in categories if c]
+    if cats:
+        lines.append("CATEGORIES:" + ",".join(cats))
+    lines.append("END:VEVENT")
+    return "".join(fold_line(x) for x in lines)
+
+
+def stream_calendar(name: str, events: Iterable[str]) -> Iterator[str]:
+    yield calendar_start(name)
+    yield from events
+    yield calendar_end()
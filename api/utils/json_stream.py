@@ -0,0 +1,91 @@
+from __future__ import annotations
+from typing import List, Optional
+
+# Fuera de cadenas, un JSON sólo puede contener estructura, números y los literales true/false/null.
+_STRUCT_CHARS = set("{}[]:,\"")
+_NUMBER_CHARS = set("0123456789-+.eE")
+_LITERAL_CHARS = set("truefalsn")
+_WHITESPACE = set(" \t\r\n")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JSONStreamError(ValueError):
+    """La salida en streaming no puede ser el JSON esperado: conviene abortar y reintentar."""
+
+
+class IncrementalJSONScanner:
+    """
+    Escáner incremental del primer valor JSON de nivel superior (objeto o array)
+    en un texto que llega por trozos.
+
+    - `feed(chunk)` devuelve el texto del valor en cuanto las llaves/corchetes
+      quedan equilibrados (lo que venga después se ignora), o None si aún falta.
+    - Lanza `JSONStreamError` en cuanto la salida es estructuralmente imposible:
+      cierre que no corresponde, caracteres que no pueden ir fuera de una cadena
+      (claves sin comillas, comentarios, prosa...), demasiado texto antes del JSON
+      o un valor que excede `max_chars`.
+    Se toleran un preámbulo corto y fences ```json antes del valor.
+    """
+
+    def __init__(self, max_preamble: int = 200, max_chars: int = 60000) -> None:
+        self.max_preamble = max_preamble
+        self.max_chars = max_chars
+        self._preamble = 0
+        self._buf: List[str] = []
+        self._size = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done: Optional[str] = None
+
+    @property
+    def started(self) -> bool:
+        return bool(self._stack) or self._done is not None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self._done is not None:
+            return self._done
+        for ch in chunk:
+            if not self._stack:
+                # Antes del valor: buscamos el primer '{' o '['
+                if ch in _CLOSERS:
+                    self._stack.append(_CLOSERS[ch])
+                    self._buf.append(ch)
+                    self._size = 1
+                    continue
+                self._preamble += 1
+                if self._preamble > self.max_preamble:
+                    raise JSONStreamError("Demasiado texto antes del JSON")
+                continue
+
+            self._buf.append(ch)
+            self._size += 1
+            if self._size > self.max_chars:
+                raise JSONStreamError("JSON demasiado largo (posible generación desbocada)")
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                elif ch == "\n":
+                    raise JSONStreamError("Salto de línea sin escapar dentro de una cadena")
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(_CLOSERS[ch])
+            elif ch in ("}", "]"):
+                if self._stack.pop() != ch:
+                    raise JSONStreamError(f"Cierre '{ch}' inesperado")
+                if not self._stack:
+                    self._done = "".join(self._buf)
+                    return self._done
+            elif ch in _WHITESPACE or ch in _STRUCT_CHARS or ch in _NUMBER_CHARS or ch in _LITERAL_CHARS:
+                continue
+            else:
+                raise JSONStreamError(f"Carácter inválido fuera de cadena: {ch!r}")
+        return None
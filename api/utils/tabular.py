@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import tempfile
+import zlib
+from typing import Any, Iterable, Iterator, List, Sequence
+
+try:  # pragma: no cover - optional dependency
+    from openpyxl import Workbook  # type: ignore
+except Exception:  # pragma: no cover
+    Workbook = None  # type: ignore
+
+# Serializadores incrementales para exportaciones: cada uno consume un iterador
+# de filas y emite trozos de tamaño acotado, sin materializar el resultado.
+
+ROWS_PER_CHUNK = 200
+_FILE_CHUNK = 64 * 1024
+
+
+def xlsx_available() -> bool:
+    return Workbook is not None
+
+
+def csv_chunks(header: Sequence[str], rows: Iterable[Sequence[Any]], rows_per_chunk: int = ROWS_PER_CHUNK) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % rows_per_chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+
+def ndjson_chunks(keys: Sequence[str], rows: Iterable[Sequence[Any]], rows_per_chunk: int = ROWS_PER_CHUNK) -> Iterator[str]:
+    lines: List[str] = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(keys, row)), ensure_ascii=False, default=str) + "\n")
+        if len(lines) >= rows_per_chunk:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def xlsx_chunks(header: Sequence[str], rows: Iterable[Sequence[Any]], title: str = "Hoja1") -> Iterator[bytes]:
+    """
+    XLSX con openpyxl en modo write-only (las filas van a disco, memoria constante).
+    El formato es un zip: el primer byte sale cuando el libro está cerrado.
+    """
+    if Workbook is None:
+        raise RuntimeError("openpyxl no está instalado")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(list(header))
+    for row in rows:
+        ws.append(list(row))
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(_FILE_CHUNK):
+            yield chunk
+
+
+def gzip_chunks(chunks: Iterable[Any]) -> Iterator[bytes]:
+    """Comprime en streaming (formato gzip) un iterador de str/bytes."""
+    comp = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = comp.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*") and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return True
+    return False
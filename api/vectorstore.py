@@ -7,13 +7,33 @@ from qdrant_client.models import VectorParams, Distance, PointStruct
 from qdrant_client.http import models as qm
 
 from .config import settings
+from .metrics import RAG_QUERIES, RAG_QUERY_SECONDS, RAG_HITS, stage
+from .circuit_breaker import qdrant_breaker
 
 # -------- Qdrant client (singleton) --------
 _qc: Optional[AsyncQdrantClient] = None
+# Bumped on every write from this process so derived caches know the collection changed
+_collection_version = 0
+
+def collection_version() -> int:
+    return _collection_version
+
+def mark_collection_changed() -> None:
+    global _collection_version
+    _collection_version += 1
+
+async def collection_stamp() -> tuple:
+    """(local write version, points_count): changes when this or another process writes."""
+    info = await get_client().get_collection(settings.collection_name)
+    return (_collection_version, getattr(info, "points_count", None))
 
 def get_client() -> AsyncQdrantClient:
     """Return a singleton Qdrant client."""
     global _qc
+    if _qc is None and settings.qdrant_location:
+        # Embedded/local mode (offline load tests): in-memory or on-disk, no server needed
+        loc = settings.qdrant_location
+        _qc = AsyncQdrantClient(location=loc) if loc == ":memory:" else AsyncQdrantClient(path=loc)
     if _qc is None:
         _qc = AsyncQdrantClient(
             url=getattr(settings, "qdrant_url", None),
@@ -95,6 +115,7 @@ async def upsert_documents(
 
     if points:
         await client.upsert(collection_name=name, points=points)
+        mark_collection_changed()
     if skipped:
         print(f"[vectorstore] Aviso: omitidos {skipped} documento(s) por embeddings vacíos/invalidos.")
 
@@ -102,6 +123,7 @@ async def upsert_documents(
 async def search(query_vectors: Dict[str, List[float]], top_k: int = 5) -> List[Dict[str, Any]]:
     """
     Multi-vector search (simple strategy: query using first available named vector).
+    Raises CircuitOpenError right away while the Qdrant breaker is open.
     """
     client = get_client()
     name = settings.collection_name
@@ -113,12 +135,28 @@ async def search(query_vectors: Dict[str, List[float]], top_k: int = 5) -> List[
             f"recibido {list(query_vectors.keys())}"
         )
 
-    res = await client.search(
-        collection_name=name,
-        query_vector=(primary, query_vectors[primary]),
-        limit=top_k,
-        with_payload=True,
-    )
+    RAG_QUERIES.labels("search").inc()
+    async with qdrant_breaker.call():
+        with stage("search"), RAG_QUERY_SECONDS.labels("search").time():
+            if hasattr(client, "query_points"):
+                # qdrant-client >= 1.10 (search() was removed in later releases)
+                res = (
+                    await client.query_points(
+                        collection_name=name,
+                        query=query_vectors[primary],
+                        using=primary,
+                        limit=top_k,
+                        with_payload=True,
+                    )
+                ).points
+            else:
+                res = await client.search(
+                    collection_name=name,
+                    query_vector=(primary, query_vectors[primary]),
+                    limit=top_k,
+                    with_payload=True,
+                )
+    RAG_HITS.labels("search").observe(len(res))
 
     out: List[Dict[str, Any]] = []
     for r in res:
@@ -147,3 +185,4 @@ async def delete_user_recipe_vectors(user_id: str, recipe_id: str) -> None:
             ]
         ),
     )
+    mark_collection_changed()
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlmodel import Session
+
+from .db import upsert_insert
+from .models_db import WorkerLease
+
+# Identidad de este proceso para reclamar trabajo en segundo plano compartido
+# entre varios workers (jobs del planner, pregen nocturno): quien reclama en la
+# BD es el dueño hasta que caduca su lease.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(session: Session, name: str, ttl_s: float, now: Optional[datetime] = None) -> bool:
+    """
+    Toma (o renueva, si ya es nuestra) la lease `name` con un único INSERT ...
+    ON CONFLICT condicionado a que esté caducada. Hace commit.
+    """
+    now = now or datetime.now(timezone.utc)
+    table = WorkerLease.__table__
+    stmt = upsert_insert(session, WorkerLease).values(name=name, owner=WORKER_ID, expires_at=now + timedelta(seconds=ttl_s))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+        where=(table.c.owner == WORKER_ID) | (table.c.expires_at < now),
+    )
+    res = session.execute(stmt)
+    session.commit()
+    return res.rowcount == 1
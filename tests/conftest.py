@@ -34,9 +34,39 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
 
+import api.db as db
+import api.services.ingredient_lines as ingredient_lines
 import api.main as main
 
+
+@pytest.fixture(autouse=True)
+def no_background_extraction(monkeypatch):
+    """
+    Las escrituras del plan encargan la extracción de ingredientes al LLM real en
+    segundo plano; en los tests no (los que la cubren usan su propio resolver).
+    """
+    monkeypatch.setattr(ingredient_lines.plan_lines_resolver, "schedule", lambda *a, **k: None)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """SQLite en memoria con el esquema creado; también sustituye a api.db.engine (sesiones propias)."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine)
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    """Sesión sobre `engine` como la de get_session (sin expirar al hacer commit)."""
+    with Session(engine, expire_on_commit=False) as s:
+        yield s
+
+
 @pytest.fixture
 def client(request, monkeypatch):
     """
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api.adaptive_limit import AdaptiveLimiter, overload_reason
+
+
+def _status_error(code: int) -> httpx.HTTPStatusError:
+    req = httpx.Request("POST", "http://llm.local/api/generate")
+    return httpx.HTTPStatusError("boom", request=req, response=httpx.Response(code, request=req))
+
+
+def test_additive_increase_on_healthy_calls():
+    lim = AdaptiveLimiter("test-inc", initial=2, max_limit=4, latency_target_s=10)
+    for _ in range(20):
+        lim.record(0.1)
+    assert lim.limit == 4  # sube pero respeta el máximo
+
+
+def test_multiplicative_decrease_on_overload():
+    lim = AdaptiveLimiter("test-dec", initial=8, min_limit=1, max_limit=16, cooldown_s=0)
+    lim.record(0.1, overload="429")
+    assert lim.limit == 4
+    lim.record(0.1, overload="5xx")
+    lim.record(0.1, overload="5xx")
+    lim.record(0.1, overload="5xx")
+    assert lim.limit == 1  # nunca por debajo del mínimo
+
+
+def test_latency_spike_counts_as_overload():
+    lim = AdaptiveLimiter("test-spike", initial=8, latency_target_s=1.0, cooldown_s=0)
+    lim.record(5.0)
+    assert lim.limit == 4
+
+
+def test_overload_reason_classification():
+    assert overload_reason(_status_error(429)) == "429"
+    assert overload_reason(_status_error(503)) == "5xx"
+    assert overload_reason(_status_error(400)) is None
+    assert overload_reason(httpx.ReadTimeout("slow")) == "timeout"
+
+
+def test_waiters_queue_until_slot_is_released():
+    async def scenario():
+        lim = AdaptiveLimiter("test-queue", initial=1, max_limit=1)
+        await lim.acquire()
+        waiter = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        assert lim.queue_depth == 1 and not waiter.done()
+        lim.release()
+        await asyncio.wait_for(waiter, 1)
+        assert lim.inflight == 1 and lim.queue_depth == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_records_overload_and_reraises():
+    async def scenario():
+        lim = AdaptiveLimiter("test-slot", initial=4, cooldown_s=0)
+        with pytest.raises(httpx.HTTPStatusError):
+            async with lim.slot():
+                raise _status_error(429)
+        assert lim.limit == 2 and lim.inflight == 0
+
+    asyncio.run(scenario())
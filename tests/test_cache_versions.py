@@ -0,0 +1,54 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+from sqlmodel import select
+
+import api.routes.catalog as catalog
+import api.routes.planner as planner
+import api.routes.shopping as shopping
+from api.models_db import Cache, Product
+from api.schemas import RecipeNeutral
+from api.services.versions import bump_version, get_versions, GLOBAL_USER
+
+
+def _plan(session, day, main):
+    recipe = RecipeNeutral(title=f"Plato de {main}", portions=2, steps_generic=[],
+                           ingredients=[{"name": main, "qty": 200, "unit": "g"}])
+    planner.upsert_plan_entries(session, "u1", [(day, "dinner", recipe)], 2, [])
+    session.commit()
+
+
+def _week(session):
+    items = asyncio.run(shopping.aggregate_week(start=date(2025, 8, 25), session=session, user_id="u1"))
+    return {i.name: (i.qty, i.category) for i in items}
+
+
+def test_bump_is_per_user_and_scope(session):
+    bump_version(session, "u1", "plan")
+    bump_version(session, "u1", "plan")
+    bump_version(session, GLOBAL_USER, "catalog")
+    bump_version(session, "u2", "catalog")
+    session.commit()
+    assert get_versions(session, "u1") == {"plan": 2, "catalog@global": 1}
+
+
+def test_plan_and_catalog_writes_invalidate_week_aggregate(session):
+    _plan(session, date(2025, 8, 25), "arroz")
+    assert _week(session)["arroz"][0] == 200
+
+    # Cambio en el plan → clave nueva, sin esperar al TTL
+    _plan(session, date(2025, 8, 26), "lentejas")
+    assert set(_week(session)) == {"arroz", "lentejas"}
+
+    # Cambio en el catálogo → las categorías se recalculan al leer
+    catalog.create_product(prod=Product(name="arroz", category="despensa", created_at=datetime.now(timezone.utc)), session=session, user_id="u1")
+    assert _week(session)["arroz"] == (200, "despensa")
+
+
+def test_new_week_version_replaces_older_cache_rows(session):
+    _plan(session, date(2025, 8, 25), "arroz")
+    _week(session)
+    _plan(session, date(2025, 8, 26), "lentejas")
+    _week(session)
+    keys = session.exec(select(Cache.key).where(Cache.user_id == "u1")).all()
+    assert len(keys) == 1 and keys[0].startswith("agg-week:2025-08-25:")
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import api.rag as rag
+import api.routes.generate as gen
+from api.circuit_breaker import CircuitBreaker, CircuitOpenError
+from api.utils.json_stream import JSONStreamError
+
+
+async def _fail(br, exc):
+    async with br.call():
+        raise exc
+
+
+def _run_fail(br, exc):
+    with pytest.raises(type(exc)):
+        asyncio.run(_fail(br, exc))
+
+
+def test_opens_after_consecutive_failures_and_rejects_fast():
+    br = CircuitBreaker("t", failure_threshold=3, reset_timeout_s=60)
+    for _ in range(3):
+        _run_fail(br, httpx.ConnectError("down"))
+    assert br.state == "open"
+    with pytest.raises(CircuitOpenError) as ei:
+        br.check()
+    assert ei.value.retry_after > 0
+
+
+def test_success_resets_failure_count():
+    br = CircuitBreaker("t", failure_threshold=2)
+    _run_fail(br, httpx.ConnectError("down"))
+    br.record_success(0.01)
+    _run_fail(br, httpx.ConnectError("down"))
+    assert br.state == "closed"
+
+
+def test_half_open_probe_closes_or_reopens():
+    br = CircuitBreaker("t", failure_threshold=1, reset_timeout_s=0.05)
+    _run_fail(br, httpx.ReadTimeout("slow"))
+    assert br.state == "open"
+    time.sleep(0.06)
+    assert br.state == "half_open"
+    _run_fail(br, httpx.ReadTimeout("slow"))  # la sonda falla → vuelve a abrirse
+    assert br.state == "open"
+    time.sleep(0.06)
+
+    async def ok():
+        async with br.call():
+            return 1
+
+    asyncio.run(ok())
+    assert br.state == "closed"
+
+
+def test_slow_calls_count_as_failures():
+    br = CircuitBreaker("t", failure_threshold=2, slow_call_s=0.1)
+    br.record_success(0.5)
+    br.record_success(0.5)
+    assert br.state == "open"
+
+
+def test_ignored_and_client_errors_do_not_trip():
+    br = CircuitBreaker("t", failure_threshold=1, ignore=(JSONStreamError,))
+    _run_fail(br, JSONStreamError("json roto"))
+    req = httpx.Request("POST", "http://x")
+    _run_fail(br, httpx.HTTPStatusError("bad", request=req, response=httpx.Response(400, request=req)))
+    assert br.state == "closed"
+
+
+def test_retrieve_serves_cached_hits_when_search_fails(monkeypatch):
+    hits = [{"id": "1", "score": 0.9, "payload": {"text": "x"}}]
+    dims = rag.settings.parsed_vector_dims()
+
+    async def fake_embed(texts):
+        return {k: [[0.1] * d] for k, d in dims.items()}
+
+    async def ok_search(qv, top_k=5):
+        return hits
+
+    async def down_search(qv, top_k=5):
+        raise CircuitOpenError("qdrant", 10)
+
+    monkeypatch.setattr(rag, "embed_dual", fake_embed)
+    monkeypatch.setattr(rag, "search", ok_search)
+    assert asyncio.run(rag.retrieve("pollo arroz", 3)) == hits
+
+    monkeypatch.setattr(rag, "search", down_search)
+    assert asyncio.run(rag.retrieve("pollo arroz", 3)) == hits
+    assert asyncio.run(rag.retrieve("otra consulta", 3)) == []
+
+
+def test_generate_returns_fallback_when_llm_breaker_open(monkeypatch):
+    async def no_context(query, top_k=5):
+        return []
+
+    async def breaker_open(prompt, validate=None):
+        raise CircuitOpenError("llm", 10)
+
+    monkeypatch.setattr(gen, "retrieve", no_context)
+    monkeypatch.setattr(gen, "_call_llm", breaker_open)
+    req = gen.RecipeGenRequest(ingredients=["pollo", "arroz"], appliances=["airfryer"])
+    res = asyncio.run(gen._generate_recipe(req))
+    assert res.sources == []
+    assert res.recipe.title == "Receta generada"
+    assert res.recipe.steps_generic[1].temperature_c == 190
@@ -0,0 +1,104 @@
+import asyncio
+
+import api.services.quantify as quantify
+from api.schemas import RecipeNeutral
+
+
+def _recipe(main):
+    return RecipeNeutral(title=f"Plato de {main}", portions=2, steps_generic=[
+        {"action": "cook", "description": f"Cocinar {main}", "ingredients": [main], "tools": [], "time_min": 10},
+    ])
+
+
+def test_extraction_is_concurrent_and_memoized_per_recipe(session, monkeypatch):
+    calls = []
+    running = {"now": 0, "max": 0}
+
+    async def fake_extract(recipe, session, user_id):
+        calls.append(recipe.title)
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.02)
+        running["now"] -= 1
+        main = recipe.steps_generic[0].ingredients[0]
+        return [{"name": main, "qty": 100.0, "unit": "g"}]
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", fake_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    week = [_recipe(m) for m in ("arroz", "pollo", "arroz", "lentejas")]
+
+    out = asyncio.run(quantify.extract_items_many(week, session, "u1"))
+    assert len(calls) == 3  # la receta repetida se extrae una vez
+    assert running["max"] > 1
+    assert [[(i["name"], i["qty"]) for i in items] for items in out] == [
+        [("arroz", 100.0)], [("pollo", 100.0)], [("arroz", 100.0)], [("lentejas", 100.0)],
+    ]
+
+    calls.clear()
+    week[1] = _recipe("salmón")  # cambia un día
+    asyncio.run(quantify.extract_items_many(week, session, "otro-usuario"))
+    assert calls == ["Plato de salmón"]
+
+
+def test_empty_extraction_is_not_cached(session, monkeypatch):
+    calls = []
+
+    async def failing_extract(recipe, session, user_id):
+        calls.append(recipe.title)
+        return []
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", failing_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    for _ in range(2):
+        out = asyncio.run(quantify.extract_items_many([_recipe("garbanzos")], session, "u1"))
+        assert [i["name"] for i in out[0]] == ["garbanzos"]  # sólo la conjetura del parser
+    assert len(calls) == 2
+
+
+def test_batch_extraction_falls_back_per_recipe(session, monkeypatch):
+    prompts = []
+    singles = []
+
+    async def fake_llm(prompt, validate=None):
+        prompts.append(prompt)
+        payload = quantify.json.loads(prompt.split("```json")[1].split("```")[0])
+        out = {str(r["index"]): [{"name": r["steps"][0]["ingredients"][0], "qty": "200 g"}] for r in payload}
+        out["1"] = "no es un array"
+        return quantify.json.dumps(out)
+
+    async def fake_single(recipe, session, user_id):
+        singles.append(recipe.title)
+        return [{"name": "pollo", "qty": 1.0, "unit": "kg"}]
+
+    monkeypatch.setattr(quantify, "call_llm", fake_llm)
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", fake_single)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 8)
+    recipes = [_recipe(m) for m in ("arroz", "pollo", "lentejas")]
+
+    out = asyncio.run(quantify.extract_items_many(recipes, session, "u1"))
+
+    assert len(prompts) == 1 and prompts[0].count("Eres un asistente") == 1
+    assert singles == ["Plato de pollo"]
+    assert out == [
+        [{"name": "arroz", "qty": 200.0, "unit": "g"}],
+        [{"name": "pollo", "qty": 1.0, "unit": "kg"}],
+        [{"name": "lentejas", "qty": 200.0, "unit": "g"}],
+    ]
+
+
+def test_bare_names_go_to_llm_at_default_threshold(session, monkeypatch):
+    seen = []
+
+    async def fake_extract(recipe, session, user_id):
+        seen.append([i for st in recipe.steps_generic for i in st.ingredients])
+        return [{"name": "lentejas", "qty": 250.0, "unit": "g"}, {"name": "cebolla", "qty": 1.0, "unit": "ud"}]
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", fake_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    recipe = RecipeNeutral(title="Lentejas", portions=2, steps_generic=[
+        {"action": "cook", "description": "Guisar", "ingredients": ["lentejas", "cebolla", "sal al gusto"]},
+    ])
+    assert quantify.known_items(session, recipe) is None  # sin cantidades no se materializa a ciegas
+    out = asyncio.run(quantify.extract_items_many([recipe], session, "u1"))
+    assert seen == [["lentejas", "cebolla"]]
+    assert {(i["name"], i["qty"]) for i in out[0]} == {("sal", None), ("lentejas", 250.0), ("cebolla", 1.0)}
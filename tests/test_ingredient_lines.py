@@ -0,0 +1,149 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import api.routes.planner as planner
+import api.routes.shopping as shopping
+import api.services.ingredient_lines as lines
+import api.services.quantify as quantify
+from api.models_db import PlanEntry, RecipeIngredient
+from api.schemas import RecipeNeutral
+
+
+def _recipe(main, qty=None):
+    return RecipeNeutral(
+        title=f"Plato de {main}", portions=2,
+        steps_generic=[{"action": "cook", "description": "Cocinar", "ingredients": [main, "sal"], "tools": [], "time_min": 10}],
+        ingredients=[{"name": main, "qty": qty, "unit": "g"}, {"name": "Sal", "qty": None, "unit": None}] if qty else None,
+    )
+
+
+def test_recipe_ingredients_are_optional_and_tolerant():
+    r = RecipeNeutral(title="x", portions=2, steps_generic=[], ingredients=[{"name": "arroz", "qty": "mucho"}, {"qty": 3}, "sal"])
+    assert [(i.name, i.qty) for i in r.ingredients] == [("arroz", None)]
+    assert RecipeNeutral(title="x", portions=2, steps_generic=[], ingredients="no").ingredients is None
+
+
+def test_lines_written_with_plan_and_aggregated_in_sql(engine, monkeypatch):
+    async def no_llm(*a, **k):
+        raise AssertionError("el agregado no debe llamar al LLM")
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", no_llm)
+    monkeypatch.setattr(quantify, "llm_extract_ingredients_batch", no_llm)
+    with Session(engine, expire_on_commit=False) as s:
+        planner.upsert_plan_entries(s, "u1", [
+            (date(2025, 8, 25), "dinner", _recipe("arroz", 200)),
+            (date(2025, 8, 26), "dinner", _recipe("arroz", 150)),
+            (date(2025, 8, 26), "lunch", _recipe("pollo", 300)),
+        ], 2, [])
+        s.commit()
+        # Regenerar un día reemplaza sus líneas
+        planner.upsert_plan_entries(s, "u1", [(date(2025, 8, 26), "lunch", _recipe("pollo", 500))], 2, [])
+        s.commit()
+        assert len(s.exec(select(RecipeIngredient)).all()) == 6
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+        out, _ = asyncio.run(shopping._aggregate_range(s, "u1", date(2025, 8, 25), date(2025, 8, 31)))
+
+    assert {(a.name, a.qty, a.unit) for a in out} == {("arroz", 350.0, "g"), ("pollo", 500.0, "g"), ("sal", None, None)}
+    assert sum("GROUP BY" in q for q in statements) == 1
+    assert not any("FROM cache" in q for q in statements)
+
+
+def _legacy_entry(s):
+    # Entrada escrita antes de existir la tabla de líneas (sin ingredientes emitidos)
+    s.add(PlanEntry(user_id="u1", plan_date=date(2025, 8, 27), meal="dinner", title="Lentejas",
+                    recipe=_recipe("lentejas").model_dump(), created_at=datetime.now(timezone.utc)))
+    s.commit()
+
+
+def _read(s):
+    return asyncio.run(shopping._aggregate_range(s, "u1", date(2025, 8, 25), date(2025, 8, 31)))
+
+
+def test_reads_serve_provisional_lines_and_extract_in_background(engine, monkeypatch):
+    calls = []
+
+    async def fake_extract(recipe, session, user_id):
+        calls.append(recipe.title)
+        return [{"name": "lentejas", "qty": 250.0, "unit": "g"}]
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", fake_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    resolver = lines.PlanLinesResolver()
+    monkeypatch.setattr(lines, "plan_lines_resolver", resolver)
+    with Session(engine, expire_on_commit=False) as s:
+        _legacy_entry(s)
+
+        async def first_read():
+            out, complete = await shopping._aggregate_range(s, "u1", date(2025, 8, 25), date(2025, 8, 31))
+            assert calls == []  # la lectura no espera al LLM
+            await resolver._tasks[("u1", date(2025, 8, 25), date(2025, 8, 31))]
+            return out, complete
+
+        out, complete = asyncio.run(first_read())
+        assert not complete and ("lentejas", None) in [(a.name, a.qty) for a in out]
+        for _ in range(2):
+            out, complete = _read(s)
+            assert complete and [(a.name, a.qty) for a in out] == [("lentejas", 250.0)]
+    assert calls == ["Plato de lentejas"]
+
+
+def test_failed_extraction_stays_pending_and_is_not_retried_on_every_read(engine, monkeypatch):
+    answers = [[], [{"name": "lentejas", "qty": 250.0, "unit": "g"}]]
+
+    async def flaky_extract(recipe, session, user_id):
+        return answers.pop(0)
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", flaky_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    resolver = lines.PlanLinesResolver()
+    monkeypatch.setattr(lines, "plan_lines_resolver", resolver)
+    week = ("u1", date(2025, 8, 25), date(2025, 8, 31))
+
+    async def read(s):
+        out, complete = await shopping._aggregate_range(s, *week)
+        if week in resolver._tasks:
+            await resolver._tasks[week]
+        return out, complete
+
+    with Session(engine, expire_on_commit=False) as s:
+        _legacy_entry(s)
+        # 1ª lectura: provisional; la extracción en segundo plano no obtiene nada
+        out, complete = asyncio.run(read(s))
+        assert not complete and ("lentejas", None) in [(a.name, a.qty) for a in out]
+        assert s.exec(select(RecipeIngredient)).all() == [] and len(answers) == 1
+        # 2ª lectura dentro de la ventana de reintento: sin otra llamada al LLM
+        out, complete = asyncio.run(read(s))
+        assert not complete and len(answers) == 1
+        # Pasada la ventana se reintenta y se materializa
+        monkeypatch.setattr(lines.settings, "ingredient_resolve_retry_s", 0.0)
+        asyncio.run(read(s))
+        out, complete = _read(s)
+        assert complete and ("lentejas", 250.0) in [(a.name, a.qty) for a in out]
+    assert answers == []
+
+
+def test_plan_writes_schedule_extraction_after_commit(engine, monkeypatch):
+    async def fake_extract(recipe, session, user_id):
+        return [{"name": "lentejas", "qty": 250.0, "unit": "g"}]
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", fake_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    resolver = lines.PlanLinesResolver()
+    monkeypatch.setattr(lines, "plan_lines_resolver", resolver)
+    monkeypatch.setattr(planner, "plan_lines_resolver", resolver)
+
+    async def write():
+        with Session(engine, expire_on_commit=False) as s:
+            planner.upsert_plan_entries(s, "u1", [(date(2025, 8, 27), "dinner", _recipe("lentejas"))], 2, [])
+            assert resolver._tasks == {}  # antes del commit la entrada no es visible
+            s.commit()
+        await resolver._tasks[("u1", date(2025, 8, 27), date(2025, 8, 27))]
+
+    asyncio.run(write())
+    with Session(engine) as s:
+        assert [(r.name, r.qty) for r in s.exec(select(RecipeIngredient)).all()] == [("lentejas", 250.0)]
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+import api.services.quantify as quantify
+from api.schemas import RecipeNeutral
+from api.services.ingredient_parser import parse_phrase, parse_phrases
+
+
+@pytest.mark.parametrize("text, name, qty, unit", [
+    ("200g de arroz", "arroz", 200.0, "g"),
+    ("1/2 taza de leche", "leche", 0.5, "taza"),
+    ("1 ½ cucharadas de aceite de oliva", "aceite de oliva", 1.5, "cda"),
+    ("2-3 dientes de ajo", "ajo", 2.5, "diente"),
+    ("una pizca de sal", "sal", 1.0, "pizca"),
+    ("2 latas de 400 g de tomate triturado", "tomate triturado", 800.0, "g"),
+    ("medio kilo de patatas", "patatas", 0.5, "kg"),
+    ("2 huevos", "huevos", 2.0, "ud"),
+    ("pimienta al gusto", "pimienta", None, None),
+])
+def test_parses_common_phrases_confidently(text, name, qty, unit):
+    line = parse_phrase(text)
+    assert (line.name, line.qty, line.unit) == (name, qty, unit)
+    assert line.confidence >= 0.8
+
+
+def test_doubtful_phrases_score_low():
+    assert parse_phrase("2 manojitos de perejil").confidence < 0.8
+    assert parse_phrase("cocer la pasta 10 minutos en agua").confidence < 0.8
+    # Sin cantidad: el nombre sale bien, pero la cantidad la estima el LLM
+    assert (parse_phrase("cebolla, picada").name, parse_phrase("cebolla, picada").confidence) == ("cebolla", 0.6)
+    sure, unsure = parse_phrases(["200 g de arroz", "arroz", "sal al gusto", "3 ramilletes de brócoli"], 0.8)
+    assert [p.name for p in sure] == ["arroz", "sal"]  # "arroz" sin cantidad se omite
+    assert [p.text for p in unsure] == ["3 ramilletes de brócoli"]
+
+
+def test_llm_only_sees_low_confidence_lines(session, monkeypatch):
+    seen = []
+
+    async def fake_extract(recipe, session, user_id):
+        seen.append([i for st in recipe.steps_generic for i in st.ingredients])
+        return [{"name": "brócoli", "qty": 300.0, "unit": "g"}]
+
+    monkeypatch.setattr(quantify, "llm_extract_ingredients", fake_extract)
+    monkeypatch.setattr(quantify.settings, "ingredient_extract_batch_size", 1)
+    parsed_only = RecipeNeutral(title="Arroz", portions=2, steps_generic=[
+        {"action": "cook", "description": "Cocer", "ingredients": ["200 g de arroz", "sal al gusto"]},
+    ])
+    mixed = RecipeNeutral(title="Brócoli", portions=2, steps_generic=[
+        {"action": "prep", "description": "Lavar", "ingredients": ["3 ramilletes de brócoli", "2 dientes de ajo"]},
+        {"action": "cook", "description": "Saltear", "ingredients": ["2 dientes de ajo"]},
+    ])
+    out = asyncio.run(quantify.extract_items_many([parsed_only, mixed], session, "u1"))
+    assert seen == [["3 ramilletes de brócoli"]]
+    assert out[0] == [{"name": "arroz", "qty": 200.0, "unit": "g"}, {"name": "sal", "qty": None, "unit": None}]
+    assert out[1] == [{"name": "ajo", "qty": 2.0, "unit": "diente"}, {"name": "brócoli", "qty": 300.0, "unit": "g"}]
@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import json
+
+import httpx
+import pytest
+
+import api.llm as llm
+from api.utils.json_stream import IncrementalJSONScanner, JSONStreamError
+
+
+def _feed_all(scanner, chunks):
+    out = None
+    for ch in chunks:
+        out = scanner.feed(ch)
+        if out is not None:
+            break
+    return out
+
+
+def test_completes_on_balanced_object_and_ignores_trailing_prose():
+    sc = IncrementalJSONScanner()
+    chunks = ['```json\n{"title": "Pa', 'sta {rápida}", "steps": [1, ', '2]}', "\n```\nEspero que te guste"]
+    text = _feed_all(sc, chunks)
+    assert json.loads(text) == {"title": "Pasta {rápida}", "steps": [1, 2]}
+
+
+def test_escaped_quotes_do_not_end_strings():
+    sc = IncrementalJSONScanner()
+    text = sc.feed('{"a": "dice \\"hola\\" }", "b": null}')
+    assert json.loads(text)["a"] == 'dice "hola" }'
+
+
+def test_top_level_array():
+    sc = IncrementalJSONScanner()
+    assert json.loads(sc.feed('[{"name": "sal"}] y más texto')) == [{"name": "sal"}]
+
+
+@pytest.mark.parametrize("bad", [
+    '{"title": "x"]',                 # cierre que no corresponde
+    '{title: "x"}',                   # clave sin comillas
+    '{"time_min": 5, // comentario',  # comentario estilo JS
+])
+def test_structurally_invalid_aborts_early(bad):
+    with pytest.raises(JSONStreamError):
+        IncrementalJSONScanner().feed(bad)
+
+
+def test_long_preamble_aborts():
+    with pytest.raises(JSONStreamError):
+        IncrementalJSONScanner(max_preamble=10).feed("Claro, aquí tienes una receta estupenda")
+
+
+def test_stream_json_stops_when_object_is_complete(monkeypatch):
+    served = []
+
+    def handler(request):
+        events = [
+            {"response": '{"title": "Tortilla", ', "done": False},
+            {"response": '"portions": 2}', "done": False},
+            {"response": " Y ahora una larga explicación...", "done": False},
+            {"response": "", "done": True, "eval_count": 999},
+        ]
+        body = "".join(json.dumps(e) + "\n" for e in events)
+        served.append(request)
+        return httpx.Response(200, text=body)
+
+    monkeypatch.setattr(
+        llm.httpx, "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)),
+    )
+    text = asyncio.run(llm.stream_json("prompt", model="m", validate=lambda d: d["title"]))
+    assert json.loads(text) == {"title": "Tortilla", "portions": 2}
+    assert json.loads(served[0].content)["stream"] is True
+
+
+def test_stream_json_raises_when_validation_fails(monkeypatch):
+    def handler(request):
+        return httpx.Response(200, text=json.dumps({"response": '{"foo": 1}', "done": True}) + "\n")
+
+    monkeypatch.setattr(
+        llm.httpx, "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)),
+    )
+    with pytest.raises(JSONStreamError):
+        asyncio.run(llm.stream_json("prompt", model="m", validate=lambda d: d["title"]))
+
+
+def test_stream_json_early_stop_charges_prompt_estimate(monkeypatch):
+    from api.llm_scheduler import TokenBudget, llm_context
+
+    def handler(request):
+        events = [
+            {"response": '{"title": "Tortilla"}', "done": False},
+            {"response": " y más texto", "done": False},
+            {"response": "", "done": True, "prompt_eval_count": 5000, "eval_count": 999},
+        ]
+        return httpx.Response(200, text="".join(json.dumps(e) + "\n" for e in events))
+
+    monkeypatch.setattr(
+        llm.httpx, "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)),
+    )
+    prompt = "x" * 4000
+    budget = TokenBudget(100_000)
+
+    async def run():
+        with llm_context("background", "u1", budget=budget):
+            return await llm.stream_json(prompt, model="m")
+
+    asyncio.run(run())
+    # Sin evento final: prompt estimado por longitud + 1 trozo de salida
+    assert budget.used == llm.estimate_tokens(prompt) + 1 == 1001
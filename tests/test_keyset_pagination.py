@@ -0,0 +1,74 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlmodel import select
+
+import api.routes.catalog as catalog
+import api.routes.shopping as shopping
+from api.models_db import Product, ShoppingItem
+from api.pagination import NEXT_CURSOR_HEADER, keyset
+
+
+@pytest.fixture(autouse=True)
+def rows(session):
+    t0 = datetime(2025, 8, 25, tzinfo=timezone.utc)
+    # Marcas de tiempo repetidas: el id desempata
+    session.add_all([ShoppingItem(user_id="u1", name=f"item {i:02d}", created_at=t0 + timedelta(minutes=i // 3))
+                     for i in range(25)])
+    session.add_all([Product(user_id="u1", name=f"prod {i:02d}", category=(None if i % 4 == 0 else f"cat {i % 3}"),
+                             created_at=t0) for i in range(25)])
+    session.commit()
+
+
+def _walk(list_fn, session, limit, **kw):
+    names, cursor, pages = [], None, 0
+    while True:
+        resp = Response()
+        rows = list_fn(response=resp, limit=limit, cursor=cursor, offset=0, format="json",
+                       session=session, user_id="u1", **kw)
+        names += [r.name for r in rows]
+        pages += 1
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return names, pages
+
+
+def test_shopping_pages_cover_list_once_in_order(session):
+    names, pages = _walk(shopping.list_items, session, 10)
+    expected = [r.name for r in session.exec(
+        select(ShoppingItem).order_by(ShoppingItem.created_at.desc(), ShoppingItem.id.desc())
+    ).all()]
+    assert names == expected and pages == 3
+
+
+def test_catalog_keyset_handles_null_categories(session):
+    names, _ = _walk(catalog.list_products, session, 7)
+    assert sorted(names) == sorted(set(names)) and len(names) == 25
+    assert names[:7] == [f"prod {i:02d}" for i in range(0, 25, 4)]  # sin categoría primero
+
+
+def test_ndjson_streams_from_cursor(session):
+    resp = Response()
+    first = shopping.list_items(response=resp, limit=5, cursor=None, offset=0, format="json", session=session, user_id="u1")
+    stream = shopping.list_items(response=Response(), limit=5, cursor=resp.headers[NEXT_CURSOR_HEADER], offset=0,
+                                 format="ndjson", session=session, user_id="u1")
+
+    async def collect():
+        return "".join([c async for c in stream.body_iterator])
+    rows = [json.loads(line) for line in asyncio.run(collect()).splitlines()]
+    assert len(rows) == 20 and rows[0]["name"] not in {r.name for r in first}
+
+
+def test_invalid_cursor_and_index_usage(session):
+    with pytest.raises(HTTPException) as exc:
+        shopping.list_items(response=Response(), limit=5, cursor="no-es-un-cursor", offset=0, format="json",
+                            session=session, user_id="u1")
+    assert exc.value.status_code == 400
+    stmt = keyset(select(ShoppingItem).where(ShoppingItem.user_id == "u1"), shopping.LIST_ORDER, None, desc=True)
+    plan = session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    ).fetchall()
+    assert "ix_shoppingitem_user_created" in str(plan)
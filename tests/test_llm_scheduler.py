@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.adaptive_limit import AdaptiveLimiter
+from api.errors import install_exception_handlers
+from api.llm_scheduler import FairQueue, LLMQueueFull, llm_context
+
+
+def _push(q: FairQueue, loop, priority: str, user: str, label: str):
+    fut = loop.create_future()
+    fut.label = label
+    with llm_context(priority, user):
+        q.push(fut)
+    return fut
+
+
+def _drain(q: FairQueue):
+    out = []
+    while True:
+        fut = q.pop()
+        if fut is None:
+            return out
+        out.append(fut.label)
+
+
+def test_interactive_goes_before_batch_and_background():
+    loop = asyncio.new_event_loop()
+    try:
+        q = FairQueue(max_size=10)
+        _push(q, loop, "background", "a", "bg")
+        _push(q, loop, "batch", "a", "batch")
+        _push(q, loop, "interactive", "b", "int")
+        assert _drain(q) == ["int", "batch", "bg"]
+    finally:
+        loop.close()
+
+
+def test_heavy_user_is_interleaved_with_others():
+    loop = asyncio.new_event_loop()
+    try:
+        q = FairQueue(max_size=20)
+        for i in range(4):
+            _push(q, loop, "batch", "heavy", f"h{i}")
+        _push(q, loop, "batch", "light", "l0")
+        order = _drain(q)
+        # el usuario ligero no espera a que terminen las 4 del pesado
+        assert order.index("l0") <= 1
+    finally:
+        loop.close()
+
+
+def test_weights_give_more_turns():
+    loop = asyncio.new_event_loop()
+    try:
+        q = FairQueue(max_size=20, weights={"vip": 2.0})
+        for i in range(4):
+            _push(q, loop, "batch", "vip", f"v{i}")
+            _push(q, loop, "batch", "std", f"s{i}")
+        first_four = _drain(q)[:4]
+        assert sum(1 for x in first_four if x.startswith("v")) >= 3
+    finally:
+        loop.close()
+
+
+def test_discarded_entries_are_skipped():
+    loop = asyncio.new_event_loop()
+    try:
+        q = FairQueue(max_size=10)
+        a = _push(q, loop, "batch", "u", "a")
+        _push(q, loop, "batch", "u", "b")
+        q.discard(a)
+        assert len(q) == 1
+        assert _drain(q) == ["b"]
+    finally:
+        loop.close()
+
+
+def test_full_queue_raises_with_retry_after():
+    async def scenario():
+        lim = AdaptiveLimiter("test-full", initial=1, max_limit=1, queue=FairQueue(max_size=1))
+        await lim.acquire()
+        waiter = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(LLMQueueFull) as ei:
+            await lim.acquire()
+        assert ei.value.retry_after and ei.value.retry_after >= 1
+        waiter.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_queue_full_maps_to_503_with_retry_after():
+    app = FastAPI()
+    install_exception_handlers(app)
+
+    @app.get("/boom")
+    async def boom():
+        raise LLMQueueFull(retry_after=7)
+
+    r = TestClient(app).get("/boom")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "7"
+    assert r.json()["code"] == "overloaded"
@@ -0,0 +1,76 @@
+import asyncio
+import functools
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import api.llm as llm
+import api.embeddings as embeddings
+import api.rag as rag
+import api.vectorstore as vectorstore
+from tools.llm_standin import StandinConfig, create_app
+
+DIMS = {"standin-embed": 16}
+
+
+def _app(**kw):
+    return create_app(StandinConfig(latency_ms=0, token_ms=0, embed_latency_ms=0, dims=DIMS, seed=1, **kw))
+
+
+def _route_to(monkeypatch, module, app):
+    monkeypatch.setattr(
+        module.httpx, "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.ASGITransport(app=app)),
+    )
+
+
+def test_generate_returns_canned_recipe_for_prompt():
+    c = TestClient(_app())
+    prompt = "...\nIngredientes del usuario: pollo, arroz\nRaciones deseadas: 3"
+    data = c.post("/api/generate", json={"model": "m", "prompt": prompt, "stream": False}).json()
+    recipe = json.loads(data["response"])
+    assert recipe["portions"] == 3
+    assert "pollo" in recipe["title"].lower()
+    assert data["eval_count"] > 0
+
+
+def test_batch_extraction_prompt_gets_arrays_by_index():
+    from api.prompt_registry import prompt_registry
+    from tools.llm_standin import canned_response
+
+    recipes = [{"index": i, "steps": [{"ingredients": [name]}]} for i, name in enumerate(["arroz", "pollo"])]
+    prompt = prompt_registry.render("ingredients.extract_batch.txt", recipes_json=json.dumps(recipes))
+    out = canned_response(prompt, StandinConfig())
+    assert [item["name"] for item in out["0"]] == ["arroz"]
+    assert [item["name"] for item in out["1"]] == ["pollo"]
+
+
+def test_error_rate_and_embeddings():
+    c = TestClient(_app(error_rate=1.0, error_status=429))
+    assert c.post("/api/generate", json={"prompt": "x"}).status_code == 429
+    ok = TestClient(_app())
+    embs = ok.post("/api/embed", json={"model": "standin-embed", "input": ["a b", "a b"]}).json()["embeddings"]
+    assert len(embs[0]) == 16 and embs[0] == embs[1]
+
+
+def test_stream_json_against_standin(monkeypatch):
+    _route_to(monkeypatch, llm, _app())
+    text = asyncio.run(llm.stream_json("Ingredientes del usuario: tofu\nRaciones deseadas: 2", model="m"))
+    assert json.loads(text)["portions"] == 2
+
+
+def test_retrieval_with_embedded_qdrant(monkeypatch):
+    monkeypatch.setattr(vectorstore.settings, "vector_dims", "standin-embed:16")
+    monkeypatch.setattr(vectorstore.settings, "qdrant_location", ":memory:")
+    monkeypatch.setattr(vectorstore, "_qc", None)
+    _route_to(monkeypatch, embeddings, _app())
+
+    async def scenario():
+        await vectorstore.ensure_collection()
+        texts = ["pollo al horno con patatas", "ensalada de garbanzos"]
+        await vectorstore.upsert_documents(texts, [{}, {}], await embeddings.embed_dual(texts))
+        return await rag.retrieve("pollo al horno", top_k=1)
+
+    hits = asyncio.run(scenario())
+    assert hits[0]["payload"]["text"] == "pollo al horno con patatas"
@@ -36,3 +36,17 @@ def test_rate_limit_middleware(client):
     assert client.post("/auth/login", json=payload).status_code == 200
     assert client.post("/auth/login", json=payload).status_code == 429
 
+
+
+def test_server_timing_header(client):
+    """Toda respuesta lleva Server-Timing con, al menos, el total."""
+    resp = client.get("/health")
+    assert resp.status_code == 200
+    assert "total;dur=" in resp.headers.get("Server-Timing", "")
+
+
+def test_server_timing_groups_repeated_stages():
+    from api.metrics import format_server_timing
+
+    header = format_server_timing([("embed", 0.010), ("llm", 0.5), ("llm", 0.25)], total_s=1.0)
+    assert header == 'embed;dur=10.0, llm;dur=750.0;desc="x2", total;dur=1000.0'
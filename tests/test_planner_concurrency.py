@@ -0,0 +1,65 @@
+import asyncio
+import time
+from datetime import date
+
+import api.routes.planner as planner
+
+
+def test_days_run_concurrently_keep_order_and_fall_back_per_day(monkeypatch):
+    running = {"now": 0, "max": 0}
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        if ingredients[0] == "salmón":
+            raise RuntimeError("LLM caído")
+        return planner.RecipeNeutral(title=f"Receta de {ingredients[0]}", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(planner, "_generate_recipe_neutral", fake_generate)
+    monkeypatch.setattr(planner.settings, "planner_day_concurrency", 3)
+    req = planner.WeekGenRequest(start=date(2025, 8, 25), persist=False)
+
+    t0 = time.perf_counter()
+    out = asyncio.run(planner._generate_week(req, session=None, user_id="u1"))
+    elapsed = time.perf_counter() - t0
+
+    assert running["max"] == 3
+    assert elapsed < 7 * 0.05
+    assert [o.plan_date.day for o in out] == list(range(25, 32))
+    seeds = planner._seed_pool([], False)
+    assert out[0].title == f"Receta de {seeds[0][0]}"
+    assert out[4].title == "Receta generada"  # día de salmón → fallback
+
+
+def test_one_shot_week_dedups_context_and_regenerates_only_invalid_days(monkeypatch):
+    prompts = []
+    regenerated = []
+
+    async def fake_retrieve(query, top_k=5):
+        return [{"id": "shared", "score": 0.9, "payload": {"title": "Guía horno", "text": "Horno a 200 ºC."}}]
+
+    async def fake_llm(prompt, validate=None):
+        prompts.append(prompt)
+        week = [{"day": d, "title": f"Día {d}", "portions": 2, "steps_generic": []} for d in range(1, 8)]
+        week[2] = {"day": 3, "title": "Roto", "steps_generic": "no es una lista"}
+        del week[5]  # el día 6 no viene
+        return planner.json.dumps(week)
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        regenerated.append(ingredients)
+        return planner.RecipeNeutral(title="Regenerada", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(planner, "retrieve", fake_retrieve)
+    monkeypatch.setattr(planner, "call_llm", fake_llm)
+    monkeypatch.setattr(planner, "_generate_recipe_neutral", fake_generate)
+    req = planner.WeekGenRequest(start=date(2025, 8, 25), persist=False, strategy="one_shot")
+
+    out = asyncio.run(planner._generate_week(req, session=None, user_id="u1"))
+
+    assert len(prompts) == 1
+    assert prompts[0].count("Horno a 200 ºC.") == 1
+    seeds = planner._seed_pool([], False)
+    assert regenerated == [seeds[2], seeds[5]]
+    assert [o.title for o in out] == ["Día 1", "Día 2", "Regenerada", "Día 4", "Día 5", "Regenerada", "Día 7"]
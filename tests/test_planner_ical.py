@@ -0,0 +1,48 @@
+import asyncio
+from datetime import date
+
+import api.routes.planner as planner
+from api.utils.ical import escape_text, fold_line
+
+
+def _body(resp) -> str:
+    async def collect():
+        return "".join([c if isinstance(c, str) else c.decode() async for c in resp.body_iterator])
+    return asyncio.run(collect())
+
+
+def _add(session, day, title):
+    recipe = planner.RecipeNeutral(title=title, portions=2, steps_generic=[])
+    planner.upsert_plan_entries(session, "u1", [(day, "dinner", recipe)], 2, [])
+    session.commit()
+
+
+def test_fold_and_escape():
+    line = "SUMMARY:" + escape_text("Cena: tortilla, patatas; cebolla\nal gusto ") + "ñ" * 60
+    folded = fold_line(line)
+    parts = folded.split("\r\n")[:-1]
+    assert all(len(p.encode("utf-8")) <= 75 for p in parts)
+    assert "".join(p[1:] if i else p for i, p in enumerate(parts)) == line
+    assert r"\, patatas\; cebolla\nal" in line
+
+
+def test_week_ics_streams_events_and_honours_etag(session):
+    _add(session, date(2025, 8, 25), "Pollo al horno")
+    _add(session, date(2025, 8, 26), "Lentejas, estofadas")
+
+    resp = planner.export_week_ics(start=date(2025, 8, 27), if_none_match=None, session=session, user_id="u1")
+    body = _body(resp)
+    assert resp.headers["content-type"].startswith("text/calendar")
+    assert body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n")
+    assert body.count("BEGIN:VEVENT") == 2
+    assert "DTSTART:20250825T210000" in body
+    assert "SUMMARY:Cena: Lentejas\\, estofadas" in body
+
+    etag = resp.headers["etag"]
+    again = planner.export_week_ics(start=date(2025, 8, 25), if_none_match=etag, session=session, user_id="u1")
+    assert again.status_code == 304
+
+    _add(session, date(2025, 8, 26), "Garbanzos")  # modifica la semana → nuevo ETag
+    changed = planner.export_week_ics(start=date(2025, 8, 25), if_none_match=etag, session=session, user_id="u1")
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
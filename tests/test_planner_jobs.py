@@ -0,0 +1,135 @@
+import asyncio
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from sqlmodel import Session, select
+
+import api.routes.planner_jobs as jobs
+from api.models_db import PlanEntry, PlannerJob
+from api.schemas import RecipeNeutral
+
+
+def _make_job(engine, days=None):
+    req = jobs.WeekGenRequest(start=date(2025, 8, 27), portions=2)
+    job = PlannerJob(user_id="u1", week_start=date(2025, 8, 25), params=req.model_dump(mode="json"), days=days or [])
+    with Session(engine, expire_on_commit=False) as s:
+        s.add(job)
+        s.commit()
+    return job.id
+
+
+def test_job_streams_each_day_and_persists_entries(engine, monkeypatch):
+    calls = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        calls.append(ingredients)
+        await asyncio.sleep(0.01 * len(calls))
+        return RecipeNeutral(title=f"Receta {len(calls)}", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(jobs, "_generate_recipe_neutral", fake_generate)
+    job_id = _make_job(engine)
+
+    async def scenario():
+        consumer = asyncio.create_task(_collect(jobs.job_events(job_id, "ndjson")))
+        await jobs.run_job(job_id)
+        return await consumer
+
+    events = [json.loads(line) for line in asyncio.run(scenario())]
+    assert [e["event"] for e in events] == ["day"] * 7 + ["done"]
+    assert sorted(e["index"] for e in events[:-1]) == list(range(7))
+    with Session(engine) as s:
+        assert len(s.exec(select(PlanEntry).where(PlanEntry.user_id == "u1")).all()) == 7
+        assert s.get(PlannerJob, job_id).status == "done"
+
+
+def test_resumed_job_only_generates_missing_days(engine, monkeypatch):
+    calls = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        calls.append(ingredients)
+        return RecipeNeutral(title="Nueva", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(jobs, "_generate_recipe_neutral", fake_generate)
+    done = [{"index": i, "plan_date": f"2025-08-{25 + i}", "entry_id": f"e{i}", "title": "Vieja", "recipe": {}}
+            for i in range(5)]
+    job_id = _make_job(engine, days=done)
+
+    asyncio.run(jobs.run_job(job_id))
+
+    assert len(calls) == 2
+    with Session(engine) as s:
+        job = s.get(PlannerJob, job_id)
+        assert job.status == "done"
+        assert sorted(d["index"] for d in job.days) == list(range(7))
+
+
+def test_job_runs_once_when_two_workers_pick_it_up(engine, monkeypatch):
+    calls = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        calls.append(ingredients)
+        await asyncio.sleep(0.01)
+        return RecipeNeutral(title="Receta", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(jobs, "_generate_recipe_neutral", fake_generate)
+    job_id = _make_job(engine)
+
+    async def two_workers():
+        await asyncio.gather(jobs.run_job(job_id), jobs.run_job(job_id))
+
+    asyncio.run(two_workers())
+    assert len(calls) == 7
+    with Session(engine) as s:
+        job = s.get(PlannerJob, job_id)
+        assert job.status == "done" and sorted(d["index"] for d in job.days) == list(range(7))
+
+
+def test_running_job_is_reclaimed_only_after_its_lease_expires(engine, monkeypatch):
+    calls = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        calls.append(ingredients)
+        return RecipeNeutral(title="Receta", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(jobs, "_generate_recipe_neutral", fake_generate)
+    job_id = _make_job(engine)
+    with Session(engine) as s:
+        job = s.get(PlannerJob, job_id)
+        job.status, job.owner = "running", "otro-worker"
+        job.lease_until = datetime.now(timezone.utc) + timedelta(minutes=1)
+        s.add(job)
+        s.commit()
+
+    asyncio.run(jobs.run_job(job_id))  # lo lleva otro worker vivo
+    assert calls == []
+
+    with Session(engine) as s:
+        job = s.get(PlannerJob, job_id)
+        job.lease_until = datetime.now(timezone.utc) - timedelta(seconds=1)
+        s.add(job)
+        s.commit()
+    asyncio.run(jobs.run_job(job_id))
+    assert len(calls) == 7
+    with Session(engine) as s:
+        job = s.get(PlannerJob, job_id)
+        assert (job.status, job.owner) == ("done", jobs.WORKER_ID)
+
+
+def test_persisting_a_day_is_idempotent_per_index(engine):
+    job_id = _make_job(engine)
+    req = jobs.WeekGenRequest(start=date(2025, 8, 27), portions=2)
+    for title in ("Primera", "Segunda"):
+        recipe = RecipeNeutral(title=title, portions=2, steps_generic=[])
+        jobs._persist_day(job_id, req, "u1", 2, date(2025, 8, 27), recipe)
+    with Session(engine) as s:
+        assert [d["title"] for d in s.get(PlannerJob, job_id).days] == ["Primera"]
+        assert [e.title for e in s.exec(select(PlanEntry)).all()] == ["Primera"]
+
+
+def test_sse_format():
+    out = jobs._format_event("sse", "day", {"index": 1})
+    assert out == 'event: day\ndata: {"index": 1}\n\n'
+
+
+async def _collect(agen):
+    return [chunk async for chunk in agen]
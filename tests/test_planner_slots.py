@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine, select
+
+import api.routes.planner as planner
+from api.models_db import PlanEntry
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        seen.append(list(ingredients))
+        return planner.RecipeNeutral(title=f"Receta de {ingredients[0]}", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(planner, "_generate_recipe_neutral", fake_generate)
+    return seen
+
+
+def test_regenerate_one_entry_calls_llm_once_and_changes_dish(session, calls):
+    monday = date(2025, 8, 25)
+    req = planner.PlanExtendRequest(start=monday, meals=["dinner"])
+    asyncio.run(planner.extend_plan(req, session=session, user_id="u1"))
+    assert len(calls) == 7
+    calls.clear()
+
+    out = asyncio.run(planner.regenerate_entry(
+        planner.SlotRegenRequest(plan_date=monday, meal="dinner"), session=session, user_id="u1"
+    ))
+
+    assert len(calls) == 1
+    assert out.title != "Receta de pollo"  # se salta la semilla del plato actual
+    rows = session.exec(select(PlanEntry).where(PlanEntry.plan_date == monday)).all()
+    assert [r.title for r in rows] == [out.title]
+
+
+def test_extend_only_generates_missing_slots(session, calls):
+    monday = date(2025, 8, 25)
+    asyncio.run(planner.extend_plan(planner.PlanExtendRequest(start=monday), session=session, user_id="u1"))
+    calls.clear()
+
+    req = planner.PlanExtendRequest(start=date(2025, 8, 27), weeks=2, meals=["lunch", "dinner"])
+    out = asyncio.run(planner.extend_plan(req, session=session, user_id="u1"))
+
+    assert out.existing == 7
+    assert len(out.created) == len(calls) == 2 * 14 - 7
+    slots = [(e.plan_date, e.meal) for e in session.exec(select(PlanEntry)).all()]
+    assert len(slots) == len(set(slots)) == 28  # sin huecos duplicados
+    # La comida de un día no repite la semilla de la cena de ese mismo día
+    lunch = planner._slot_seed([], monday, "lunch")
+    assert lunch != planner._slot_seed([], monday, "dinner")
+
+
+def test_generate_week_twice_replaces_entries(session, calls):
+    req = planner.WeekGenRequest(start=date(2025, 8, 25))
+    first = asyncio.run(planner._generate_week(req, session=session, user_id="u1"))
+    second = asyncio.run(planner._generate_week(req, session=session, user_id="u1"))
+
+    assert len(session.exec(select(PlanEntry)).all()) == 7
+    assert [o.id for o in second] == [o.id for o in first]  # mismo hueco, misma entrada
+
+
+def test_migration_dedups_plan_entries(monkeypatch):
+    from sqlalchemy import text
+    import api.db as db
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        # Tabla de una versión anterior: sin índice único ni updated_at
+        conn.execute(text(
+            "CREATE TABLE planentry (id TEXT PRIMARY KEY, user_id TEXT, plan_date DATE, meal TEXT, "
+            "title TEXT, portions INTEGER, recipe JSON, appliances JSON, created_at DATETIME)"
+        ))
+        for i, title in enumerate(["vieja", "nueva", "otra"]):
+            day = "2025-08-26" if title == "otra" else "2025-08-25"
+            conn.execute(text(
+                f"INSERT INTO planentry VALUES ('e{i}', 'u1', '{day}', 'dinner', '{title}', 2, NULL, NULL, NULL)"
+            ))
+    monkeypatch.setattr(db, "engine", engine)
+
+    db.migrate_plan_entries()
+
+    with engine.connect() as conn:
+        titles = sorted(r[0] for r in conn.execute(text("SELECT title FROM planentry")))
+        indexes = {r[1] for r in conn.execute(text("PRAGMA index_list('planentry')"))}
+    assert titles == ["nueva", "otra"]
+    assert "ux_planentry_user_date_meal" in indexes
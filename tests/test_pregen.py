@@ -0,0 +1,93 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from sqlmodel import Session, select
+
+import api.routes.planner as planner
+import api.services.pregen as pregen_mod
+from api.llm_scheduler import charge_tokens, current_llm_context
+from api.models_db import PlanEntry, WorkerLease
+
+NOW = datetime(2025, 8, 27, 3, 0, tzinfo=timezone.utc)  # miércoles → semana siguiente: 1 de septiembre
+
+
+def _seed_activity(engine, user_id, day):
+    recipe = planner.RecipeNeutral(title="Algo", portions=3, steps_generic=[])
+    with Session(engine) as s:
+        planner.upsert_plan_entries(s, user_id, [(day, "dinner", recipe)], 3, ["horno"])
+        s.commit()
+
+
+def test_window_wraps_midnight():
+    assert pregen_mod.in_window(datetime(2025, 1, 1, 23, 30), "23:00-05:00")
+    assert pregen_mod.in_window(datetime(2025, 1, 1, 4, 59), "23:00-05:00")
+    assert not pregen_mod.in_window(datetime(2025, 1, 1, 12, 0), "23:00-05:00")
+
+
+def test_pregenerates_next_week_in_background_within_budget(engine, monkeypatch):
+    seen = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        ctx = current_llm_context()
+        seen.append((ctx.priority, ctx.user_id, portions, appliances))
+        charge_tokens(100)
+        return planner.RecipeNeutral(title=f"Receta de {ingredients[0]}", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(planner, "_generate_recipe_neutral", fake_generate)
+    # 7 días x 100 tokens por semana: caben dos usuarios, no tres
+    monkeypatch.setattr(pregen_mod.settings, "pregen_token_budget", 1500)
+    for user_id in ("a", "b", "c"):
+        _seed_activity(engine, user_id, date(2025, 8, 26))
+    _seed_activity(engine, "d", date(2025, 9, 2))  # ya tiene la semana siguiente
+
+    stats = asyncio.run(pregen_mod.pregen.run_once(NOW))
+
+    assert stats["generated"] == 2 and stats["skipped"] == 1 and stats["budget"] == 1
+    assert {p for p, *_ in seen} == {"background"}
+    assert seen[0][2:] == (3, ["horno"])  # reutiliza raciones y electrodomésticos del usuario
+    with Session(engine) as s:
+        next_week = s.exec(select(PlanEntry).where(PlanEntry.plan_date >= date(2025, 9, 1))).all()
+    assert len(next_week) == 2 * 7 + 1
+
+
+def test_week_with_fallback_days_is_not_persisted(engine, monkeypatch):
+    calls = []
+
+    async def flaky_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        calls.append(ingredients)
+        if len(calls) == 3:
+            raise RuntimeError("modelo caído")
+        return planner.RecipeNeutral(title=f"Receta de {ingredients[0]}", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(planner, "_generate_recipe_neutral", flaky_generate)
+    monkeypatch.setattr(pregen_mod.settings, "planner_week_strategy", "per_day")
+    _seed_activity(engine, "a", date(2025, 8, 26))
+
+    stats = asyncio.run(pregen_mod.pregen.run_once(NOW))
+
+    assert stats["error"] == 1 and stats["generated"] == 0
+    with Session(engine) as s:
+        assert not pregen_mod.has_plan(s, "a", date(2025, 9, 1))  # la siguiente pasada la reintenta
+
+
+def test_only_the_worker_holding_the_nightly_lease_generates(engine, monkeypatch):
+    calls = []
+
+    async def fake_generate(ingredients, portions, appliances, dietary, top_k=5, mode="hybrid"):
+        calls.append(ingredients)
+        return planner.RecipeNeutral(title="Receta", portions=portions, steps_generic=[])
+
+    monkeypatch.setattr(planner, "_generate_recipe_neutral", fake_generate)
+    _seed_activity(engine, "a", date(2025, 8, 26))
+    with Session(engine) as s:
+        s.add(WorkerLease(name=f"pregen:{NOW.date()}", owner="otro-worker", expires_at=NOW + timedelta(hours=1)))
+        s.commit()
+
+    stats = asyncio.run(pregen_mod.pregen.run_once(NOW))
+
+    assert stats["generated"] == 0 and calls == []
+    # Caducada la lease (el otro worker murió), la noche se puede retomar
+    with Session(engine) as s:
+        s.get(WorkerLease, f"pregen:{NOW.date()}").expires_at = NOW - timedelta(seconds=1)
+        s.commit()
+    assert asyncio.run(pregen_mod.pregen.run_once(NOW))["generated"] == 1
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from api.prompt_registry import PromptRegistry, PromptTemplate, prompt_registry
+
+
+def test_render_matches_str_format():
+    text = 'Esquema: {{"a": 1}}\nRaciones: {portions}\n{context}'
+    tpl = PromptTemplate.compile("t", text)
+    assert tpl.render(portions=2, context="ctx") == text.format(portions=2, context="ctx")
+    assert tpl.fields == ["portions", "context"]
+    with pytest.raises(KeyError):
+        tpl.render(portions=2)
+
+
+def test_hot_reload_on_mtime_change(tmp_path):
+    f = tmp_path / "p.txt"
+    f.write_text("v1 {x}", encoding="utf-8")
+    reg = PromptRegistry(directory=tmp_path, reload_interval_s=0)
+    first = reg.get("p.txt")
+    assert reg.get("p.txt") is first  # sin cambios: misma plantilla compilada
+
+    f.write_text("v2 {x}", encoding="utf-8")
+    st = os.stat(f)
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    second = reg.get("p.txt")
+    assert second.render(x=1) == "v2 1"
+    assert second.version != first.version
+
+
+def test_recipe_templates_keep_static_text_first():
+    for mode in ("strict", "hybrid", "creative"):
+        tpl = prompt_registry.get(f"recipes.generate.{mode}.txt")
+        # Todo lo fijo (esquema, reglas, modo y tarea) va antes del primer campo
+        assert "TAREA:" in tpl.static_prefix
+        assert set(tpl.fields) == {"appliances_allowed", "portions", "user_requirements", "context"}
@@ -0,0 +1,89 @@
+import asyncio
+import functools
+
+import httpx
+
+import api.embeddings as embeddings
+import api.vectorstore as vectorstore
+from api.services.seed_retrieval import SeedRetrieval
+from tools.llm_standin import StandinConfig, create_app
+
+
+def test_seed_hits_are_served_from_memory_until_collection_changes(monkeypatch):
+    monkeypatch.setattr(vectorstore.settings, "vector_dims", "standin-embed:16")
+    monkeypatch.setattr(vectorstore.settings, "qdrant_location", ":memory:")
+    monkeypatch.setattr(vectorstore, "_qc", None)
+    app = create_app(StandinConfig(latency_ms=0, token_ms=0, embed_latency_ms=0, dims={"standin-embed": 16}))
+    monkeypatch.setattr(
+        embeddings.httpx, "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.ASGITransport(app=app)),
+    )
+    embed_calls = []
+    real_embed = embeddings._post_embeddings_batch
+
+    async def counting(model, inputs):
+        embed_calls.append(len(inputs))
+        return await real_embed(model, inputs)
+
+    monkeypatch.setattr(embeddings, "_post_embeddings_batch", counting)
+    seed = ["pollo", "pimientos", "arroz"]
+    sr = SeedRetrieval()
+
+    async def scenario():
+        await vectorstore.ensure_collection()
+        texts = ["arroz con pollo y pimientos", "crema de calabaza"]
+        await vectorstore.upsert_documents(texts, [{}, {}], await embeddings.embed_dual(texts))
+        await sr.warm([seed, ["tofu", "brócoli", "soja"]])
+        calls_after_warm = len(embed_calls)
+
+        first = await sr.lookup(seed, top_k=1)
+        assert len(embed_calls) == calls_after_warm  # sin embeddings en la consulta
+
+        await vectorstore.upsert_documents(["pollo al curry"], [{}], await embeddings.embed_dual(["pollo al curry"]))
+        stale = await sr.lookup(seed, top_k=1)
+        await sr._task
+        fresh = await sr.lookup(seed, top_k=3)
+        return first, stale, fresh
+
+    first, stale, fresh = asyncio.run(scenario())
+    assert first[0]["payload"]["text"] == "arroz con pollo y pimientos"
+    assert stale is None
+    assert len(fresh) == 3
+    assert embed_calls[1] == 2  # las dos semillas se embeben en un solo lote
+
+
+def test_failed_warm_is_retried_on_a_later_lookup(monkeypatch):
+    import api.services.seed_retrieval as sr_mod
+
+    up = {"qdrant": False}
+    hits = [{"id": 1, "score": 0.9, "payload": {"text": "arroz con pollo"}}]
+
+    async def stamp():
+        if not up["qdrant"]:
+            raise ConnectionError("qdrant caído")
+        return (0, 1)
+
+    async def fake_embed(queries):
+        return {"dense": [[0.1]] * len(queries)}
+
+    async def fake_search(qvecs, top_k):
+        return hits
+
+    monkeypatch.setattr(sr_mod, "collection_stamp", stamp)
+    monkeypatch.setattr(sr_mod, "collection_version", lambda: 0)
+    monkeypatch.setattr(sr_mod, "embed_dual", fake_embed)
+    monkeypatch.setattr(sr_mod, "query_vectors", lambda emb, i: [emb["dense"][i]])
+    monkeypatch.setattr(sr_mod, "search", fake_search)
+    monkeypatch.setattr(sr_mod.settings, "seed_retrieval_check_s", 0.0)
+    seed = ["pollo", "pimientos", "arroz"]
+    sr = SeedRetrieval()
+
+    async def scenario():
+        await sr.schedule_warm([seed])  # arranque con Qdrant caído: nada en memoria
+        assert sr.warm_seeds == 0
+        up["qdrant"] = True
+        assert await sr.lookup(seed) is None  # fallo → recalienta en segundo plano
+        await sr._task
+        return await sr.lookup(seed)
+
+    assert asyncio.run(scenario()) == hits
@@ -0,0 +1,69 @@
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine, select
+
+import api.routes.shopping as shopping
+from api.models_db import ShoppingItem
+from api.schemas import AggregatedItem
+
+
+def test_bulk_upsert_merges_quantities_in_one_statement(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    with Session(engine, expire_on_commit=False) as s:  # como get_session
+        shopping.add_items_detailed(
+            items=[AggregatedItem(name="Leche", qty=1, unit="l"), AggregatedItem(name="sal")],
+            session=s, user_id="u1",
+        )
+        statements.clear()
+        out = shopping.add_items_detailed(
+            items=[
+                AggregatedItem(name="leche", qty=0.5, unit="l", category="lácteos"),
+                AggregatedItem(name="leche", qty=200, unit="ml"),
+                AggregatedItem(name=" Sal ", qty=None),
+                AggregatedItem(name="tomate", qty=2, unit="ud"),
+                AggregatedItem(name="tomate", qty=1, unit="ud"),
+            ],
+            session=s, user_id="u1",
+        )
+
+    assert len([q for q in statements if q.lstrip().upper().startswith("INSERT INTO SHOPPINGITEM")]) == 1
+    assert len(statements) == 2  # + el avance de la secuencia de cambios (rev)
+    assert [(i.name, i.qty, i.unit) for i in out] == [
+        ("leche", 1.5, "l"), ("leche", 200, "ml"), ("sal", None, None), ("tomate", 3, "ud"),
+    ]
+    assert out[0].category == "lácteos"
+    with Session(engine) as s:
+        assert len(s.exec(select(ShoppingItem)).all()) == 4
+
+
+def test_add_items_by_name_keeps_existing(engine):
+    with Session(engine, expire_on_commit=False) as s:
+        first = shopping.add_items(items=["Pan"], session=s, user_id="u1")
+        again = shopping.add_items(items=["pan", "pan "], session=s, user_id="u1")
+        assert [i.id for i in again] == [first[0].id]
+
+
+def test_migration_merges_duplicate_items(monkeypatch):
+    from sqlalchemy import text
+    import api.db as db
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE shoppingitem (id TEXT PRIMARY KEY, user_id TEXT, name TEXT, qty REAL, unit TEXT, "
+            "category TEXT, checked BOOLEAN, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO shoppingitem VALUES ('a', 'u1', 'arroz', 200, 'g', NULL, 0, NULL), "
+            "('b', 'u1', 'arroz', 300, 'g', NULL, 0, NULL), ('c', 'u1', 'arroz', 1, 'kg', NULL, 0, NULL), "
+            "('d', 'u1', 'sal', NULL, NULL, NULL, 0, NULL), ('e', 'u1', 'sal', NULL, NULL, NULL, 0, NULL)"
+        ))
+    monkeypatch.setattr(db, "engine", engine)
+
+    db.migrate_shopping_items()
+
+    with engine.connect() as conn:
+        rows = sorted(tuple(r) for r in conn.execute(text("SELECT name, qty, unit FROM shoppingitem")))
+    assert rows == [("arroz", 1.0, "kg"), ("arroz", 500.0, "g"), ("sal", None, None)]
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+import api.routes.shopping as shopping
+from api.models_db import ShoppingItem
+
+
+def _changes(session, since=None, limit=500):
+    return shopping.list_changes(since=since, limit=limit, session=session, user_id="u1")
+
+
+def _add(session, *names):
+    return shopping.add_items(items=list(names), session=session, user_id="u1")
+
+
+def test_delta_feed_returns_only_changes_and_tombstones(session):
+    leche, pan, huevos = _add(session, "leche", "pan", "huevos")
+    full = _changes(session)
+    assert {i.name for i in full.items} == {"leche", "pan", "huevos"} and not full.deleted
+
+    assert _changes(session, full.cursor).items == []  # nada nuevo
+    shopping.update_item(item_id=pan.id, patch={"checked": True}, session=session, user_id="u1")
+    shopping.delete_item(item_id=huevos.id, session=session, user_id="u1")
+    _add(session, "tomate")
+
+    delta = _changes(session, full.cursor)
+    assert [(i.name, i.checked) for i in delta.items] == [("pan", True), ("tomate", False)]
+    assert delta.deleted == [huevos.id]
+    listed = shopping.list_items(response=shopping.Response(), limit=10, cursor=None, offset=0, format="json",
+                                 session=session, user_id="u1")
+    assert {i.name for i in listed} == {"leche", "pan", "tomate"}  # el listado no incluye tombstones
+    with pytest.raises(HTTPException):
+        shopping.delete_item(item_id=huevos.id, session=session, user_id="u1")
+
+    # Re-añadir un borrado lo revive (nueva cantidad) y aparece como cambio
+    _add(session, "huevos")
+    again = _changes(session, delta.cursor)
+    assert [i.id for i in again.items] == [huevos.id] and again.deleted == []
+
+
+def test_paging_and_clear(session):
+    _add(session, *[f"item {i}" for i in range(5)])
+    first = _changes(session, limit=3)
+    rest = _changes(session, first.cursor, limit=3)
+    assert first.has_more and not rest.has_more
+    assert len(first.items) + len(rest.items) == 5
+
+    cleared = shopping.clear_items(session=session, user_id="u1")
+    assert cleared["deleted"] == 5
+    assert len(_changes(session, rest.cursor).deleted) == 5
+
+
+def test_old_cursor_gets_reset_after_tombstone_purge(session):
+    a, b = _add(session, "a", "b")
+    cursor = _changes(session).cursor
+    shopping.delete_item(item_id=a.id, session=session, user_id="u1")
+    # El tombstone caduca y se purga en el siguiente borrado
+    row = session.get(ShoppingItem, a.id)
+    row.deleted_at = datetime.now(timezone.utc) - timedelta(days=60)
+    session.add(row); session.commit()
+    shopping.delete_item(item_id=b.id, session=session, user_id="u1")
+    assert session.exec(select(ShoppingItem).where(ShoppingItem.id == a.id)).first() is None
+
+    stale = _changes(session, cursor)
+    assert stale.reset and stale.items == [] and stale.deleted == []
+
+
+def test_rename_onto_tombstone_or_live_item(session):
+    leche, pan = _add(session, "leche", "pan")
+    shopping.delete_item(item_id=leche.id, session=session, user_id="u1")
+    cursor = _changes(session).cursor
+
+    # Sobre un tombstone: se borra en la misma transacción y el renombrado sale
+    out = shopping.update_item(item_id=pan.id, patch={"name": " Leche "}, session=session, user_id="u1")
+    assert out.name == "leche"
+    assert session.exec(select(ShoppingItem.id)).all() == [pan.id]
+    assert _changes(session, cursor).reset  # el tombstone ya no está en el feed
+
+    # Sobre un item vivo: 409 y nada cambia
+    (huevos,) = _add(session, "huevos")
+    with pytest.raises(HTTPException) as exc:
+        shopping.update_item(item_id=huevos.id, patch={"name": "leche"}, session=session, user_id="u1")
+    assert exc.value.status_code == 409
+    session.rollback()
+    assert session.get(ShoppingItem, huevos.id).name == "huevos"
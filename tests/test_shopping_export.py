@@ -0,0 +1,73 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+import api.routes.shopping as shopping
+import api.utils.tabular as tabular
+from api.models_db import ShoppingItem
+
+
+@pytest.fixture(autouse=True)
+def rows(engine):
+    now = datetime.now(timezone.utc)
+    with Session(engine) as s:
+        s.add_all([
+            ShoppingItem(user_id="u1", name=f"item {i:03d}", qty=i or None, unit="g", category="otros", created_at=now)
+            for i in range(450)
+        ])
+        s.add(ShoppingItem(user_id="u2", name="ajeno", created_at=now))
+        s.commit()
+
+
+def _chunks(resp):
+    async def collect():
+        return [c.encode() if isinstance(c, str) else c async for c in resp.body_iterator]
+    return asyncio.run(collect())
+
+
+def test_csv_streams_in_chunks():
+    resp = shopping.export_csv(accept_encoding=None, user_id="u1")
+    chunks = _chunks(resp)
+    assert len(chunks) > 1  # no se acumula todo en un buffer
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0] == shopping.EXPORT_COLUMNS
+    assert len(rows) == 451
+    assert rows[1][:5] == ["item 000", "", "g", "otros", "0"]
+
+
+def test_ndjson_gzip_when_accepted():
+    resp = shopping.export_items(format="ndjson", accept_encoding="br, gzip;q=0.8", user_id="u1")
+    assert resp.headers["content-encoding"] == "gzip"
+    lines = gzip.decompress(b"".join(_chunks(resp))).decode().splitlines()
+    assert len(lines) == 450
+    first = json.loads(lines[1])
+    assert first["name"] == "item 001" and first["qty"] == 1.0 and first["checked"] is False
+
+
+def test_xlsx_optional_dependency(monkeypatch):
+    monkeypatch.setattr(tabular, "Workbook", None)
+    with pytest.raises(HTTPException) as exc:
+        shopping.export_items(format="xlsx", accept_encoding="gzip", user_id="u1")
+    assert exc.value.status_code == 501
+
+
+def test_accepts_gzip():
+    assert tabular.accepts_gzip("gzip, deflate")
+    assert not tabular.accepts_gzip("gzip;q=0, br")
+    assert not tabular.accepts_gzip(None)
+
+
+def test_xlsx_export():
+    openpyxl = pytest.importorskip("openpyxl")
+    resp = shopping.export_items(format="xlsx", accept_encoding="gzip", user_id="u1")
+    assert "content-encoding" not in resp.headers
+    wb = openpyxl.load_workbook(io.BytesIO(b"".join(_chunks(resp))), read_only=True)
+    rows = list(wb.active.iter_rows(values_only=True))
+    assert list(rows[0]) == shopping.EXPORT_COLUMNS and len(rows) == 451
@@ -0,0 +1,67 @@
+import re
+from pathlib import Path
+
+from api.services.quantify import _aggregate_items
+from api.services.units import FACTORS, UNIT_WEIGHTS, canonical_unit, grams, merge_quantities, to_base
+
+KNOWLEDGE = Path(__file__).resolve().parents[1] / "data" / "knowledge" / "conversions_es.md"
+
+
+def test_tables_match_knowledge_base():
+    text = KNOWLEDGE.read_text(encoding="utf-8")
+    for unit, ml in re.findall(r"- 1 (\w+) = (\d+) ml", text):
+        assert FACTORS[canonical_unit(unit)] == ("volume", float(ml))
+    lo, hi = re.search(r"diente de ajo ≈ (\d+)–(\d+) g", text).groups()
+    assert UNIT_WEIGHTS["ajo"]["diente"] == (int(lo) + int(hi)) / 2
+    assert UNIT_WEIGHTS["cebolla"]["ud"] == float(re.search(r"cebolla mediana ≈ (\d+) g", text).group(1))
+
+
+def test_aliases_and_base_units():
+    assert canonical_unit(" Gramos ") == "g"
+    assert canonical_unit("cucharadas") == "cda"
+    assert canonical_unit("manojo") == "manojo"
+    assert to_base(0.2, "kg") == (200.0, "g")
+    assert to_base(2, "tazas") == (480.0, "ml")
+    assert to_base(1, "pizca") == (1, "pizca")
+    assert grams("aceite de oliva", 100, "ml") == 92.0
+    assert grams("perejil", 1, "cda") is None
+
+
+def test_aggregation_canonicalizes_and_merges_dimensions():
+    items = [
+        {"name": "arroz", "qty": 200, "unit": "g"},
+        {"name": "Arroz", "qty": 0.2, "unit": "kg"},
+        {"name": "aceite de oliva", "qty": 1, "unit": "cda"},
+        {"name": "aceite de oliva", "qty": 15, "unit": "ml"},
+        {"name": "ajo", "qty": 2, "unit": "dientes"},
+        {"name": "ajo", "qty": 3, "unit": "g"},
+        {"name": "perejil", "qty": 1, "unit": "cda"},
+        {"name": "perejil", "qty": 1, "unit": "manojo"},
+        {"name": "sal", "qty": None, "unit": None},
+    ]
+    out = {(a.name, a.unit): a.qty for a in _aggregate_items(items)}
+    assert out == {
+        ("arroz", "g"): 400.0,
+        ("aceite de oliva", "ml"): 30.0,
+        ("ajo", "g"): 10.0,
+        ("perejil", "ml"): 15.0,
+        ("perejil", "manojo"): 1.0,
+        ("sal", None): None,
+    }
+
+
+def test_count_units_merge_only_with_known_weights():
+    merged = dict(((n, u), q) for n, q, u in merge_quantities([("cebolla", 1, "ud"), ("cebolla", 2, "unidades")]))
+    assert merged == {("cebolla", "ud"): 3.0}
+    merged = dict(((n, u), q) for n, q, u in merge_quantities([("cebolla", 1, "ud"), ("cebolla", 50, "g")]))
+    assert merged == {("cebolla", "g"): 200.0}
+
+
+def test_ingredient_tables_match_whole_words():
+    assert grams("aceite de oliva", 100, "ml") == 92
+    assert grams("salmón", 100, "ml") is None
+    assert grams("salsa de tomate", 100, "ml") is None
+    assert grams("aguacate", 100, "ml") is None
+    assert merge_quantities([("salmón", 200, "g"), ("salmón", 100, "ml")]) == [
+        ("salmón", 200, "g"), ("salmón", 100, "ml"),
+    ]
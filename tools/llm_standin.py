@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Servidor sustituto (stand-in) del LLM y de los embeddings para pruebas de carga
+offline: implementa los endpoints que usa la API (/api/generate con y sin
+streaming, /api/embed, /api/embeddings y /api/tags) con latencias y errores
+configurables y recetas JSON enlatadas.
+
+Uso típico (ver `make offline` y `make loadtest`):
+    python tools/llm_standin.py --port 11434 --latency-ms 800 --error-rate 0.02
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:11434 QDRANT_LOCATION=:memory: uvicorn api.main:app
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Asegura que el repo raíz está en sys.path aunque no se exporte PYTHONPATH=.
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+@dataclass
+class StandinConfig:
+    latency_ms: float = 800.0          # latencia típica (mediana) de /api/generate
+    latency_dist: str = "lognormal"    # fixed | uniform | lognormal
+    latency_spread: float = 0.5        # sigma (lognormal) o ±fracción (uniform)
+    token_ms: float = 10.0             # retardo entre trozos en streaming
+    embed_latency_ms: float = 30.0
+    error_rate: float = 0.0            # fracción de peticiones que devuelven `error_status`
+    error_status: int = 503
+    hang_rate: float = 0.0             # fracción que se queda colgada `hang_s` (simula timeouts)
+    hang_s: float = 120.0
+    invalid_rate: float = 0.0          # fracción que devuelve texto que no es JSON
+    dims: Dict[str, int] = field(default_factory=dict)  # modelo -> dimensión; vacío = settings.vector_dims
+    recipes: List[Dict[str, Any]] = field(default_factory=list)
+    seed: Optional[int] = None
+
+
+# Recetas enlatadas: el título y los ingredientes se adaptan al prompt
+CANNED_RECIPES: List[Dict[str, Any]] = [
+    {
+        "title": "Salteado de {main}",
+        "steps_generic": [
+            {"action": "prep", "description": "Lavar y cortar los ingredientes en dados.", "ingredients": [],
+             "tools": [], "temperature_c": None, "time_min": 8, "speed": None, "notes": None, "batching": False},
+            {"action": "cook", "description": "Saltear a fuego medio-alto removiendo a menudo.", "ingredients": [],
+             "tools": ["sartén"], "temperature_c": None, "time_min": 12, "speed": None, "notes": None, "batching": False},
+            {"action": "serve", "description": "Rectificar de sal y servir caliente.", "ingredients": [],
+             "tools": [], "temperature_c": None, "time_min": 2, "speed": None, "notes": None, "batching": False},
+        ],
+    },
+    {
+        "title": "{main} al horno con verduras",
+        "steps_generic": [
+            {"action": "prep", "description": "Precalentar el horno y preparar una bandeja.", "ingredients": [],
+             "tools": ["horno"], "temperature_c": 200, "time_min": 10, "speed": None, "notes": None, "batching": False},
+            {"action": "cook", "description": "Hornear hasta que esté dorado.", "ingredients": [],
+             "tools": ["horno"], "temperature_c": 200, "time_min": 25, "speed": None, "notes": None, "batching": True},
+        ],
+    },
+]
+
+_INGREDIENTS_RE = re.compile(r"Ingredientes del usuario:\s*(.+)")
+_PORTIONS_RE = re.compile(r"(?:Raciones deseadas|RACIONES):\s*(\d+)")
+_DAYS_RE = re.compile(r"^(\d)\. (.+)$", re.MULTILINE)
+_JSON_BLOCK_RE = re.compile(r"```json\s*(.+?)\s*```", re.DOTALL)
+
+
+def _rng(cfg: StandinConfig) -> random.Random:
+    return random.Random(cfg.seed)
+
+
+def _latency_s(cfg: StandinConfig, rng: random.Random, base_ms: float) -> float:
+    if base_ms <= 0:
+        return 0.0
+    if cfg.latency_dist == "fixed":
+        ms = base_ms
+    elif cfg.latency_dist == "uniform":
+        ms = rng.uniform(base_ms * (1 - cfg.latency_spread), base_ms * (1 + cfg.latency_spread))
+    else:
+        ms = base_ms * math.exp(rng.gauss(0.0, cfg.latency_spread))
+    return max(0.0, ms) / 1000.0
+
+
+def hash_embedding(text: str, dim: int) -> List[float]:
+    """Vector determinista tipo bag-of-words con hashing: textos parecidos → vectores cercanos."""
+    vec = [0.0] * dim
+    vec[0] = 1.0  # evita el vector nulo (la similitud coseno no lo admite)
+    for tok in re.findall(r"\w+", text.lower()):
+        h = hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest()
+        idx = int.from_bytes(h[:4], "little") % dim
+        vec[idx] += 1.0 if h[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _json_block(prompt: str) -> Any:
+    m = _JSON_BLOCK_RE.search(prompt)
+    try:
+        return json.loads(m.group(1)) if m else None
+    except ValueError:
+        return None
+
+
+def canned_response(prompt: str, cfg: StandinConfig) -> Any:
+    """Elige la respuesta según el tipo de prompt (receta, semana o extracción de ingredientes)."""
+    if "RECIPES_JSON" in prompt:
+        # Extracción por lotes: un array por índice de receta con los ingredientes de sus pasos
+        out: Dict[str, Any] = {}
+        for rec in _json_block(prompt) or []:
+            names = dict.fromkeys(i for st in rec.get("steps", []) for i in st.get("ingredients", []))
+            out[str(rec.get("index"))] = [{"name": n, "qty": 100, "unit": "g"} for n in names] or [
+                {"name": "sal", "qty": None, "unit": None}
+            ]
+        return out
+    m = _INGREDIENTS_RE.search(prompt)
+    ingredients = [x.strip() for x in m.group(1).split(",") if x.strip()] if m else ["verduras"]
+    if "RECIPE_JSON" in prompt:
+        # Extracción de ingredientes para la lista de la compra
+        return [{"name": n, "qty": 100 + 50 * i, "unit": "g"} for i, n in enumerate(ingredients)] or [
+            {"name": "sal", "qty": None, "unit": None}
+        ]
+    m = _PORTIONS_RE.search(prompt)
+    portions = int(m.group(1)) if m else 2
+    days = _DAYS_RE.findall(prompt)
+    if "DÍAS (ingredientes semilla)" in prompt and days:
+        # Plan semanal en un solo prompt: un array con una receta por día
+        week = []
+        for day, seeds in days:
+            recipe = _canned_recipe(prompt + day, [x.strip() for x in seeds.split(",")], portions, cfg)
+            week.append({"day": int(day), **recipe})
+        return week
+    return _canned_recipe(prompt, ingredients, portions, cfg)
+
+
+def _canned_recipe(key: str, ingredients: List[str], portions: int, cfg: StandinConfig) -> Dict[str, Any]:
+    pool = cfg.recipes or CANNED_RECIPES
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4).digest()
+    tpl = pool[int.from_bytes(digest, "little") % len(pool)]
+    recipe = json.loads(json.dumps(tpl, ensure_ascii=False))
+    recipe["title"] = str(recipe.get("title", "Receta")).replace("{main}", ingredients[0]).capitalize()
+    recipe["portions"] = portions
+    for step in recipe.get("steps_generic", []):
+        if not step.get("ingredients"):
+            step["ingredients"] = ingredients
+    recipe.setdefault("ingredients", [{"name": n, "qty": 100 * portions, "unit": "g"} for n in ingredients])
+    return recipe
+
+
+def _chunks(text: str, size: int = 12) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def create_app(cfg: Optional[StandinConfig] = None) -> FastAPI:
+    cfg = cfg or StandinConfig()
+    if not cfg.dims:
+        from api.config import settings
+        cfg.dims = settings.parsed_vector_dims()
+    rng = _rng(cfg)
+    app = FastAPI(title="FullFoodApp LLM stand-in")
+
+    async def _maybe_fail() -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < cfg.hang_rate:
+            await asyncio.sleep(cfg.hang_s)
+        elif roll < cfg.hang_rate + cfg.error_rate:
+            return JSONResponse({"error": "stand-in: fallo simulado"}, status_code=cfg.error_status)
+        return None
+
+    @app.get("/api/tags")
+    async def tags():
+        models = [{"name": m} for m in ["stand-in", *cfg.dims.keys()]]
+        return {"models": models}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt = str(body.get("prompt") or "")
+        model = body.get("model") or "stand-in"
+        failed = await _maybe_fail()
+        if failed is not None:
+            return failed
+
+        if rng.random() < cfg.invalid_rate:
+            text = "Claro, aquí tienes una receta deliciosa para hoy..."
+        else:
+            text = json.dumps(canned_response(prompt, cfg), ensure_ascii=False)
+        pieces = _chunks(text)
+        prompt_tokens = max(1, len(prompt) // 4)
+
+        if not body.get("stream"):
+            await asyncio.sleep(_latency_s(cfg, rng, cfg.latency_ms) + len(pieces) * cfg.token_ms / 1000.0)
+            return {"model": model, "response": text, "done": True,
+                    "prompt_eval_count": prompt_tokens, "eval_count": len(pieces)}
+
+        async def events() -> AsyncIterator[bytes]:
+            # Tiempo hasta el primer token y luego un trozo cada `token_ms`
+            await asyncio.sleep(_latency_s(cfg, rng, cfg.latency_ms))
+            for piece in pieces:
+                yield (json.dumps({"model": model, "response": piece, "done": False}, ensure_ascii=False) + "\n").encode()
+                if cfg.token_ms:
+                    await asyncio.sleep(cfg.token_ms / 1000.0)
+            yield (json.dumps({"model": model, "response": "", "done": True,
+                               "prompt_eval_count": prompt_tokens, "eval_count": len(pieces)}) + "\n").encode()
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    async def _embed(request: Request):
+        body = await request.json()
+        model = body.get("model") or ""
+        inp = body.get("input", body.get("prompt", ""))
+        texts = inp if isinstance(inp, list) else [inp]
+        failed = await _maybe_fail()
+        if failed is not None:
+            return failed
+        dim = cfg.dims.get(model) or next(iter(cfg.dims.values()), 768)
+        await asyncio.sleep(_latency_s(cfg, rng, cfg.embed_latency_ms))
+        return {"model": model, "embeddings": [hash_embedding(str(t), dim) for t in texts]}
+
+    app.add_api_route("/api/embed", _embed, methods=["POST"])
+    app.add_api_route("/api/embeddings", _embed, methods=["POST"])
+    return app
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stand-in local del LLM/embeddings para pruebas de carga")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--latency-ms", type=float, default=800.0)
+    ap.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    ap.add_argument("--latency-spread", type=float, default=0.5)
+    ap.add_argument("--token-ms", type=float, default=10.0)
+    ap.add_argument("--embed-latency-ms", type=float, default=30.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503)
+    ap.add_argument("--hang-rate", type=float, default=0.0)
+    ap.add_argument("--hang-s", type=float, default=120.0)
+    ap.add_argument("--invalid-rate", type=float, default=0.0)
+    ap.add_argument("--recipes", type=Path, help="JSON con una lista de recetas enlatadas ({main} = primer ingrediente)")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+
+    cfg = StandinConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_spread=args.latency_spread,
+        token_ms=args.token_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        hang_rate=args.hang_rate,
+        hang_s=args.hang_s,
+        invalid_rate=args.invalid_rate,
+        recipes=json.loads(args.recipes.read_text(encoding="utf-8")) if args.recipes else [],
+        seed=args.seed,
+    )
+    import uvicorn
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga sencilla contra una API en marcha (normalmente con el stand-in
+del LLM y Qdrant embebido, ver `make offline`). Lanza peticiones concurrentes a
+/recipes/generate y/o /planner/generate-week e imprime percentiles de latencia,
+códigos de estado y el desglose medio de Server-Timing por etapa.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import httpx
+
+INGREDIENTS = [
+    ["pollo", "pimientos", "arroz"],
+    ["garbanzos", "espinacas", "tomate"],
+    ["pasta", "calabacín", "queso"],
+    ["huevos", "patata", "cebolla"],
+    ["salmón", "brócoli", "limón"],
+    ["lentejas", "zanahoria", "cebolla"],
+]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        bits = [b.strip() for b in part.split(";")]
+        if not bits or not bits[0]:
+            continue
+        for b in bits[1:]:
+            if b.startswith("dur="):
+                try:
+                    out[bits[0]] = float(b[4:])
+                except ValueError:
+                    pass
+    return out
+
+
+def _request(kind: str, rnd: random.Random) -> Tuple[str, dict]:
+    if kind == "week":
+        start = date(2025, 1, 6) + timedelta(weeks=rnd.randint(0, 52))
+        return "/planner/generate-week", {"start": start.isoformat(), "portions": 2, "persist": False}
+    return "/recipes/generate", {"ingredients": rnd.choice(INGREDIENTS), "portions": rnd.randint(1, 4), "mode": "hybrid"}
+
+
+async def run(args: argparse.Namespace) -> None:
+    rnd = random.Random(args.seed)
+    headers = {"X-API-Key": args.api_key}
+    kinds = ["generate", "week"] if args.endpoint == "mixed" else [args.endpoint]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Counter = Counter()
+    stages: Dict[str, List[float]] = defaultdict(list)
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(_request(rnd.choice(kinds), rnd))
+
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=args.timeout) as client:
+        if args.seed_rag:
+            r = await client.post("/admin/seed-rag")
+            print(f"seed-rag → {r.status_code}")
+
+        async def worker() -> None:
+            while not queue.empty():
+                path, body = queue.get_nowait()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(path, json=body)
+                    statuses[r.status_code] += 1
+                    for name, ms in _parse_server_timing(r.headers.get("Server-Timing", "")).items():
+                        stages[name].append(ms)
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies[path].append(time.perf_counter() - t0)
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t_start
+
+    print(f"\n{args.requests} peticiones, concurrencia {args.concurrency}, {elapsed:.1f}s ({args.requests / elapsed:.2f} req/s)")
+    for path, vals in latencies.items():
+        print(f"{path:28s} n={len(vals):4d}  p50={_percentile(vals, 50):.3f}s  "
+              f"p95={_percentile(vals, 95):.3f}s  p99={_percentile(vals, 99):.3f}s  max={max(vals):.3f}s")
+    print("Estados:", dict(statuses))
+    if stages:
+        print("Server-Timing medio (ms):", {k: round(sum(v) / len(v), 1) for k, v in sorted(stages.items())})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Prueba de carga de /recipes/generate y /planner/generate-week")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--api-key", default="demo123")
+    ap.add_argument("--endpoint", choices=["generate", "week", "mixed"], default="generate")
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--seed-rag", action="store_true", help="Llama antes a /admin/seed-rag (Qdrant embebido empieza vacío)")
+    ap.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()